@@ -1,61 +1,121 @@
-from flask import Flask, request, jsonify, render_template, session
-from flask_cors import CORS
+from flask import Flask
+import importlib
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Import utilities
+# Import utilities (cheap: no connections, threads or renderers are created at import)
 from utils.db_utils import db_manager
 from utils.security_utils import get_env_variable
-from utils.security_middleware import SecurityMiddleware
-
-# Import blueprints
-from blueprints.main_routes import main_bp
-from blueprints.teacher_auth_routes import teacher_auth_bp
-from blueprints.teacher_courses_routes import teacher_courses_bp
-from blueprints.teacher_api_routes import teacher_api_bp
-from blueprints.blog_routes import blog_bp
-from blueprints.student_content_routes import student_content_bp
-from blueprints.student_data_api_routes import student_data_api_bp
-from blueprints.profile_routes import profile_bp
-from blueprints.admin_page_routes import admin_page_bp
-from blueprints.public_data_api_routes import public_data_api_bp
-from blueprints.admin_api_routes import admin_api_bp
-from blueprints.user_auth_api_routes import user_auth_api_bp
-from blueprints.payment_api_routes import payment_api_bp
-
-app = Flask(__name__)
-CORS(app)
-
-# Initialize security middleware
-security_middleware = SecurityMiddleware(app)
-
-# Configuration
-app.config['SECRET_KEY'] = get_env_variable('SECRET_KEY', 'vibes-university-secret-key')
-app.secret_key = app.config['SECRET_KEY']
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'courses')
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-
-# Register Blueprints
-app.register_blueprint(main_bp)
-app.register_blueprint(teacher_auth_bp)
-app.register_blueprint(teacher_courses_bp)
-app.register_blueprint(teacher_api_bp)
-app.register_blueprint(blog_bp)
-app.register_blueprint(student_content_bp)
-app.register_blueprint(student_data_api_bp)
-app.register_blueprint(admin_page_bp)
-app.register_blueprint(admin_api_bp)
-app.register_blueprint(profile_bp)
-app.register_blueprint(user_auth_api_bp)
-app.register_blueprint(public_data_api_bp)
-app.register_blueprint(payment_api_bp)
+
+# Blueprints are imported by create_app(), not at module import, so one-off
+# scripts that only need utils/ or init_db() don't pay for the whole app.
+BLUEPRINTS = (
+    ('blueprints.main_routes', 'main_bp'),
+    ('blueprints.teacher_auth_routes', 'teacher_auth_bp'),
+    ('blueprints.teacher_courses_routes', 'teacher_courses_bp'),
+    ('blueprints.teacher_api_routes', 'teacher_api_bp'),
+    ('blueprints.blog_routes', 'blog_bp'),
+    ('blueprints.student_content_routes', 'student_content_bp'),
+    ('blueprints.student_data_api_routes', 'student_data_api_bp'),
+    ('blueprints.admin_page_routes', 'admin_page_bp'),
+    ('blueprints.admin_api_routes', 'admin_api_bp'),
+    ('blueprints.profile_routes', 'profile_bp'),
+    ('blueprints.user_auth_api_routes', 'user_auth_api_bp'),
+    ('blueprints.public_data_api_routes', 'public_data_api_bp'),
+    ('blueprints.payment_api_routes', 'payment_api_bp'),
+    ('blueprints.media_routes', 'media_bp'),
+)
+
+def create_app(config=None):
+    """
+    Application factory.
+
+    Args:
+        config: Optional mapping applied on top of the environment based
+            defaults (e.g. {'DATABASE_PATH': ..., 'TESTING': True})
+
+    Returns:
+        Configured Flask application
+    """
+    from flask_cors import CORS
+    from utils.assets import StaticAssets
+    from utils.compression import Compression
+    from utils.image_derivatives import image_derivatives
+    from utils.json_utils import FastJSONProvider
+    from utils.logging_utils import configure_logging
+    from utils.metrics import RequestMetrics
+    from utils.progress_buffer import progress_buffer
+    from utils.security_middleware import SecurityMiddleware
+    from utils.template_cache import init_template_cache
+    from utils.upload_utils import upload_storage
+
+    app = Flask(__name__)
+
+    # Configuration
+    app.config['SECRET_KEY'] = get_env_variable('SECRET_KEY', 'vibes-university-secret-key')
+    app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'courses')
+    if config:
+        app.config.update(config)
+    app.secret_key = app.config['SECRET_KEY']
+    app.json = FastJSONProvider(app)
+
+    # Compiled templates are cached in memory and as bytecode on disk
+    init_template_cache(app)
+
+    configure_logging()
+    CORS(app)
+
+    # Initialize request/DB/template instrumentation (registered first so its
+    # timer wraps every other before/after request hook)
+    RequestMetrics(app, db_manager)
+
+    # Initialize security middleware
+    SecurityMiddleware(app)
+
+    # Compress responses; after_request hooks run in reverse order, so this
+    # runs before the security headers are added and inside the metrics timer
+    Compression(app)
+
+    # Fingerprinted, long-cached URLs for static/css, static/js and static/images
+    StaticAssets(app)
+
+    # Database pool is configured here but only opened on first use
+    db_manager.init_app(app)
+
+    # Lesson uploads stream into content-addressed storage with per-role limits
+    upload_storage.init_app(app)
+    # Resized WebP/JPEG variants of uploaded lesson images, built in the background
+    image_derivatives.init_app(app)
+
+    # Lesson completions are journaled and written in batched transactions
+    progress_buffer.init_app(app)
+
+    # Register Blueprints
+    for module_name, blueprint_name in BLUEPRINTS:
+        app.register_blueprint(getattr(importlib.import_module(module_name), blueprint_name))
+
+    return app
 
 def init_db():
     db_manager.initialize_database()
 
+_app = None
+
+def __getattr__(name):
+    # Keeps `from app import app` and `gunicorn app:app` working while the
+    # application itself is only built on first access.
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
+    # Local development server only; production runs under gunicorn (see gunicorn.conf.py)
     init_db()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    debug = get_env_variable('FLASK_DEBUG', 'True').lower() in ('1', 'true', 'yes')
+    create_app().run(host='0.0.0.0', port=5000, debug=debug)
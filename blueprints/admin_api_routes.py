@@ -1,11 +1,17 @@
-from flask import Blueprint, jsonify, request, session
-from werkzeug.utils import secure_filename
+from flask import Blueprint, current_app, jsonify, request, session, url_for
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 import sqlite3
 import json
 import os
 
 # Import utilities
-from utils.db_utils import get_db_connection, return_db_connection
+from utils.course_bundle import BundleError, bundle_filename, export_bundle, import_bundle, load_course
+from utils.course_clone import CloneError, clone_course
+from utils.course_versions import course_changes, course_etag, not_modified, versioned
+from utils.db_utils import get_db_connection, return_db_connection, RowStream
+from utils.json_utils import json_stream_response, raw_json_column
+from utils.upload_utils import allowed_file, resumable_response, upload_storage
+from utils.quiz_grading import quiz_answer_keys
 from utils.logging_utils import app_logger, db_logger, security_logger, payment_logger, log_info, log_error, log_warning
 # Import security utilities
 from utils.security_utils import require_admin_auth, validate_email, validate_phone, sanitize_input
@@ -14,6 +20,12 @@ from utils.rate_limiter import rate_limit
 
 admin_api_bp = Blueprint('admin_api_bp', __name__, url_prefix='/api/admin')
 
+def lesson_to_json(lesson_row):
+    """Lesson row as a dict, with element_properties passed through as raw JSON."""
+    lesson_dict = dict(lesson_row)
+    lesson_dict['element_properties'] = raw_json_column(lesson_row['element_properties'])
+    return lesson_dict
+
 # --- Course Management APIs ---
 @admin_api_bp.route('/courses', methods=['POST'])
 @require_admin_auth
@@ -80,10 +92,7 @@ def api_admin_get_courses():
     courses = []
     for course_row in courses_data:
         course_dict = dict(course_row)
-        try:
-            course_dict['course_settings'] = json.loads(course_row['course_settings']) if course_row['course_settings'] else {}
-        except:
-            course_dict['course_settings'] = {}
+        course_dict['course_settings'] = raw_json_column(course_row['course_settings'])
         courses.append(course_dict)
     
     return jsonify(courses)
@@ -95,51 +104,75 @@ def api_admin_get_course(course_id):
     conn = None
     try:
         conn = get_db_connection()
-        course_data = conn.execute("SELECT id, name, description, course_settings FROM courses WHERE id = ?", (course_id,)).fetchone()
+        course_data = conn.execute("SELECT id, name, description, course_settings, content_version FROM courses WHERE id = ?", (course_id,)).fetchone()
         
         if not course_data:
             if conn:
                 return_db_connection(conn)
             return jsonify({'error': 'Course not found'}), 404
+
+        # Unchanged since the client's copy: answer before reading modules and lessons
+        etag = course_etag(course_id, course_data['content_version'])
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
         
         # Get modules for this course
         modules_data = conn.execute("SELECT id, name, description, order_index FROM modules WHERE course_id = ? ORDER BY order_index", (course_id,)).fetchall()
         
-        # Get lessons for this course
-        lessons_data = conn.execute("""
+        # Lessons are streamed straight from the cursor; the stream owns the
+        # connection from here on and returns it when the response closes
+        lessons_cursor = conn.execute("""
             SELECT l.id, l.lesson, l.description, l.content_type, l.element_properties, 
-                   l.file_path, l.order_index, l.module_id, m.name as module_name
+                   l.file_path, l.file_name, l.file_size, l.order_index, l.module_id, m.name as module_name
             FROM lessons l 
             JOIN modules m ON l.module_id = m.id
             WHERE l.course_id = ? 
             ORDER BY m.order_index, l.order_index
-        """, (course_id,)).fetchall()
+        """, (course_id,))
+        lessons = RowStream(conn, lessons_cursor, transform=lesson_to_json)
+        conn = None
     except Exception as e:
         if conn:
             return_db_connection(conn)
+            conn = None
         return jsonify({'error': f'Database error: {str(e)}'}), 500
     finally:
         if conn:
             return_db_connection(conn)
     
     course = dict(course_data)
-    try:
-        course['course_settings'] = json.loads(course_data['course_settings']) if course_data['course_settings'] else {}
-    except:
-        course['course_settings'] = {}
-    
+    course['course_settings'] = raw_json_column(course_data['course_settings'])
+    course['version'] = course.pop('content_version') or 0
     course['modules'] = [dict(module) for module in modules_data]
-    course['lessons'] = []
-    
-    for lesson_row in lessons_data:
-        lesson_dict = dict(lesson_row)
-        try:
-            lesson_dict['element_properties'] = json.loads(lesson_row['element_properties']) if lesson_row['element_properties'] else {}
-        except:
-            lesson_dict['element_properties'] = {}
-        course['lessons'].append(lesson_dict)
+    course['lessons'] = lessons
     
-    return jsonify(course)
+    return versioned(json_stream_response(course), etag)
+
+@admin_api_bp.route('/courses/<int:course_id>/changes', methods=['GET'])
+@require_admin_auth
+def api_admin_get_course_changes(course_id):
+    """Modules and lessons changed or deleted after content version ?since= (from a course GET or earlier delta)."""
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'since must be a content version (a non-negative integer)'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        changes = course_changes(conn, course_id, since, lesson_transform=lesson_to_json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    if not changes:
+        return jsonify({'error': 'Course not found'}), 404
+    changes['course']['course_settings'] = raw_json_column(changes['course']['course_settings'])
+    return versioned(jsonify(changes), course_etag(course_id, changes['version']))
 
 @admin_api_bp.route('/courses/<int:course_id>', methods=['PUT'])
 @require_admin_auth
@@ -186,6 +219,8 @@ def api_admin_update_course(course_id):
         cursor = conn.cursor()
         cursor.execute(query, tuple(params))
         conn.commit()
+        # Answer keys carry the course name students are checked against
+        quiz_answer_keys.invalidate()
     except sqlite3.IntegrityError:
         if conn:
             return_db_connection(conn)
@@ -217,12 +252,15 @@ def api_admin_delete_course(course_id):
         # Delete related records first (CASCADE should handle this, but being explicit)
         cursor = conn.cursor()
         cursor.execute("DELETE FROM quiz_attempts WHERE course_id = ?", (course_id,))
-        cursor.execute("DELETE FROM course_progress WHERE course_id = ?", (course_id,))
+        cursor.execute("DELETE FROM quiz_lesson_stats WHERE course_id = ?", (course_id,))
+        cursor.execute("DELETE FROM course_progress_bits WHERE course_id = ?", (course_id,))
         cursor.execute("DELETE FROM lessons WHERE course_id = ?", (course_id,))
         cursor.execute("DELETE FROM modules WHERE course_id = ?", (course_id,))
         cursor.execute("DELETE FROM enrollments WHERE course_type IN (SELECT name FROM courses WHERE id = ?)", (course_id,))
         cursor.execute("DELETE FROM courses WHERE id = ?", (course_id,))
         conn.commit()
+        quiz_answer_keys.invalidate()
+        # Lesson files are left to the upload reconciler, which quarantines them once unreferenced
     except Exception as e:
         if conn:
             return_db_connection(conn)
@@ -233,6 +271,119 @@ def api_admin_delete_course(course_id):
     
     return jsonify({'message': 'Course deleted successfully'})
 
+@admin_api_bp.route('/courses/<int:course_id>/quiz-stats', methods=['GET'])
+@require_admin_auth
+def api_admin_get_quiz_stats(course_id):
+    conn = None
+    try:
+        conn = get_db_connection()
+        # Aggregates are maintained as attempts are written, so this never scans quiz_attempts
+        stats = conn.execute("""
+            SELECT l.id AS lesson_id, l.lesson, COALESCE(s.attempts, 0) AS attempts,
+                   COALESCE(s.correct_attempts, 0) AS correct_attempts, COALESCE(s.total_score, 0) AS total_score,
+                   s.last_attempt_at
+            FROM lessons l LEFT JOIN quiz_lesson_stats s ON s.lesson_id = l.id
+            WHERE l.course_id = ? AND l.content_type = 'quiz'
+            ORDER BY l.module_id, l.order_index
+        """, (course_id,)).fetchall()
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    lessons = []
+    for row in stats:
+        lesson = dict(row)
+        lesson['average_score'] = round(row['total_score'] / row['attempts'], 1) if row['attempts'] else None
+        lesson['correct_rate'] = round(row['correct_attempts'] / row['attempts'], 3) if row['attempts'] else None
+        lessons.append(lesson)
+    return jsonify({'course_id': course_id, 'lessons': lessons})
+
+@admin_api_bp.route('/courses/<int:course_id>/clone', methods=['POST'])
+@require_admin_auth
+@rate_limit('api')
+def api_admin_clone_course(course_id):
+    """Copy a course (modules, lessons, file references) into a new course, optionally owned by a teacher."""
+    data = request.get_json(silent=True) or {}
+    name = sanitize_input(data['name']) if data.get('name') else None
+    teacher_id = data.get('teacher_id')
+    if teacher_id is not None and (isinstance(teacher_id, bool) or not isinstance(teacher_id, int)):
+        return jsonify({'error': 'teacher_id must be an integer'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        result = clone_course(conn, course_id, name=name, teacher_id=teacher_id)
+    except CloneError as e:
+        return jsonify({'error': str(e)}), 400
+    except sqlite3.IntegrityError:
+        return jsonify({'error': 'Course with this name already exists or unknown teacher'}), 400
+    except Exception as e:
+        log_error(db_logger, "Course clone failed", course_id=course_id, error=str(e))
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    if not result:
+        return jsonify({'error': 'Course not found'}), 404
+    log_info(app_logger, "Course cloned", source_course_id=course_id, **result)
+    return jsonify(dict(result, message='Course cloned successfully')), 201
+
+# --- Course Bundles ---
+@admin_api_bp.route('/courses/<int:course_id>/export', methods=['GET'])
+@require_admin_auth
+def api_admin_export_course(course_id):
+    conn = None
+    try:
+        conn = get_db_connection()
+        loaded = load_course(conn, course_id)
+    except Exception as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+    if not loaded:
+        return jsonify({'error': 'Course not found'}), 404
+
+    # The zip is generated while it is sent; files are read in chunks, never held in memory
+    manifest, lesson_rows = loaded
+    response = current_app.response_class(export_bundle(manifest, lesson_rows), mimetype='application/zip')
+    response.headers.set('Content-Disposition', 'attachment', filename=bundle_filename(manifest))
+    log_info(app_logger, "Course export started", course_id=course_id, lessons=len(lesson_rows))
+    return response
+
+@admin_api_bp.route('/courses/import', methods=['POST'])
+@require_admin_auth
+@rate_limit('api')
+def api_admin_import_course():
+    bundle = request.files.get('bundle')
+    if not bundle:
+        return jsonify({'error': 'A course bundle (.zip) is required'}), 400
+    name = sanitize_input(request.form['name']) if request.form.get('name') else None
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        bundle.stream.seek(0)
+        result = import_bundle(conn, bundle.stream, name=name, teacher_id=None,
+                               max_file_bytes=upload_storage.limit_for_current_user())
+    except BundleError as e:
+        log_warning(app_logger, "Course import rejected", error=str(e))
+        return jsonify({'error': str(e)}), 400
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        log_error(db_logger, "Course import failed", error=str(e))
+        return jsonify({'error': f'Import failed: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    log_info(app_logger, "Course imported", **result)
+    return jsonify(dict(result, message='Course imported successfully')), 201
+
 # --- Module Management APIs ---
 @admin_api_bp.route('/courses/<int:course_id>/modules', methods=['POST'])
 @require_admin_auth
@@ -401,17 +552,13 @@ def api_admin_create_lesson_in_course(course_id):
                 return_db_connection(conn)
             return jsonify({'error': 'Invalid module for this course'}), 400
 
-        # Handle file upload if present
-        file_path = None
+        # Handle file upload if present (already streamed to the upload store while parsing)
+        file_path = file_size = file_hash = file_name = None
         if 'file' in request.files:
             file = request.files['file']
             if file.filename != '':
                 if allowed_file(file.filename):
-                    # Save file with course_id/module_id prefix
-                    filename = f"{course_id}_{module_id}_{secure_filename(file.filename)}"
-                    file_path = os.path.join('uploads', filename)
-                    os.makedirs('uploads', exist_ok=True)
-                    file.save(file_path)
+                    file_path, file_size, file_hash, file_name = upload_storage.save(file)
 
         # Parse element properties
         try:
@@ -423,8 +570,9 @@ def api_admin_create_lesson_in_course(course_id):
 
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO lessons (course_id, module_id, lesson, description, file_path, element_properties, content_type, order_index)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO lessons (course_id, module_id, lesson, description, file_path, element_properties, content_type, order_index,
+                                 file_size, file_hash, file_name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             course_id,
             module_id,
@@ -433,10 +581,18 @@ def api_admin_create_lesson_in_course(course_id):
             file_path,
             json.dumps(element_properties),
             content_type,
-            order_index
+            order_index,
+            file_size,
+            file_hash,
+            file_name
         ))
         lesson_id = cursor.lastrowid
         conn.commit()
+    except RequestEntityTooLarge as e:
+        if conn:
+            return_db_connection(conn)
+            conn = None
+        return jsonify({'error': e.description}), 413
     except Exception as e:
         if conn:
             return_db_connection(conn)
@@ -461,33 +617,27 @@ def api_admin_get_lessons_in_course(course_id):
                 return_db_connection(conn)
             return jsonify({'error': 'Course not found'}), 404
 
-        lessons_data = conn.execute('''
-            SELECT l.id, l.lesson, l.description, l.content_type, l.file_path, 
+        lessons_cursor = conn.execute('''
+            SELECT l.id, l.lesson, l.description, l.content_type, l.file_path, l.file_name, l.file_size,
                    l.element_properties, l.order_index, l.uploaded_at,
                    m.name as module_name
             FROM lessons l
             JOIN modules m ON l.module_id = m.id
             WHERE l.course_id = ?
             ORDER BY m.order_index, l.order_index
-        ''', (course_id,)).fetchall()
+        ''', (course_id,))
+        lessons = RowStream(conn, lessons_cursor, transform=lesson_to_json)
+        conn = None
     except Exception as e:
         if conn:
             return_db_connection(conn)
+            conn = None
         return jsonify({'error': f'DB error: {str(e)}'}), 500
     finally:
         if conn:
             return_db_connection(conn)
 
-    lessons = []
-    for lesson_row in lessons_data:
-        lesson_dict = dict(lesson_row)
-        try:
-            lesson_dict['element_properties'] = json.loads(lesson_row['element_properties']) if lesson_row['element_properties'] else {}
-        except:
-            lesson_dict['element_properties'] = {}
-        lessons.append(lesson_dict)
-
-    return jsonify(lessons)
+    return json_stream_response(lessons)
 
 @admin_api_bp.route('/lessons/<int:lesson_id>', methods=['PUT'])
 @require_admin_auth
@@ -497,7 +647,7 @@ def api_admin_update_lesson(lesson_id):
     try:
         conn = get_db_connection()
         # Verify lesson exists
-        existing_lesson = conn.execute('SELECT id, course_id, module_id FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
+        existing_lesson = conn.execute('SELECT id, course_id, module_id, file_path FROM lessons WHERE id = ?', (lesson_id,)).fetchone()
         if not existing_lesson:
             if conn:
                 return_db_connection(conn)
@@ -546,13 +696,9 @@ def api_admin_update_lesson(lesson_id):
             file = request.files['file']
             if file.filename != '':
                 if allowed_file(file.filename):
-                    # Save file with course_id/module_id prefix
-                    filename = f"{course_id}_{existing_lesson['module_id']}_{secure_filename(file.filename)}"
-                    file_path = os.path.join('uploads', filename)
-                    os.makedirs('uploads', exist_ok=True)
-                    file.save(file_path)
-                    updates.append("file_path = ?")
-                    params.append(file_path)
+                    file_path, file_size, file_hash, file_name = upload_storage.save(file)
+                    updates.extend(["file_path = ?", "file_size = ?", "file_hash = ?", "file_name = ?"])
+                    params.extend([file_path, file_size, file_hash, file_name])
 
         if not updates:
             if conn:
@@ -564,6 +710,13 @@ def api_admin_update_lesson(lesson_id):
         cursor.execute(f"UPDATE lessons SET {', '.join(updates)} WHERE id = ?", tuple(params))
         updated_rows = cursor.rowcount
         conn.commit()
+        quiz_answer_keys.invalidate(lesson_id)
+        # A replaced file is left to the upload reconciler (another lesson may share its content)
+    except RequestEntityTooLarge as e:
+        if conn:
+            return_db_connection(conn)
+            conn = None
+        return jsonify({'error': e.description}), 413
     except Exception as e:
         if conn:
             return_db_connection(conn)
@@ -588,17 +741,14 @@ def api_admin_delete_lesson(lesson_id):
                 return_db_connection(conn)
             return jsonify({'error': 'Lesson not found'}), 404
 
-        # Delete file if exists
-        if existing_lesson['file_path']:
-            try:
-                os.remove(existing_lesson['file_path'])
-            except OSError:
-                pass  # File might not exist
-
         cursor = conn.cursor()
+        cursor.execute("DELETE FROM quiz_attempts WHERE lesson_id = ?", (lesson_id,))
+        cursor.execute("DELETE FROM quiz_lesson_stats WHERE lesson_id = ?", (lesson_id,))
         cursor.execute("DELETE FROM lessons WHERE id = ?", (lesson_id,))
         deleted_rows = cursor.rowcount
         conn.commit()
+        quiz_answer_keys.invalidate(lesson_id)
+        # Its file is left to the upload reconciler (another lesson may share its content)
     except Exception as e:
         if conn:
             return_db_connection(conn)
@@ -609,6 +759,155 @@ def api_admin_delete_lesson(lesson_id):
 
     return jsonify({'message': 'Lesson deleted'}) if deleted_rows > 0 else jsonify({'error': 'Lesson not found'}), 404
 
+# --- Resumable Upload APIs ---
+# tus-style protocol for large lesson files: POST /uploads declares the file,
+# PATCH /uploads/<id> writes a chunk at Upload-Offset (HEAD reports the offset
+# to resume from after a dropped connection), and POST /uploads/<id>/finalize
+# verifies the content hash and only then creates the lesson.
+@admin_api_bp.route('/uploads', methods=['POST'])
+@require_admin_auth
+@rate_limit('api')
+def api_admin_create_upload():
+    data = request.get_json(silent=True) or {}
+    try:
+        length = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size (in bytes) is required'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        upload = upload_storage.create_resumable(conn, data.get('filename'), length, data.get('sha256'))
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        log_error(app_logger, "Failed to create resumable upload", error=str(e))
+        return jsonify({'error': f'Failed to create upload: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    log_info(app_logger, "Resumable upload created", upload_id=upload['id'], size=length)
+    return resumable_response(upload, 201, location=url_for('admin_api_bp.api_admin_upload_chunk', upload_id=upload['id']))
+
+@admin_api_bp.route('/uploads/<upload_id>', methods=['GET', 'HEAD'])
+@require_admin_auth
+def api_admin_upload_status(upload_id):
+    conn = None
+    try:
+        conn = get_db_connection()
+        upload = upload_storage.get_resumable(conn, upload_id)
+    except Exception as e:
+        return jsonify({'error': f'DB error: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+    if not upload:
+        return jsonify({'error': 'Upload not found'}), 404
+    return resumable_response(upload)
+
+@admin_api_bp.route('/uploads/<upload_id>', methods=['PATCH'])
+@require_admin_auth
+def api_admin_upload_chunk(upload_id):
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({'error': 'Upload-Offset header is required'}), 400
+    if request.mimetype not in ('application/offset+octet-stream', 'application/octet-stream'):
+        return jsonify({'error': 'Chunks must be sent as application/offset+octet-stream'}), 415
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        upload = upload_storage.get_resumable(conn, upload_id)
+        if not upload:
+            return jsonify({'error': 'Upload not found'}), 404
+        new_offset = upload_storage.write_chunk(conn, upload, offset, request.stream, request.content_length,
+                                                checksum=request.headers.get('Upload-Checksum'))
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        log_error(app_logger, "Failed to write upload chunk", upload_id=upload_id, error=str(e))
+        return jsonify({'error': f'Failed to write chunk: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    response = current_app.response_class(status=204)
+    response.headers['Upload-Offset'] = str(new_offset)
+    return response
+
+@admin_api_bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@require_admin_auth
+def api_admin_abort_upload(upload_id):
+    conn = None
+    try:
+        conn = get_db_connection()
+        upload = upload_storage.get_resumable(conn, upload_id)
+        if not upload:
+            return jsonify({'error': 'Upload not found'}), 404
+        upload_storage.abort_resumable(conn, upload)
+    except Exception as e:
+        return jsonify({'error': f'DB error: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+    return jsonify({'message': 'Upload cancelled'})
+
+@admin_api_bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@require_admin_auth
+def api_admin_finalize_upload(upload_id):
+    data = request.get_json(silent=True) or {}
+    lesson_title = data.get('lesson_title')
+    content_type = data.get('content_type')
+    element_properties = data.get('element_properties', {})
+    if isinstance(element_properties, str):
+        try:
+            element_properties = json.loads(element_properties)
+        except json.JSONDecodeError:
+            return jsonify({'error': 'Invalid element_properties JSON'}), 400
+    try:
+        course_id = int(data.get('course_id'))
+        module_id = int(data.get('module_id'))
+        order_index = int(data.get('order_index', 1))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'course_id, module_id and order_index must be integers'}), 400
+    if not lesson_title or not content_type:
+        return jsonify({'error': 'Missing required fields: lesson_title, content_type'}), 400
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        upload = upload_storage.get_resumable(conn, upload_id)
+        if not upload:
+            return jsonify({'error': 'Upload not found'}), 404
+        module = conn.execute('SELECT id FROM modules WHERE id = ? AND course_id = ?', (module_id, course_id)).fetchone()
+        if not module:
+            return jsonify({'error': 'Invalid module for this course'}), 400
+
+        file_path, file_size, file_hash, file_name = upload_storage.finalize_resumable(conn, upload, data.get('sha256'))
+
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO lessons (course_id, module_id, lesson, description, file_path, element_properties, content_type, order_index,
+                                 file_size, file_hash, file_name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (course_id, module_id, lesson_title, data.get('description', ''), file_path, json.dumps(element_properties),
+              content_type, order_index, file_size, file_hash, file_name))
+        lesson_id = cursor.lastrowid
+        conn.commit()
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        log_error(app_logger, "Failed to finalize upload", upload_id=upload_id, error=str(e))
+        return jsonify({'error': f'Failed to create lesson: {str(e)}'}), 500
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+    log_info(app_logger, "Resumable upload finalized", upload_id=upload_id, lesson_id=lesson_id, size=file_size)
+    return jsonify({'message': 'Lesson created successfully', 'lesson_id': lesson_id, 'file_hash': file_hash}), 201
+
 # --- User Management APIs ---
 @admin_api_bp.route('/users', methods=['GET'])
 @require_admin_auth
@@ -617,23 +916,25 @@ def api_admin_get_users():
     conn = None
     try:
         conn = get_db_connection()
-        users_data = conn.execute('''
+        users_cursor = conn.execute('''
             SELECT u.id, u.email, u.full_name, u.phone, u.role, u.created_at, u.is_active,
                    t.specialization
             FROM users u
             LEFT JOIN teachers t ON u.id = t.user_id
             ORDER BY u.created_at DESC
-        ''').fetchall()
+        ''')
+        users = RowStream(conn, users_cursor, transform=dict)
+        conn = None
     except Exception as e:
         if conn:
             return_db_connection(conn)
+            conn = None
         return jsonify({'error': f'DB error: {str(e)}'}), 500
     finally:
         if conn:
             return_db_connection(conn)
 
-    users = [dict(row) for row in users_data]
-    return jsonify(users)
+    return json_stream_response(users)
 
 @admin_api_bp.route('/users/<int:user_id>', methods=['PUT'])
 @require_admin_auth
@@ -736,24 +1037,26 @@ def api_admin_get_enrollments():
     conn = None
     try:
         conn = get_db_connection()
-        enrollments_data = conn.execute('''
+        enrollments_cursor = conn.execute('''
             SELECT e.id, e.user_id, e.course_type, e.price, e.payment_method, 
                    e.payment_status, e.payment_reference, e.enrolled_at,
                    u.email, u.full_name
             FROM enrollments e
             JOIN users u ON e.user_id = u.id
             ORDER BY e.enrolled_at DESC
-        ''').fetchall()
+        ''')
+        enrollments = RowStream(conn, enrollments_cursor, transform=dict)
+        conn = None
     except Exception as e:
         if conn:
             return_db_connection(conn)
+            conn = None
         return jsonify({'error': f'DB error: {str(e)}'}), 500
     finally:
         if conn:
             return_db_connection(conn)
 
-    enrollments = [dict(row) for row in enrollments_data]
-    return jsonify(enrollments)
+    return json_stream_response(enrollments)
 
 @admin_api_bp.route('/enrollments/<int:enrollment_id>', methods=['PUT'])
 @require_admin_auth
@@ -795,7 +1098,34 @@ def api_admin_update_enrollment(enrollment_id):
 
     return jsonify({'message': 'Enrollment updated'}) if updated_rows > 0 else jsonify({'error': 'Enrollment not found'}), 404
 
-# --- File handling functions ---
-def allowed_file(filename):
-    ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv', 'pdf', 'doc', 'docx', 'ppt', 'pptx', 'xls', 'xlsx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'svg', 'zip', 'rar', '7z', 'mp3', 'wav', 'aac', 'ogg'}
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
\ No newline at end of file
+# --- Storage APIs ---
+@admin_api_bp.route('/storage', methods=['GET'])
+@require_admin_auth
+def api_admin_get_storage():
+    """Lesson file usage per course and per teacher, plus the last reconciliation pass."""
+    from utils.upload_gc import upload_gc
+
+    try:
+        usage = upload_gc.storage_usage()
+    except Exception as e:
+        return jsonify({'error': f'DB error: {str(e)}'}), 500
+    last_pass = upload_gc.read_report()
+    if last_pass:
+        last_pass = {key: value for key, value in last_pass.items() if key != 'storage'}
+    return jsonify({'usage': usage, 'last_reconciliation': last_pass})
+
+@admin_api_bp.route('/storage/reconcile', methods=['POST'])
+@require_admin_auth
+@rate_limit('api')
+def api_admin_reconcile_storage():
+    """Run an orphaned-upload pass now (?dry_run=1 only reports what it would do)."""
+    from utils.upload_gc import upload_gc
+
+    try:
+        report = upload_gc.run_locked(dry_run=request.args.get('dry_run') == '1')
+    except Exception as e:
+        log_error(app_logger, "Upload reconciliation failed", error=str(e))
+        return jsonify({'error': f'Reconciliation failed: {str(e)}'}), 500
+    if report is None:
+        return jsonify({'error': 'A reconciliation pass is already running'}), 409
+    return jsonify(report)
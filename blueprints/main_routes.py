@@ -8,11 +8,14 @@ from werkzeug.security import check_password_hash
 # Import utilities
 from utils.db_utils import get_db_connection, return_db_connection
 from utils.logging_utils import app_logger, db_logger, security_logger, payment_logger, log_info, log_error, log_warning
+from utils import progress_bits
+from utils.progress_buffer import progress_buffer
 # Import security utilities
 from utils.security_utils import validate_email, validate_phone, sanitize_input, get_env_variable
 # Import CSRF protection
 from utils.security_middleware import generate_csrf_token, csrf_protect, validate_csrf_token
 from utils.rate_limiter import rate_limit
+from utils.health import health_checker
 
 main_bp = Blueprint('main_bp', __name__)
 
@@ -72,6 +75,20 @@ def health_check():
         'version': '1.0.0'
     })
 
+@main_bp.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness probe: the worker can serve requests (no dependency checks)."""
+    return jsonify(health_checker.liveness())
+
+@main_bp.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness probe: DB latency, pool saturation, WAL size, disk and caches."""
+    result, status_code = health_checker.readiness()
+    response = jsonify(result)
+    response.status_code = status_code
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 @main_bp.route('/student/login', methods=['GET', 'POST'])
 @csrf_protect
 def student_login():
@@ -140,9 +157,11 @@ def dashboard():
         lessons, completed_ids, progress_percent = [], set(), 0
         if course_info:
             target_course_id = course_info['id']
-            lessons = conn.execute("SELECT l.id, m.name as module_name, l.lesson FROM lessons l JOIN modules m ON l.module_id = m.id WHERE l.course_id = ? ORDER BY m.order_index, l.order_index", (target_course_id,)).fetchall()
-            completed_data = conn.execute("SELECT lesson_id FROM course_progress WHERE user_id = ? AND course_id = ? AND completed = 1", (user_id, target_course_id)).fetchall()
-            completed_ids = set([str(row['lesson_id']) for row in completed_data])
+            lessons = conn.execute("SELECT l.id, m.name as module_name, l.lesson, l.progress_bit FROM lessons l JOIN modules m ON l.module_id = m.id WHERE l.course_id = ? ORDER BY m.order_index, l.order_index", (target_course_id,)).fetchall()
+            completed_bits = progress_bits.load_bits(conn, user_id, target_course_id)
+            completed_ids = set(str(row['id']) for row in lessons if progress_bits.test_bit(completed_bits, row['progress_bit']))
+            completed_ids.update(str(lesson_id) for course_id, lesson_id in progress_buffer.pending_for(user_id)
+                                 if course_id == target_course_id)
             progress_percent = int((len(completed_ids) / len(lessons)) * 100) if lessons else 0
         return render_template('student_dashboard.html', enrollment=enrollment, announcements=announcements, lessons=lessons, completed_ids=completed_ids, progress_percent=progress_percent)
     except Exception as e:
@@ -0,0 +1,213 @@
+from flask import Blueprint, current_app, jsonify, request, session, url_for
+import mimetypes
+import os
+from werkzeug.utils import send_file
+
+from utils.db_utils import get_db_connection, return_db_connection
+from utils.image_derivatives import MIME_TYPES, image_derivatives
+from utils.logging_utils import db_logger, security_logger, log_error, log_warning
+from utils.security_utils import get_env_variable
+from utils.signed_urls import DEFAULT_KEY_PERIOD, DEFAULT_TTL, sign_path
+from utils.upload_utils import upload_storage
+
+media_bp = Blueprint('media_bp', __name__)
+
+# How media bytes leave the process:
+#   sendfile   - Werkzeug send_file; gunicorn hands the file to sendfile(2)
+#   x-accel    - nginx serves MEDIA_ACCEL_PREFIX/<path under UPLOAD_DIR> (internal location)
+#   x-sendfile - Apache/lighttpd serve the absolute path from the X-Sendfile header
+MEDIA_SERVE_MODE = get_env_variable('MEDIA_SERVE_MODE', 'sendfile')
+MEDIA_ACCEL_PREFIX = get_env_variable('MEDIA_ACCEL_PREFIX', '/protected-media')
+MEDIA_MAX_AGE = int(get_env_variable('MEDIA_MAX_AGE', 3600))
+
+# Signed URLs let a front proxy serve lesson files without calling the app:
+#   off         - students get /media/<lesson_id> links
+#   hmac        - verified by media_verifier.py (standalone, or behind nginx auth_request)
+#   secure_link - verified by nginx's secure_link module
+MEDIA_SIGNED_URLS = get_env_variable('MEDIA_SIGNED_URLS', 'off')
+MEDIA_SIGNED_URL_PREFIX = get_env_variable('MEDIA_SIGNED_URL_PREFIX', '/signed-media')
+MEDIA_URL_TTL = int(get_env_variable('MEDIA_URL_TTL', DEFAULT_TTL))
+MEDIA_URL_KEY_PERIOD = int(get_env_variable('MEDIA_URL_KEY_PERIOD', DEFAULT_KEY_PERIOD))
+
+
+def can_access_lesson(conn, lesson):
+    """Admins and teachers may fetch any lesson file; students only those of their enrolled course."""
+    if session.get('admin_logged_in') or session.get('teacher_logged_in'):
+        return True
+    enrollment = session.get('enrollment')
+    if not enrollment:
+        return False
+    course = conn.execute('SELECT id FROM courses WHERE name = ?', (enrollment['course_type'],)).fetchone()
+    return bool(course) and course['id'] == lesson['course_id']
+
+
+def resolve_media_path(file_path):
+    """Absolute path of a lesson file, or None if it lies outside the upload store and static/."""
+    if not file_path:
+        return None
+    path = os.path.realpath(file_path)
+    roots = (os.path.realpath(upload_storage.root), os.path.realpath(current_app.static_folder))
+    if not any(path == root or path.startswith(root + os.sep) for root in roots):
+        return None
+    return path if os.path.isfile(path) else None
+
+
+def signed_lesson_url(file_path):
+    """Expiring signed URL for a stored file, or None if signing is off or the file isn't in the upload store."""
+    if MEDIA_SIGNED_URLS not in ('hmac', 'secure_link') or not file_path:
+        return None
+    root = os.path.realpath(upload_storage.root)
+    path = os.path.realpath(file_path)
+    if not path.startswith(root + os.sep):
+        return None
+    rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+    return sign_path(f"{MEDIA_SIGNED_URL_PREFIX.rstrip('/')}/{rel_path}", current_app.config['SECRET_KEY'],
+                     ttl=MEDIA_URL_TTL, key_period=MEDIA_URL_KEY_PERIOD, fmt=MEDIA_SIGNED_URLS)
+
+
+def lesson_file_url(lesson, download=False, width=None, fmt=None):
+    """
+    URL a student's browser should fetch a lesson file (or one of its image variants) from.
+
+    The caller must already have checked access to the lesson. With signed
+    URLs enabled the link goes straight to the front proxy; otherwise to the
+    authorized /media route.
+    """
+    if width:
+        signed_url = signed_lesson_url(image_derivatives.variant(lesson.get('file_hash'), width, fmt))
+        return signed_url or url_for('media_bp.serve_lesson_media', lesson_id=lesson['id'], w=width, fmt=fmt)
+    signed_url = signed_lesson_url(lesson.get('file_path'))
+    if signed_url:
+        return signed_url
+    if download:
+        return url_for('media_bp.serve_lesson_media', lesson_id=lesson['id'], download=1)
+    return url_for('media_bp.serve_lesson_media', lesson_id=lesson['id'])
+
+
+def lesson_image_sources(lesson):
+    """
+    srcset data for an image lesson, or None until its resized variants exist.
+
+    Returns:
+        Dict with a srcset string per variant format ('webp', 'jpeg'), the
+        fallback src and the original's width and height
+    """
+    if not image_derivatives.is_image(lesson.get('file_path')):
+        return None
+    manifest = image_derivatives.manifest(lesson.get('file_hash'))
+    if not manifest or not manifest['variants']:
+        return None
+    srcsets = {}
+    for variant in manifest['variants']:
+        url = lesson_file_url(lesson, width=variant['width'], fmt=variant['format'])
+        srcsets.setdefault(variant['format'], []).append(f"{url} {variant['width']}w")
+    # The original is the widest candidate for browsers without WebP support
+    original_url = lesson_file_url(lesson)
+    fallback = srcsets.get('jpeg', [])
+    return {
+        'webp': ', '.join(srcsets.get('webp', [])),
+        'jpeg': ', '.join(fallback + [f"{original_url} {manifest['width']}w"]),
+        'src': fallback[-1].rsplit(' ', 1)[0] if fallback else original_url,
+        'width': manifest['width'],
+        'height': manifest['height'],
+    }
+
+
+def media_response(path, download_name, file_hash=None):
+    """
+    Build the response for a lesson file in the configured MEDIA_SERVE_MODE.
+
+    Range and conditional requests are answered by Werkzeug (sendfile mode)
+    or by the front-end server (x-accel / x-sendfile modes). Content-addressed
+    files use their sha256 as a strong ETag, identical on every worker/host.
+    """
+    as_attachment = request.args.get('download') == '1'
+    etag = file_hash or True
+
+    if MEDIA_SERVE_MODE == 'x-accel':
+        root = os.path.realpath(upload_storage.root)
+        if path.startswith(root + os.sep):
+            # Headers only; nginx streams the body (and handles Range) from an internal location
+            rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+            response = current_app.response_class(
+                mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+            response.headers['X-Accel-Redirect'] = f"{MEDIA_ACCEL_PREFIX.rstrip('/')}/{rel_path}"
+            if as_attachment:
+                response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+            if file_hash:
+                response.set_etag(file_hash)
+            response.cache_control.private = True
+            response.cache_control.max_age = MEDIA_MAX_AGE
+            return response
+
+    response = send_file(path, request.environ, download_name=download_name, as_attachment=as_attachment,
+                         etag=etag, conditional=True, max_age=MEDIA_MAX_AGE,
+                         use_x_sendfile=MEDIA_SERVE_MODE == 'x-sendfile',
+                         response_class=current_app.response_class)
+    # Access-controlled content must not be stored by shared caches
+    response.cache_control.private = True
+    response.cache_control.public = False
+    return response
+
+
+def load_authorized_lesson(lesson_id):
+    """
+    Look up a lesson's file and check the current session may read it.
+
+    Returns:
+        Tuple of (lesson row, None) or (None, error response)
+    """
+    conn = None
+    try:
+        conn = get_db_connection()
+        lesson = conn.execute('SELECT id, course_id, file_path, file_hash, file_name FROM lessons WHERE id = ?',
+                              (lesson_id,)).fetchone()
+        if not lesson or not lesson['file_path']:
+            return None, (jsonify({'error': 'Media not found'}), 404)
+        if not can_access_lesson(conn, lesson):
+            log_warning(security_logger, "Media access denied", lesson_id=lesson_id)
+            return None, (jsonify({'error': 'Access denied'}), 403)
+        return lesson, None
+    except Exception as e:
+        log_error(db_logger, "Failed to look up lesson media", lesson_id=lesson_id, error=str(e))
+        return None, (jsonify({'error': 'Error loading media'}), 500)
+    finally:
+        if conn:
+            return_db_connection(conn)
+
+
+@media_bp.route('/media/<int:lesson_id>/url')
+def get_lesson_media_url(lesson_id):
+    """Mint a fresh file URL, e.g. for a player whose signed URL has expired."""
+    lesson, error = load_authorized_lesson(lesson_id)
+    if error:
+        return error
+    response = jsonify({'url': lesson_file_url(dict(lesson), download=request.args.get('download') == '1'),
+                        'expires_in': MEDIA_URL_TTL if signed_lesson_url(lesson['file_path']) else None})
+    response.cache_control.no_store = True
+    return response
+
+
+@media_bp.route('/media/<int:lesson_id>', methods=['GET', 'HEAD'])
+def serve_lesson_media(lesson_id):
+    """Serve a lesson's uploaded file to users allowed to see the lesson."""
+    lesson, error = load_authorized_lesson(lesson_id)
+    if error:
+        return error
+
+    download_name = lesson['file_name'] or os.path.basename(lesson['file_path'])
+    width = request.args.get('w', type=int)
+    if width:
+        # Resized image variant (see utils/image_derivatives.py)
+        fmt = request.args.get('fmt', 'jpeg')
+        path = resolve_media_path(image_derivatives.variant(lesson['file_hash'], width, fmt))
+        if not path or fmt not in MIME_TYPES:
+            return jsonify({'error': 'Media not found'}), 404
+        stem = download_name.rsplit('.', 1)[0]
+        return media_response(path, f"{stem}-{width}.{'jpg' if fmt == 'jpeg' else fmt}",
+                              f"{lesson['file_hash']}-{width}-{fmt}")
+
+    path = resolve_media_path(lesson['file_path'])
+    if not path:
+        return jsonify({'error': 'Media not found'}), 404
+    return media_response(path, download_name, lesson['file_hash'])
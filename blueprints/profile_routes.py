@@ -1,4 +1,4 @@
-from flask import Blueprint, render_template_string, redirect, url_for, session, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, session, request, jsonify
 from utils.db_utils import get_db_connection, return_db_connection
 from utils.logging_utils import app_logger, log_info, log_error
 from utils.security_utils import sanitize_input
@@ -53,56 +53,7 @@ def manage_profile():
             message = "Profile updated successfully!"
             user = conn.execute("SELECT * FROM users WHERE id = ?", (user_id,)).fetchone()
 
-        return render_template_string('''
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <title>My Profile | Vibes University</title>
-            <link href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css" rel="stylesheet">
-            <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&display=swap" rel="stylesheet">
-            <style>
-                :root { --primary: #ff6b35; --bg-dark: #0f172a; --card-bg: #1e293b; --text-main: #f8fafc; --text-muted: #94a3b8; }
-                body { font-family: 'Inter', sans-serif; background: var(--bg-dark); color: var(--text-main); margin: 0; display: flex; justify-content: center; align-items: center; min-height: 100vh; }
-                .profile-card { background: var(--card-bg); padding: 48px; border-radius: 24px; box-shadow: 0 25px 50px -12px rgba(0, 0, 0, 0.5); width: 100%; max-width: 500px; border: 1px solid rgba(255, 255, 255, 0.1); }
-                h2 { color: #fff; text-align: center; margin-bottom: 32px; font-size: 2rem; }
-                .form-group { margin-bottom: 24px; }
-                label { display: block; margin-bottom: 8px; color: var(--text-muted); font-size: 0.85rem; font-weight: 600; text-transform: uppercase; }
-                input { width: 100%; padding: 14px; border-radius: 12px; border: 1px solid rgba(255, 255, 255, 0.1); background: rgba(15, 23, 42, 0.6); color: #fff; box-sizing: border-box; }
-                input:focus { border-color: var(--primary); outline: none; }
-                .btn { background: var(--primary); color: #fff; border: none; padding: 16px; width: 100%; border-radius: 12px; font-size: 1rem; font-weight: 700; cursor: pointer; margin-top: 16px; }
-                .message { text-align: center; padding: 12px; border-radius: 8px; background: rgba(16, 185, 129, 0.1); color: #10b981; margin-bottom: 24px; }
-                .back-link { display: block; text-align: center; margin-top: 24px; color: var(--text-muted); text-decoration: none; font-size: 0.9rem; }
-            </style>
-        </head>
-        <body>
-            <div class="profile-card">
-                <h2>Account Settings</h2>
-                {% if message %}<div class="message">{{ message }}</div>{% endif %}
-                <form method="post">
-                    <div class="form-group">
-                        <label>Full Name</label>
-                        <input type="text" name="full_name" value="{{ user.full_name }}" required>
-                    </div>
-                    <div class="form-group">
-                        <label>Email (Permanent)</label>
-                        <input type="email" value="{{ user.email }}" disabled style="opacity: 0.5;">
-                    </div>
-                    <div class="form-group">
-                        <label>Phone Number</label>
-                        <input type="text" name="phone" value="{{ user.phone }}" required>
-                    </div>
-                    <div class="form-group">
-                        <label>New Password (leave blank to keep current)</label>
-                        <input type="password" name="new_password" placeholder="••••••••">
-                    </div>
-                    <button type="submit" class="btn">Update Profile</button>
-                </form>
-                <a href="{{ url_for('main_bp.dashboard') if role == 'student' else url_for('teacher_auth_bp.teacher_dashboard') }}" class="back-link">← Back to Dashboard</a>
-            </div>
-        </body>
-        </html>
-        ''', user=user, message=message, role=role)
+        return render_template('profile.html', user=user, message=message, role=role)
     except Exception as e:
         log_error(app_logger, "Profile error", error=str(e))
         return "Error", 500
@@ -34,8 +34,8 @@ def get_stats():
     try:
         conn = get_db_connection()
         user_count = conn.execute('SELECT COUNT(*) as count FROM users').fetchone()['count']
-        enrollment_count = conn.execute("SELECT COUNT(*) as count FROM enrollments WHERE payment_status = 'completed'").fetchone()['count']
-        total_revenue = conn.execute("SELECT SUM(price) as total FROM enrollments WHERE payment_status = 'completed'").fetchone()['total'] or 0
+        enrollment_count = conn.execute("SELECT COALESCE(SUM(enrollments), 0) as count FROM enrollment_daily_rollup WHERE payment_status = 'completed'").fetchone()['count']
+        total_revenue = conn.execute("SELECT SUM(revenue) as total FROM enrollment_daily_rollup WHERE payment_status = 'completed'").fetchone()['total'] or 0
         return jsonify({
             'users': user_count,
             'enrollments': enrollment_count,
@@ -1,14 +1,22 @@
 from flask import Blueprint, render_template, render_template_string, redirect, url_for, session, request, jsonify
 import json
 import sqlite3
-import markdown
 import re
 import html
+import threading
 from utils.db_utils import get_db_connection, return_db_connection
 from utils.logging_utils import db_logger, log_error
+from utils import progress_bits
+from utils.progress_buffer import progress_buffer
+from utils.lesson_import import prerendered_html
+from utils.quiz_grading import public_element_properties
+from blueprints.media_routes import lesson_file_url, lesson_image_sources
 
 student_content_bp = Blueprint('student_content_bp', __name__)
 
+# Rendered width of lesson images, for the browser to pick a srcset candidate
+IMAGE_SIZES = '(max-width: 1000px) 100vw, 1000px'
+
 def get_file_icon(filename):
     """Get appropriate icon for file type"""
     ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
@@ -21,9 +29,22 @@ def get_file_icon(filename):
     }
     return icons.get(ext, '📎')
 
+# Markdown instances are not thread-safe, so each thread gets its own renderer.
+# It is built on first use: importing markdown and loading the extensions is
+# skipped entirely by processes that never render a text lesson.
+_markdown_local = threading.local()
+
+def get_markdown_renderer():
+    """Return this thread's Markdown renderer, creating it on first use."""
+    renderer = getattr(_markdown_local, 'renderer', None)
+    if renderer is None:
+        import markdown
+        renderer = _markdown_local.renderer = markdown.Markdown(extensions=['fenced_code', 'tables'])
+    return renderer
+
 def render_markdown_content(content):
     """Render markdown to HTML"""
-    return markdown.markdown(content, extensions=['fenced_code', 'tables'])
+    return get_markdown_renderer().reset().convert(content)
 
 @student_content_bp.route('/courses')
 def student_courses():
@@ -39,12 +60,13 @@ def student_courses():
 
         lessons = []
         modules = {}
+        completed_bits = b''
 
         if course_details:
             target_course_id = course_details['id']
             lessons_data = conn.execute('''
                 SELECT l.id, l.course_id, l.module_id, m.name as module_name, l.lesson, l.description, l.file_path, l.content_type, l.element_properties,
-                       COALESCE(l.order_index, 1) as order_index
+                       COALESCE(l.order_index, 1) as order_index, l.progress_bit
                 FROM lessons l JOIN modules m ON l.module_id = m.id
                 WHERE l.course_id = ?
                 ORDER BY m.order_index, l.order_index, l.lesson
@@ -63,11 +85,8 @@ def student_courses():
                     modules[module_name_from_join] = []
                 modules[module_name_from_join].append(lesson_dict)
 
-        progress_data = conn.execute("SELECT course_id, lesson_id, completed FROM course_progress WHERE user_id = ?", (enrollment['user_id'],)).fetchall()
-        progress_lookup = {}
-        for p_row in progress_data:
-            key = f"{p_row['course_id']}_{p_row['lesson_id']}"
-            progress_lookup[key] = p_row['completed']
+            # One bitmap row holds the student's completions for the whole course
+            completed_bits = progress_bits.load_bits(conn, enrollment['user_id'], target_course_id)
     except Exception as e:
         log_error(db_logger, "Failed to retrieve student courses data", error=str(e))
         return "Error loading courses", 500
@@ -75,12 +94,17 @@ def student_courses():
         if conn:
             return_db_connection(conn)
 
-    completed_count_for_this_course = 0
     if course_details:
+        pending = {lesson_id for course_id, lesson_id in progress_buffer.pending_for(enrollment['user_id'])
+                   if course_id == course_details['id']}
         for lesson_item in lessons:
-            progress_key = f"{course_details['id']}_{lesson_item['id']}"
-            if progress_lookup.get(progress_key):
-                completed_count_for_this_course +=1
+            if lesson_item['id'] in pending:
+                completed_bits = progress_bits.set_bit(completed_bits, lesson_item['progress_bit'])
+    for lesson_item in lessons:
+        lesson_item['completed'] = progress_bits.test_bit(completed_bits, lesson_item['progress_bit'])
+    # Only bits of lessons that still exist count towards the percentage
+    completed_count_for_this_course = progress_bits.popcount(
+        completed_bits, progress_bits.mask_for(lesson_item['progress_bit'] for lesson_item in lessons))
 
     total_lessons_for_this_course = len(lessons)
     overall_progress_percent = int(completed_count_for_this_course / total_lessons_for_this_course * 100) if total_lessons_for_this_course > 0 else 0
@@ -89,7 +113,6 @@ def student_courses():
                            enrollment=enrollment,
                            modules=modules,
                            lessons=lessons,
-                           progress_lookup=progress_lookup,
                            get_file_icon=get_file_icon,
                            course_details=course_details,
                            completed_count_for_this_course=completed_count_for_this_course,
@@ -114,6 +137,11 @@ def view_lesson(lesson_id):
             lesson['element_properties'] = json.loads(lesson_data_row['element_properties']) if lesson_data_row['element_properties'] else {}
         except (json.JSONDecodeError, TypeError):
             lesson['element_properties'] = {}
+        # Bulk-imported lessons carry their HTML, rendered at import time
+        prerendered = None
+        if lesson.get('content_type') in ('text', 'markdown'):
+            md_source = lesson['element_properties'].get('markdown_content', lesson.get('description', ''))
+            prerendered = prerendered_html(conn, lesson_id, md_source) if md_source else None
 
         enrolled_course_name_from_session = enrollment['course_type']
         enrolled_course_details = conn.execute('SELECT id FROM courses WHERE name = ?', (enrolled_course_name_from_session,)).fetchone()
@@ -134,12 +162,13 @@ def view_lesson(lesson_id):
             return_db_connection(conn)
 
     content_type = lesson.get('content_type', 'file')
-    element_props = lesson.get('element_properties', {})
+    # Quizzes are graded server-side; the answer key never goes to the browser
+    element_props = lesson['element_properties'] = public_element_properties(lesson.get('element_properties', {}))
     lesson_render_content = '<p>No content available for this lesson.</p>'
 
     if content_type == 'text' or content_type == 'markdown':
         md_content = element_props.get('markdown_content', lesson.get('description', ''))
-        lesson_render_content = f'<div class="markdown-body">{render_markdown_content(md_content if md_content else "No text content provided.")}</div>'
+        lesson_render_content = f'<div class="markdown-body">{prerendered or render_markdown_content(md_content if md_content else "No text content provided.")}</div>'
     elif content_type == 'video':
         video_url_prop = element_props.get('url')
         file_path = lesson.get('file_path')
@@ -149,7 +178,7 @@ def view_lesson(lesson_id):
                 lesson_render_content = f'''<div class="video-wrapper"><iframe src="https://www.youtube.com/embed/{video_id}" allowfullscreen></iframe></div>'''
              else: lesson_render_content = f'''<div class="video-wrapper"><video controls><source src="{video_url_prop}">Not supported.</video></div>'''
         elif file_path:
-            file_url = url_for('static', filename=file_path.split('static/')[-1])
+            file_url = lesson_file_url(lesson)
             lesson_render_content = f'''<div class="video-wrapper"><video controls><source src="{file_url}" type="video/{file_path.split('.')[-1].lower()}">Not supported.</video></div>'''
         else: lesson_render_content = '<p>Video content not available.</p>'
     elif content_type == 'quiz':
@@ -165,14 +194,19 @@ def view_lesson(lesson_id):
                 <div id="quiz-feedback-{lesson['id']}"></div>
             </div>'''
     elif content_type == 'download' and lesson.get('file_path'):
-        file_url = url_for('static', filename=lesson['file_path'].split('static/')[-1])
-        filename = html.escape(lesson['file_path'].split('/')[-1])
-        lesson_render_content = f'''<div class="download-section"><h3>{get_file_icon(filename)} {filename}</h3><p style="color: var(--text-muted);">Ready to download and implement.</p><a href="{file_url}" class="download-btn" download><i class="fas fa-cloud-download-alt"></i> Download Material</a></div>'''
+        file_url = lesson_file_url(lesson, download=True)
+        filename = html.escape(lesson.get('file_name') or lesson['file_path'].split('/')[-1])
+        lesson_render_content = f'''<div class="download-section"><h3>{get_file_icon(filename)} {filename}</h3><p style="color: var(--text-muted);">Ready to download and implement.</p><a href="{file_url}" class="download-btn" download="{filename}"><i class="fas fa-cloud-download-alt"></i> Download Material</a></div>'''
     elif lesson.get('file_path'):
-         file_url = url_for('static', filename=lesson['file_path'].split('static/')[-1])
-         filename = html.escape(lesson['file_path'].split('/')[-1])
-         if filename.split('.')[-1].lower() in ['jpg','png','gif','svg']: html_content = f"<img src='{file_url}' style='max-width:100%; border-radius: 20px;'>"
-         else: html_content = f"<div class='download-section'><a href='{file_url}' download class='download-btn'><i class='fas fa-file-download'></i> Download {filename}</a></div>"
+         file_url = lesson_file_url(lesson)
+         filename = html.escape(lesson.get('file_name') or lesson['file_path'].split('/')[-1])
+         image_sources = lesson_image_sources(lesson)
+         if image_sources:
+             # Resized variants: the browser picks the smallest one that fills the layout
+             webp_source = f"<source type='image/webp' srcset='{image_sources['webp']}' sizes='{IMAGE_SIZES}'>" if image_sources['webp'] else ''
+             html_content = f"<picture>{webp_source}<img src='{image_sources['src']}' srcset='{image_sources['jpeg']}' sizes='{IMAGE_SIZES}' width='{image_sources['width']}' height='{image_sources['height']}' alt='{filename}' loading='lazy' decoding='async' style='max-width:100%; height:auto; border-radius: 20px;'></picture>"
+         elif filename.split('.')[-1].lower() in ['jpg','jpeg','png','gif','svg']: html_content = f"<img src='{file_url}' style='max-width:100%; border-radius: 20px;'>"
+         else: html_content = f"<div class='download-section'><a href='{file_url}' download='{filename}' class='download-btn'><i class='fas fa-file-download'></i> Download {filename}</a></div>"
          lesson_render_content = html_content
 
     return render_template('student_lesson.html',
@@ -1,6 +1,10 @@
 from flask import Blueprint, jsonify, request, session
+from werkzeug.exceptions import HTTPException
 from utils.db_utils import get_db_connection, return_db_connection
 from utils.logging_utils import app_logger, security_logger, log_info, log_error, log_warning
+from utils.progress_buffer import progress_buffer
+from utils.quiz_grading import grade_submission
+from utils.rate_limiter import rate_limit
 
 student_data_api_bp = Blueprint('student_data_api_bp', __name__, url_prefix='/api')
 
@@ -42,17 +46,28 @@ def mark_lesson_completed():
     if not all([user_id, course_id, lesson_id]): return jsonify({'error': 'Missing required fields'}), 400
     if user_id != enrollment['user_id']: return jsonify({'error': 'Unauthorized user ID mismatch'}), 403
 
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        # Using INSERT OR REPLACE to handle duplicates gracefully
-        cursor.execute("INSERT OR REPLACE INTO course_progress (user_id, course_id, lesson_id, completed, completed_at) VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)", (user_id, course_id, lesson_id))
-        conn.commit()
+        # Journaled and acknowledged now; written to the progress bitmaps in the next batch
+        progress_buffer.record(user_id, course_id, lesson_id)
         return jsonify({'success': True, 'message': 'Lesson marked as completed'})
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid IDs'}), 400
     except Exception as e:
         log_error(app_logger, "Failed to mark lesson as completed", error=str(e))
         return jsonify({'error': str(e)}), 500
-    finally:
-        if conn:
-            return_db_connection(conn)
+
+@student_data_api_bp.route('/student/submit-quiz/<int:lesson_id>', methods=['POST'])
+@rate_limit('api')
+def submit_quiz(lesson_id):
+    enrollment = session.get('enrollment')
+    if not enrollment: return jsonify({'error': 'Not authenticated'}), 401
+
+    try:
+        # Graded against the cached answer key; the attempt is written with the next progress batch
+        result = grade_submission(lesson_id, enrollment, request.get_json(silent=True))
+    except HTTPException as e:
+        return jsonify({'error': e.description}), e.code
+    except Exception as e:
+        log_error(app_logger, "Failed to grade quiz submission", lesson_id=lesson_id, error=str(e))
+        return jsonify({'error': str(e)}), 500
+    return jsonify(dict(result, success=True))
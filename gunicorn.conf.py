@@ -0,0 +1,119 @@
+"""
+Gunicorn configuration for production.
+
+Usage: gunicorn -c gunicorn.conf.py app:app
+
+Every setting can be overridden with the environment variables below, so the
+same file works on Render/Heroku (PORT, WEB_CONCURRENCY) and on a plain VM.
+"""
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+# --- Server socket ---
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+backlog = _env_int('GUNICORN_BACKLOG', 2048)
+
+# --- Worker sizing ---
+# Requests are mostly SQLite reads plus template rendering, so each process is
+# given a few threads to overlap I/O. SQLite allows a single writer at a time,
+# so the process count is capped instead of growing with every core.
+cpu_count = multiprocessing.cpu_count()
+workers = _env_int('WEB_CONCURRENCY', min(2 * cpu_count + 1, _env_int('GUNICORN_MAX_WORKERS', 8)))
+threads = _env_int('GUNICORN_THREADS', 4)
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Each thread needs its own connection; keep the per-worker pool at least that large
+db_pool_size = max(threads, _env_int('DATABASE_POOL_SIZE', 10))
+
+# --- Application loading ---
+# Import the app once in the master and fork workers from it (copy-on-write
+# memory, faster worker boot). Per-process resources are rebuilt in post_fork.
+preload_app = _env_bool('GUNICORN_PRELOAD', True)
+
+# --- Timeouts and recycling ---
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+# Recycle workers periodically to bound memory growth; jitter avoids all
+# workers restarting at the same moment
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+# Heartbeat files on tmpfs so a slow disk can't make workers look dead
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# --- Logging ---
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+# --- Server hooks ---
+def on_starting(server):
+    """Master process: create tables once and drop stale metrics snapshots."""
+    from utils.db_utils import db_manager
+    from utils.metrics import metrics_registry
+
+    db_manager.initialize_database()
+    metrics_registry.clear_snapshots()
+
+
+def when_ready(server):
+    """Master process: drop pooled connections and pre-compile templates before forking."""
+    from utils.db_utils import db_manager
+
+    db_manager.close_all_connections()
+    if preload_app:
+        # Compile templates once in the master; forked workers inherit them
+        from utils.template_cache import warm_template_cache
+
+        warm_template_cache(server.app.wsgi())
+    server.log.info("Gunicorn ready: %s workers x %s threads (%s)", workers, threads, worker_class)
+
+
+def post_fork(server, worker):
+    """Worker process: rebuild per-process state inherited from the master."""
+    from utils.db_utils import db_manager
+    from utils.health import health_checker
+    from utils.image_derivatives import image_derivatives
+    from utils.logging_utils import restart_logging
+    from utils.metrics import metrics_registry
+    from utils.progress_buffer import progress_buffer
+    from utils.rate_limiter import rate_limiter
+    from utils.upload_gc import upload_gc
+
+    restart_logging()
+    db_manager.reset_pool(pool_size=db_pool_size)
+    metrics_registry.reset()
+    rate_limiter.reset()
+    health_checker.reset()
+    image_derivatives.reset()
+    progress_buffer.reset()
+    progress_buffer.start()
+    upload_gc.start()
+
+
+def worker_exit(server, worker):
+    """Worker process: persist final metrics and buffered progress before the process goes away."""
+    from utils.metrics import metrics_registry
+    from utils.progress_buffer import progress_buffer
+
+    progress_buffer.flush_quietly()
+
+    try:
+        metrics_registry.retire()
+    except OSError:
+        pass
@@ -0,0 +1,127 @@
+"""
+Standalone verifier for signed lesson file URLs.
+
+A tiny WSGI app that checks URLs minted by the main app (see
+utils/signed_urls.py) without touching Flask or the database, so lesson
+bytes never pass through the application workers.
+
+Usage:
+    gunicorn -w 2 -b 127.0.0.1:5001 media_verifier:application
+
+Modes (MEDIA_VERIFIER_MODE):
+    auth  - for nginx `auth_request`: answers 204 or 403 for the URI in the
+            X-Original-URI header; nginx then serves the file itself
+    serve - checks the URL and streams the file from UPLOAD_DIR (with Range
+            support) for deployments without nginx
+
+Environment: SECRET_KEY, SECRET_KEY_FALLBACKS (comma separated previous keys),
+UPLOAD_DIR, MEDIA_SIGNED_URL_PREFIX, MEDIA_URL_KEY_PERIOD, MEDIA_MAX_AGE.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+from utils.signed_urls import DEFAULT_KEY_PERIOD, verify_path
+
+SECRET_KEYS = [os.environ.get('SECRET_KEY', 'vibes-university-secret-key')] + \
+    [key.strip() for key in os.environ.get('SECRET_KEY_FALLBACKS', '').split(',') if key.strip()]
+UPLOAD_DIR = os.path.realpath(os.environ.get('UPLOAD_DIR', 'uploads'))
+PREFIX = os.environ.get('MEDIA_SIGNED_URL_PREFIX', '/signed-media').rstrip('/')
+KEY_PERIOD = int(os.environ.get('MEDIA_URL_KEY_PERIOD', DEFAULT_KEY_PERIOD))
+MODE = os.environ.get('MEDIA_VERIFIER_MODE', 'serve')
+MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 3600))
+CHUNK_SIZE = 256 * 1024
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _reply(start_response, status, headers=(), body=b''):
+    start_response(status, [('Content-Length', str(len(body)))] + list(headers))
+    return [body]
+
+
+def check(request_uri):
+    """Verify a raw request URI (path + query). Returns (ok, reason, path)."""
+    parts = urlsplit(request_uri)
+    path = quote(unquote(parts.path))
+    if not path.startswith(PREFIX + '/'):
+        return False, 'unknown prefix', path
+    return verify_path(path, dict(parse_qsl(parts.query)), SECRET_KEYS, KEY_PERIOD) + (path,)
+
+
+def _file_for(path):
+    """Absolute file path for a verified URL path, or None if it escapes UPLOAD_DIR."""
+    file_path = os.path.realpath(os.path.join(UPLOAD_DIR, unquote(path[len(PREFIX) + 1:])))
+    if not file_path.startswith(UPLOAD_DIR + os.sep) or not os.path.isfile(file_path):
+        return None
+    return file_path
+
+
+def _iter_file(f, offset, length):
+    try:
+        f.seek(offset)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def serve(environ, start_response, path):
+    file_path = _file_for(path)
+    if not file_path:
+        return _reply(start_response, '404 Not Found')
+    size = os.path.getsize(file_path)
+    # Content-addressed names: the file name is the sha256, so it doubles as the ETag
+    etag = '"%s"' % os.path.basename(file_path).split('.')[0]
+    headers = [('Content-Type', mimetypes.guess_type(file_path)[0] or 'application/octet-stream'),
+               ('Accept-Ranges', 'bytes'), ('ETag', etag),
+               ('Cache-Control', f'private, max-age={MAX_AGE}')]
+    if environ.get('HTTP_IF_NONE_MATCH') == etag:
+        start_response('304 Not Modified', headers)
+        return []
+
+    status, offset, length = '200 OK', 0, size
+    match = _RANGE_RE.match(environ.get('HTTP_RANGE', ''))
+    if match and (match.group(1) or match.group(2)):
+        start, end = match.groups()
+        if start:
+            offset = int(start)
+            last = min(int(end), size - 1) if end else size - 1
+        else:
+            offset = max(size - int(end), 0)
+            last = size - 1
+        if offset >= size or last < offset:
+            return _reply(start_response, '416 Range Not Satisfiable', [('Content-Range', f'bytes */{size}')])
+        status, length = '206 Partial Content', last - offset + 1
+        headers.append(('Content-Range', f'bytes {offset}-{last}/{size}'))
+
+    start_response(status, headers + [('Content-Length', str(length))])
+    if environ['REQUEST_METHOD'] == 'HEAD':
+        return []
+    f = open(file_path, 'rb')
+    if status == '200 OK' and 'wsgi.file_wrapper' in environ:
+        # Lets the server use sendfile(2)
+        return environ['wsgi.file_wrapper'](f, CHUNK_SIZE)
+    return _iter_file(f, offset, length)
+
+
+def application(environ, start_response):
+    if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+        return _reply(start_response, '405 Method Not Allowed', [('Allow', 'GET, HEAD')])
+    if MODE == 'auth':
+        request_uri = environ.get('HTTP_X_ORIGINAL_URI', '')
+    else:
+        request_uri = environ.get('RAW_URI') or environ.get('REQUEST_URI') or (
+            quote(environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')) +
+            ('?' + environ['QUERY_STRING'] if environ.get('QUERY_STRING') else ''))
+    ok, reason, path = check(request_uri)
+    if not ok:
+        return _reply(start_response, '403 Forbidden', [('Content-Type', 'text/plain'), ('X-Media-Denied', reason)],
+                      reason.encode('ascii'))
+    if MODE == 'auth':
+        return _reply(start_response, '204 No Content')
+    return serve(environ, start_response, path)
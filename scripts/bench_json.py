@@ -0,0 +1,133 @@
+"""
+JSON serialization benchmark for large course responses.
+
+Seeds a temporary database with one course of N lessons (default 10,000)
+and measures CPU time and peak Python memory (tracemalloc) for building the
+GET /api/admin/courses/<id> response body:
+  * legacy  - fetchall(), json.loads(element_properties) per row, jsonify
+  * stdlib  - streamed response, element_properties passed through, stdlib encoder
+  * orjson  - same, with the orjson encoder (if installed)
+
+Usage:
+    python scripts/bench_json.py [--lessons 10000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def seed(db_manager, lessons):
+    with db_manager.get_db_cursor() as (conn, cursor):
+        cursor.execute("INSERT INTO courses (name, description, course_settings) VALUES (?, ?, ?)",
+                       ('Bench course', 'Benchmark', json.dumps({'theme': 'dark'})))
+        course_id = cursor.lastrowid
+        module_ids = []
+        for index in range(20):
+            cursor.execute("INSERT INTO modules (course_id, name, description, order_index) VALUES (?, ?, ?, ?)",
+                           (course_id, f'Module {index}', 'Module description', index))
+            module_ids.append(cursor.lastrowid)
+        properties = json.dumps({'content': 'Lorem ipsum dolor sit amet. ' * 20, 'duration': '10:00',
+                                 'options': ['a', 'b', 'c', 'd'], 'correct_answer': 'a'})
+        cursor.executemany("""
+            INSERT INTO lessons (course_id, module_id, lesson, description, element_properties, content_type, order_index)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, [(course_id, module_ids[i % len(module_ids)], f'Lesson {i}', 'Lesson description',
+               properties, 'text', i) for i in range(lessons)])
+    return course_id
+
+
+def legacy_get_course(app, course_id):
+    """The pre-streaming implementation, for comparison."""
+    from flask import jsonify
+    from utils.db_utils import get_db_connection, return_db_connection
+
+    conn = get_db_connection()
+    try:
+        course_data = conn.execute("SELECT id, name, description, course_settings, content_version FROM courses WHERE id = ?", (course_id,)).fetchone()
+        modules_data = conn.execute("SELECT id, name, description, order_index FROM modules WHERE course_id = ? ORDER BY order_index", (course_id,)).fetchall()
+        lessons_data = conn.execute("""
+            SELECT l.id, l.lesson, l.description, l.content_type, l.element_properties,
+                   l.file_path, l.file_name, l.file_size, l.order_index, l.module_id, m.name as module_name
+            FROM lessons l JOIN modules m ON l.module_id = m.id
+            WHERE l.course_id = ? ORDER BY m.order_index, l.order_index
+        """, (course_id,)).fetchall()
+    finally:
+        return_db_connection(conn)
+    course = dict(course_data)
+    course['course_settings'] = json.loads(course_data['course_settings'])
+    course['version'] = course.pop('content_version') or 0  # Same document as the current view
+    course['modules'] = [dict(module) for module in modules_data]
+    course['lessons'] = []
+    for lesson_row in lessons_data:
+        lesson_dict = dict(lesson_row)
+        lesson_dict['element_properties'] = json.loads(lesson_row['element_properties'])
+        course['lessons'].append(lesson_dict)
+    return jsonify(course)
+
+
+def measure(label, build_response, repeat):
+    best_cpu = None
+    peak = 0
+    size = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        started = time.process_time()
+        response = build_response()
+        # Consume the body the way a WSGI server would, without keeping it
+        size = sum(len(chunk) for chunk in response.iter_encoded())
+        response.close()
+        cpu = time.process_time() - started
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    print(f"{label:<8} {best_cpu * 1000:>9.1f} ms CPU {peak / 1024 / 1024:>9.1f} MB peak {size / 1024:>10.0f} KB")
+    # Parsed body, to check every variant returns the same document
+    response = build_response()
+    body = json.loads(b''.join(response.iter_encoded()))
+    response.close()
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Large course JSON response benchmark')
+    parser.add_argument('--lessons', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.update(DATABASE_PATH=os.path.join(tmp_dir, 'bench.db'), LOG_FILE='', LOG_LEVEL='WARNING')
+        from app import create_app
+        from blueprints.admin_api_routes import api_admin_get_course
+        from utils.db_utils import db_manager
+        from utils.json_utils import orjson
+
+        db_manager.initialize_database()
+        course_id = seed(db_manager, args.lessons)
+        app = create_app({'JINJA_BYTECODE_CACHE_DIR': os.path.join(tmp_dir, 'jinja')})
+        # Call the view function directly, without the auth decorator
+        view = api_admin_get_course.__wrapped__
+
+        print(f"{args.lessons} lessons")
+        results = []
+        with app.test_request_context('/'):
+            app.json.use_orjson = False
+            results.append(measure('legacy', lambda: legacy_get_course(app, course_id), args.repeat))
+            results.append(measure('stdlib', lambda: view(course_id), args.repeat))
+            if orjson is not None:
+                app.json.use_orjson = True
+                results.append(measure('orjson', lambda: view(course_id), args.repeat))
+
+        if any(result != results[0] for result in results):
+            print("ERROR: responses differ")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Template rendering benchmark.
+
+Compares, for the pages that used to be rendered from inline strings:
+  * render_template_string(source)  - parse + compile on every request (old)
+  * render_template(name)           - compiled once per process (new)
+
+and reports how many times Jinja compiled a template while serving the
+named-template requests (expected: 0 after the first render), plus the cold
+load time of a fresh environment with and without the on-disk bytecode cache.
+
+Usage:
+    python scripts/bench_templates.py [--iterations 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# Template name -> context needed to render it
+PAGES = {
+    'admin_login.html': {'message': '', 'csrf_token': 'x'},
+    'admin_users.html': {'users': []},
+    'teacher_students.html': {'students': []},
+    'profile.html': {'user': {'full_name': 'A', 'email': 'a@b.c', 'phone': '1'}, 'message': '', 'role': 'student'},
+    'teacher_course_studio.html': {},
+}
+
+
+def timed(fn, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - started) / iterations * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='render_template_string vs. cached named templates')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ.update(DATABASE_PATH=os.path.join(tmp_dir, 'bench.db'), LOG_FILE='', LOG_LEVEL='WARNING')
+        from flask import render_template, render_template_string
+        from app import create_app
+
+        app = create_app({'JINJA_BYTECODE_CACHE_DIR': os.path.join(tmp_dir, 'jinja')})
+        compiles = {'count': 0}
+        original_compile = app.jinja_env.compile
+
+        def counting_compile(*a, **kw):
+            compiles['count'] += 1
+            return original_compile(*a, **kw)
+
+        app.jinja_env.compile = counting_compile
+
+        print(f"{'template':<30} {'string ms':>10} {'named ms':>10} {'speedup':>8} {'compiles':>9}")
+        with app.test_request_context('/'):
+            for name, context in PAGES.items():
+                source = app.jinja_env.loader.get_source(app.jinja_env, name)[0]
+                string_ms = timed(lambda: render_template_string(source, **context), args.iterations)
+
+                render_template(name, **context)  # first render compiles (or loads bytecode)
+                compiles['count'] = 0
+                named_ms = timed(lambda: render_template(name, **context), args.iterations)
+                print(f"{name:<30} {string_ms:>10.3f} {named_ms:>10.3f} {string_ms / named_ms:>7.1f}x {compiles['count']:>9}")
+
+        # Cold worker start: a fresh app loading every template, without and with bytecode
+        cold_dir = os.path.join(tmp_dir, 'cold')
+        for label, cache_dir in (('empty bytecode cache', cold_dir), ('warm bytecode cache', cold_dir)):
+            fresh = create_app({'JINJA_BYTECODE_CACHE_DIR': cache_dir})
+            started = time.perf_counter()
+            for name in PAGES:
+                fresh.jinja_env.get_template(name)
+            print(f"cold load, {label:<22} {(time.perf_counter() - started) * 1000:>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
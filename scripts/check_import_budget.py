@@ -0,0 +1,91 @@
+"""
+Import-time budget check.
+
+Measures, each in a fresh interpreter:
+  * `import app`            - what one-off scripts and the gunicorn master pay
+  * `create_app()`          - what a worker pays to boot the full application
+  * `init_db()` on a temp DB - a typical short-lived CLI task
+
+and fails (exit code 1) if wall time or peak RSS exceed the budgets, or if
+`import app` pulls in modules that should only load lazily.
+
+Usage:
+    python scripts/check_import_budget.py [--import-ms 250] [--boot-ms 1500] [--rss-mb 80]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded just by importing app.py
+LAZY_MODULES = ('markdown', 'blueprints.main_routes', 'blueprints.teacher_courses_routes', 'flask_cors')
+
+PROBE = r"""
+import json, resource, sqlite3, sys, time
+opened = []
+_connect = sqlite3.connect
+sqlite3.connect = lambda *a, **kw: opened.append(a[0] if a else kw.get('database')) or _connect(*a, **kw)
+started = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'ms': elapsed * 1000, 'rss_mb': rss_kb / 1024, 'connections': len(opened),
+                   'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+SCENARIOS = {
+    'import app': "import app",
+    'create_app()': "import app\napp.create_app()",
+    'init_db()': "import app\napp.init_db()",
+}
+
+
+def run_probe(code, env):
+    source = PROBE.format(code=code, lazy=LAZY_MODULES)
+    output = subprocess.run([sys.executable, '-c', source], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check import/boot time budgets')
+    parser.add_argument('--import-ms', type=float, default=250.0, help='Budget for `import app`')
+    parser.add_argument('--boot-ms', type=float, default=1500.0, help='Budget for create_app()')
+    parser.add_argument('--rss-mb', type=float, default=80.0, help='Peak RSS budget for `import app`')
+    parser.add_argument('--runs', type=int, default=3, help='Take the best of N runs')
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp_dir, 'budget.db'), LOG_FILE='',
+                   METRICS_DIR=os.path.join(tmp_dir, 'metrics'))
+        results = {}
+        for name, code in SCENARIOS.items():
+            runs = [run_probe(code, env) for _ in range(args.runs)]
+            results[name] = min(runs, key=lambda r: r['ms'])
+            r = results[name]
+            print(f"{name:<14} {r['ms']:>8.1f} ms  {r['rss_mb']:>6.1f} MB  connections={r['connections']}  lazy modules loaded={r['loaded']}")
+
+    imported = results['import app']
+    if imported['ms'] > args.import_ms:
+        failures.append(f"`import app` took {imported['ms']:.1f} ms (budget {args.import_ms} ms)")
+    if imported['rss_mb'] > args.rss_mb:
+        failures.append(f"`import app` peaked at {imported['rss_mb']:.1f} MB (budget {args.rss_mb} MB)")
+    if imported['loaded']:
+        failures.append(f"`import app` eagerly loaded {imported['loaded']}")
+    if imported['connections']:
+        failures.append(f"`import app` opened {imported['connections']} database connection(s)")
+    if results['create_app()']['ms'] > args.boot_ms:
+        failures.append(f"create_app() took {results['create_app()']['ms']:.1f} ms (budget {args.boot_ms} ms)")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
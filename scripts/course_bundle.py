@@ -0,0 +1,80 @@
+"""
+Export a course to a zip bundle, or import one, from the command line.
+
+Uses the same code as the admin and teacher export/import endpoints, with
+the database and upload store from DATABASE_PATH and UPLOAD_DIR.
+
+Usage:
+    python scripts/course_bundle.py export <course_id> [-o course.zip]
+    python scripts/course_bundle.py import course.zip [--name "New name"] [--teacher-id N]
+"""
+import argparse
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def export_course(args):
+    from utils.course_bundle import bundle_filename, export_bundle, load_course
+    from utils.db_utils import get_db_connection, return_db_connection
+
+    conn = get_db_connection()
+    try:
+        loaded = load_course(conn, args.course_id)
+    finally:
+        return_db_connection(conn)
+    if not loaded:
+        print(f"Course {args.course_id} not found")
+        sys.exit(1)
+
+    manifest, lesson_rows = loaded
+    output = args.output or bundle_filename(manifest)
+    size = 0
+    with open(output, 'wb') as f:
+        for chunk in export_bundle(manifest, lesson_rows):
+            f.write(chunk)
+            size += len(chunk)
+    print(f"Exported {manifest['course']['name']!r}: {len(manifest['modules'])} modules, "
+          f"{len(lesson_rows)} lessons -> {output} ({size} bytes)")
+
+
+def import_course(args):
+    from utils.course_bundle import BundleError, import_bundle
+    from utils.db_utils import get_db_connection, return_db_connection
+
+    conn = get_db_connection()
+    try:
+        result = import_bundle(conn, args.bundle, name=args.name, teacher_id=args.teacher_id)
+    except BundleError as e:
+        print(f"Import failed: {e}")
+        sys.exit(1)
+    finally:
+        return_db_connection(conn)
+    print(f"Imported {result['name']!r} as course {result['course_id']}: {result['modules']} modules, "
+          f"{result['lessons']} lessons, {result['files_stored']} files stored, "
+          f"{result['files_deduplicated']} already present")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export or import course bundles')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = commands.add_parser('export', help='write a course to a zip bundle')
+    export_parser.add_argument('course_id', type=int)
+    export_parser.add_argument('-o', '--output', help='output file (default: <course name>.zip)')
+    export_parser.set_defaults(func=export_course)
+
+    import_parser = commands.add_parser('import', help='create a course from a zip bundle')
+    import_parser.add_argument('bundle')
+    import_parser.add_argument('--name', help='course name to use instead of the bundled one')
+    import_parser.add_argument('--teacher-id', type=int, help='owner of the imported course')
+    import_parser.set_defaults(func=import_course)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Backfill resized WebP/JPEG variants for lesson images.
+
+New uploads get their variants in the background; this builds them for images
+uploaded before the pipeline existed (or after changing IMAGE_DERIVATIVE_WIDTHS
+/ IMAGE_DERIVATIVE_FORMATS, with --force). Images are processed in parallel
+with the same settings and thread pool size as the app.
+
+Usage:
+    python scripts/generate_image_derivatives.py [--force]
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate resized variants of uploaded lesson images')
+    parser.add_argument('--force', action='store_true', help='rebuild variants that already exist')
+    args = parser.parse_args()
+
+    from flask import Flask
+    from utils.db_utils import db_manager
+    from utils.image_derivatives import PILLOW_AVAILABLE, image_derivatives
+    from utils.upload_utils import upload_storage
+
+    if not PILLOW_AVAILABLE:
+        print("Pillow is not installed (pip install Pillow)")
+        sys.exit(1)
+    app = Flask(__name__)
+    upload_storage.init_app(app)
+    image_derivatives.init_app(app)
+
+    with db_manager.get_db_cursor() as (conn, cursor):
+        rows = cursor.execute(
+            'SELECT DISTINCT file_path, file_hash FROM lessons WHERE file_hash IS NOT NULL').fetchall()
+    images = [(row['file_path'], row['file_hash']) for row in rows
+              if image_derivatives.is_image(row['file_path']) and os.path.isfile(row['file_path'])
+              and (args.force or image_derivatives.manifest(row['file_hash']) is None)]
+
+    def generate(image):
+        try:
+            return image_derivatives.generate(*image)
+        except Exception as e:
+            print(f"{image[0]}: {e}")
+            return None
+
+    done = failed = 0
+    with ThreadPoolExecutor(max_workers=image_derivatives.max_workers) as pool:
+        for manifest in pool.map(generate, images):
+            if manifest is None:
+                failed += 1
+            else:
+                done += 1
+    print(f"{done} images processed, {failed} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Import lessons into a course from a JSON/YAML spec or a folder of markdown files.
+
+Uses the same code as the teacher bulk import endpoint, with the database
+from DATABASE_PATH. See utils/lesson_import.py for the spec format.
+
+Usage:
+    python scripts/lesson_import.py <course_id> lessons.json|lessons.yaml [--workers N]
+    python scripts/lesson_import.py <course_id> lessons/ [--workers N] [--dry-run]
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def load_spec(source):
+    from utils.lesson_import import parse_markdown_files, parse_spec, read_markdown_folder
+
+    if os.path.isdir(source):
+        return parse_markdown_files(read_markdown_folder(source))
+    with open(source, encoding='utf-8') as f:
+        return parse_spec(f.read(), source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-import lessons into a course')
+    parser.add_argument('course_id', type=int)
+    parser.add_argument('source', help='JSON/YAML spec file, or a folder of markdown files')
+    parser.add_argument('--workers', type=int, help='markdown rendering processes (default: LESSON_IMPORT_WORKERS)')
+    parser.add_argument('--dry-run', action='store_true', help='validate the spec without importing it')
+    args = parser.parse_args()
+
+    from utils.db_utils import get_db_connection, return_db_connection
+    from utils.lesson_import import LessonImportError, import_lessons, validate_spec
+
+    started = time.perf_counter()
+    try:
+        spec = load_spec(args.source)
+        if args.dry_run:
+            modules = validate_spec(spec)
+            print(f"Valid: {len(modules)} modules, {sum(len(m['lessons']) for m in modules)} lessons")
+            return
+        conn = get_db_connection()
+        try:
+            result = import_lessons(conn, args.course_id, spec, workers=args.workers)
+        finally:
+            return_db_connection(conn)
+    except LessonImportError as e:
+        print('Import failed:')
+        for error in e.errors:
+            print(f'  {error}')
+        sys.exit(1)
+    if not result:
+        print(f"Course {args.course_id} not found")
+        sys.exit(1)
+    print(f"Imported {result['lessons']} lessons ({result['modules_created']} new modules, "
+          f"{result['markdown_rendered']} rendered) in {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
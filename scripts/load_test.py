@@ -0,0 +1,142 @@
+"""
+Load test: measure throughput of the gunicorn deployment as workers are added.
+
+Starts gunicorn with gunicorn.conf.py against a throwaway SQLite database for
+each worker count, drives it with a pool of client processes using keep-alive
+connections, and prints requests/second and latency percentiles.
+
+Usage:
+    python scripts/load_test.py --workers 1,2,4 --duration 10 --clients 16
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def seed_database(db_path, courses=50):
+    """Create the schema and a few courses so requests do real DB work."""
+    os.environ['DATABASE_PATH'] = db_path
+    from utils.db_utils import DatabaseManager
+
+    DatabaseManager(db_path=db_path, pool_size=1).initialize_database()
+    conn = sqlite3.connect(db_path)
+    conn.executemany('INSERT OR IGNORE INTO courses (name, description, course_settings) VALUES (?, ?, ?)',
+                     [(f"Load Test Course {i}", "Seeded by load_test.py", json.dumps({'level': i})) for i in range(courses)])
+    conn.commit()
+    conn.close()
+
+
+def wait_for_port(host, port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client_worker(args):
+    """Send requests over one keep-alive connection until the deadline."""
+    host, port, path, deadline = args
+    latencies, errors = [], 0
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+    conn.close()
+    return latencies, errors
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))
+    return sorted_values[index]
+
+
+def run_level(workers, threads, clients, duration, path, db_path, port):
+    env = dict(os.environ,
+               DATABASE_PATH=db_path,
+               WEB_CONCURRENCY=str(workers),
+               GUNICORN_THREADS=str(threads),
+               GUNICORN_BIND=f"127.0.0.1:{port}",
+               LOG_LEVEL='WARNING',
+               LOG_FILE='',
+               GUNICORN_MAX_REQUESTS='0',
+               METRICS_DIR=os.path.join(os.path.dirname(db_path), 'metrics'))
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'app:app'],
+                              cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port('127.0.0.1', port):
+            raise RuntimeError('gunicorn did not start')
+        # Warm up every worker before measuring
+        client_worker(('127.0.0.1', port, path, time.time() + 1))
+
+        deadline = time.time() + duration
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.map(client_worker, [('127.0.0.1', port, path, deadline)] * clients)
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    latencies = sorted(lat for lats, _ in results for lat in lats)
+    errors = sum(err for _, err in results)
+    return {
+        'workers': workers,
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gunicorn throughput vs. worker count')
+    parser.add_argument('--workers', default='1,2,4', help='Comma separated worker counts')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per level')
+    parser.add_argument('--path', default='/api/courses')
+    parser.add_argument('--port', type=int, default=5055)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'load_test.db')
+        seed_database(db_path)
+
+        print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'scaling':>8}")
+        baseline = None
+        for workers in [int(w) for w in args.workers.split(',')]:
+            result = run_level(workers, args.threads, args.clients, args.duration, args.path, db_path, args.port)
+            baseline = baseline or result['rps']
+            print(f"{result['workers']:>8} {result['rps']:>10.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                  f"{result['errors']:>7} {result['rps'] / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Build-time precompression of static assets.
+
+Writes <file>.gz (and <file>.br when the `brotli` package is installed) next
+to every compressible file under static/, at maximum compression level, so the
+app can serve them directly instead of compressing on each request. Siblings
+that would not be smaller than the original are skipped, and stale ones are
+rewritten when the source file changes.
+
+Usage:
+    python scripts/precompress_static.py [--static-dir static] [--min-size 500] [--clean]
+"""
+import argparse
+import gzip
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from utils.compression import PRECOMPRESSIBLE_EXTENSIONS, PRECOMPRESSED_SUFFIXES, brotli
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    # mtime=0 keeps the output byte-identical across builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def precompress(static_dir, min_size):
+    encodings = [(enc, suffix) for enc, suffix in PRECOMPRESSED_SUFFIXES if enc != 'br' or brotli is not None]
+    written = skipped = 0
+    saved = 0
+    for dirpath, _, filenames in os.walk(static_dir):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.splitext(name)[1] not in PRECOMPRESSIBLE_EXTENSIONS:
+                continue
+            size = os.path.getsize(path)
+            if size < min_size:
+                continue
+            source_mtime = os.path.getmtime(path)
+            data = None
+            for encoding, suffix in encodings:
+                target = path + suffix
+                if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                    skipped += 1
+                    continue
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                compressed = compress(data, encoding)
+                if len(compressed) >= size:
+                    if os.path.exists(target):
+                        os.remove(target)
+                    continue
+                tmp_path = target + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, target)
+                written += 1
+                saved += size - len(compressed)
+                print(f"{os.path.relpath(target, static_dir):<60} {size:>9} -> {len(compressed):>9}")
+    return written, skipped, saved
+
+
+def clean(static_dir):
+    removed = 0
+    suffixes = tuple(suffix for _, suffix in PRECOMPRESSED_SUFFIXES)
+    for dirpath, _, filenames in os.walk(static_dir):
+        for name in filenames:
+            base, ext = os.path.splitext(name)
+            if ext in suffixes and os.path.splitext(base)[1] in PRECOMPRESSIBLE_EXTENSIONS:
+                os.remove(os.path.join(dirpath, name))
+                removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write .gz/.br siblings for static assets')
+    parser.add_argument('--static-dir', default=os.path.join(ROOT_DIR, 'static'))
+    parser.add_argument('--min-size', type=int, default=500, help='skip files smaller than this (bytes)')
+    parser.add_argument('--clean', action='store_true', help='remove precompressed files instead')
+    args = parser.parse_args()
+
+    if args.clean:
+        print(f"Removed {clean(args.static_dir)} precompressed files")
+        return
+
+    if brotli is None:
+        print("brotli not installed; writing .gz only")
+    written, skipped, saved = precompress(args.static_dir, args.min_size)
+    print(f"Wrote {written} files ({saved / 1024:.1f} KiB saved), {skipped} already up to date")
+
+
+if __name__ == '__main__':
+    main()
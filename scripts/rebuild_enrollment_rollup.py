@@ -0,0 +1,44 @@
+"""
+Rebuild (backfill) the enrollment_daily_rollup table from enrollments, or check it.
+
+Triggers keep the rollup current. Run this after enrollments were loaded
+without them (e.g. restored from a backup taken before the rollup existed),
+or with --check to compare the rollup against a full recount.
+
+Usage:
+    python scripts/rebuild_enrollment_rollup.py [--check]
+"""
+import argparse
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or check the daily enrollment rollup')
+    parser.add_argument('--check', action='store_true', help='report mismatches instead of rebuilding')
+    args = parser.parse_args()
+
+    from utils import enrollment_rollup
+    from utils.db_utils import get_db_connection, return_db_connection
+
+    conn = get_db_connection()
+    try:
+        if args.check:
+            mismatches = enrollment_rollup.differences(conn)
+            for day, course_type, status, expected, found in mismatches:
+                print(f"{day or '(no date)'} {course_type} {status}: expected {expected}, found {found}")
+            print(f"{len(mismatches)} mismatched rows")
+            sys.exit(1 if mismatches else 0)
+        conn.execute('BEGIN IMMEDIATE')
+        rows = enrollment_rollup.rebuild(conn)
+        conn.commit()
+    finally:
+        return_db_connection(conn)
+    print(f"Rebuilt enrollment_daily_rollup: {rows} rows")
+
+
+if __name__ == '__main__':
+    main()
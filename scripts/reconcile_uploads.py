@@ -0,0 +1,67 @@
+"""
+Reconcile the upload store with the lessons table (for cron).
+
+Quarantines lesson files no lesson references, deletes quarantined files
+older than UPLOAD_GC_QUARANTINE_DAYS, removes orphaned image variants and
+stale temp files, then prints per-course and per-teacher storage usage. The
+app runs the same pass every UPLOAD_GC_INTERVAL_HOURS; both share a lock, so
+only one pass runs at a time.
+
+Usage:
+    python scripts/reconcile_uploads.py [--dry-run] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quarantine and delete orphaned lesson uploads')
+    parser.add_argument('--dry-run', action='store_true', help='only report what would be moved or deleted')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    from utils.upload_gc import upload_gc
+
+    report = upload_gc.run_locked(dry_run=args.dry_run)
+    if report is None:
+        print("Another reconciliation pass is running")
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    if report['aborted']:
+        print(f"ABORTED: {report['aborted']}")
+    print(f"{report['files']} files, {format_bytes(report['bytes'])} in the upload store")
+    print(f"quarantined {report['quarantined']} ({format_bytes(report['quarantined_bytes'])}), "
+          f"restored {report['restored']}, deleted {report['deleted']} ({format_bytes(report['deleted_bytes'])}), "
+          f"variants deleted {report['derived_deleted']}, temp files deleted {report['temp_deleted']}"
+          + (" [dry run]" if args.dry_run else ""))
+    storage = report['storage']
+    print(f"\nLesson files: {storage['total']['files']}, {format_bytes(storage['total']['bytes'])} "
+          f"({format_bytes(storage['total']['unique_bytes'])} unique)")
+    print("\nPer course:")
+    for course in storage['courses']:
+        print(f"  {course['name'][:40]:<40} {course['files']:>6} files {format_bytes(course['bytes']):>10}")
+    print("\nPer teacher:")
+    for teacher in storage['teachers']:
+        name = teacher['name'] or ('(no teacher)' if teacher['teacher_id'] is None else f"#{teacher['teacher_id']}")
+        print(f"  {name[:40]:<40} {teacher['courses']:>3} courses {teacher['files']:>6} files "
+              f"{format_bytes(teacher['bytes']):>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import re
+from werkzeug.security import safe_join
+
+# Only these static/ subdirectories are fingerprinted; uploaded course files
+# under static/courses keep their plain URLs
+ASSET_DIRS = ('css/', 'js/', 'images/')
+HASH_LENGTH = 12
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# name.<hash>.ext -> (name, hash, .ext)
+_FINGERPRINT_RE = re.compile(r'^(?P<name>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+
+
+class StaticAssets:
+    """
+    Content-hash fingerprinting for static assets.
+
+    url_for('static', filename='css/admin_login.css') resolves to
+    /static/css/admin_login.<hash>.css, so templates keep using plain url_for.
+    Requests for a fingerprinted name are served from the original file with
+    a one-year immutable Cache-Control header; a new deploy changes the hash
+    and therefore the URL.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self._hashes = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize asset fingerprinting with the Flask app."""
+        self.static_folder = app.static_folder
+        # Re-hash on mtime change while developing; hash once per process otherwise
+        self.check_mtime = app.debug
+
+        app.url_defaults(self._url_defaults)
+        # Wraps whatever static view is registered (e.g. the precompressed one),
+        # so register after Compression
+        app.view_functions['static'] = self._static_view(app.view_functions['static'])
+        app.jinja_env.globals['asset_url'] = self.fingerprint
+
+        # Store the extension instance in the app
+        app.extensions['static_assets'] = self
+
+    def file_hash(self, filename):
+        """Return the content hash of static/<filename>, or None if it isn't a fingerprinted asset."""
+        if not filename.startswith(ASSET_DIRS):
+            return None
+        cached = self._hashes.get(filename)
+        if cached is not None and not self.check_mtime:
+            return cached[1]
+        path = safe_join(self.static_folder, filename)
+        if path is None:
+            return None
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+        file_hash = digest.hexdigest()[:HASH_LENGTH]
+        self._hashes[filename] = (mtime, file_hash)
+        return file_hash
+
+    def fingerprint(self, filename):
+        """
+        Return the fingerprinted form of a static filename.
+
+        Args:
+            filename: Path relative to static/, e.g. 'js/teacher_course_studio.js'
+
+        Returns:
+            'js/teacher_course_studio.<hash>.js', or filename unchanged if it
+            is not a fingerprinted asset
+        """
+        file_hash = self.file_hash(filename)
+        if file_hash is None:
+            return filename
+        name, ext = os.path.splitext(filename)
+        return f"{name}.{file_hash}{ext}"
+
+    def resolve(self, filename):
+        """Map a fingerprinted filename back to (original filename, hash matched)."""
+        match = _FINGERPRINT_RE.match(filename)
+        if match:
+            original = match.group('name') + match.group('ext')
+            current = self.file_hash(original)
+            if current is not None:
+                return original, current == match.group('hash')
+        return filename, False
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = self.fingerprint(values['filename'])
+
+    def _static_view(self, original_view):
+        def static_with_fingerprints(filename):
+            original, current = self.resolve(filename)
+            response = original_view(filename=original)
+            if current and response.status_code in (200, 304):
+                response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            return response
+
+        return static_with_fingerprints
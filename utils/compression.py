@@ -0,0 +1,178 @@
+import gzip
+import mimetypes
+import os
+import zlib
+from flask import request, send_from_directory
+from werkzeug.security import safe_join
+
+from utils.security_utils import get_env_variable
+
+# Brotli is optional; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/javascript', 'text/csv',
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+
+# Suffixes written by scripts/precompress_static.py, in order of preference
+PRECOMPRESSED_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+# Static file extensions worth precompressing at build time
+PRECOMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.html', '.svg', '.json', '.txt', '.xml', '.map')
+
+
+def accepted_encodings(accept_encoding):
+    """Return the set of content codings the client accepts (q > 0)."""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def _add_vary(response):
+    vary = response.headers.get('Vary', '')
+    if 'accept-encoding' not in vary.lower():
+        response.headers['Vary'] = f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'
+
+
+class Compression:
+    """
+    Response compression middleware.
+
+    Compresses text-like responses above a size threshold with brotli (when
+    installed and accepted) or gzip, including streamed responses, and serves
+    build-time precompressed .br/.gz siblings of files under static/.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Initialize compression with the Flask app."""
+        app.config.setdefault('COMPRESS_MIN_SIZE', int(get_env_variable('COMPRESS_MIN_SIZE', 500)))
+        app.config.setdefault('COMPRESS_LEVEL', int(get_env_variable('COMPRESS_LEVEL', 6)))
+        app.config.setdefault('COMPRESS_BR_LEVEL', int(get_env_variable('COMPRESS_BR_LEVEL', 4)))
+        app.config.setdefault('COMPRESS_BROTLI', brotli is not None)
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self.br_level = app.config['COMPRESS_BR_LEVEL']
+        self.use_brotli = app.config['COMPRESS_BROTLI'] and brotli is not None
+
+        app.after_request(self.after_request)
+
+        # Serve precompressed siblings for the static endpoint
+        if 'static' in app.view_functions:
+            app.view_functions['static'] = self._static_view(app, app.view_functions['static'])
+
+        # Store the middleware instance in the app
+        app.extensions['compression'] = self
+
+    def choose_encoding(self, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        if self.use_brotli and 'br' in accepted:
+            return 'br'
+        if 'gzip' in accepted or '*' in accepted:
+            return 'gzip'
+        return None
+
+    def should_compress(self, response):
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if request.method == 'HEAD':
+            return False
+        if response.mimetype not in COMPRESSIBLE_TYPES:
+            return False
+        if not response.is_streamed and (response.content_length or 0) < self.min_size:
+            return False
+        return True
+
+    def after_request(self, response):
+        """Compress the response body when the client and content allow it."""
+        if not self.should_compress(response):
+            return response
+        encoding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        _add_vary(response)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=self.br_level))
+            else:
+                response.set_data(gzip.compress(data, compresslevel=self.level))
+
+        response.headers['Content-Encoding'] = encoding
+        # A strong ETag must change when the representation's bytes change
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _compress_stream(self, chunks, encoding):
+        """Compress an iterable body incrementally, flushing after each chunk."""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.br_level)
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                out = compressor.process(chunk) + compressor.flush()
+                if out:
+                    yield out
+            yield compressor.finish()
+        else:
+            # wbits=31 produces a gzip container
+            compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                out = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                if out:
+                    yield out
+            yield compressor.flush()
+
+    def _static_view(self, app, original_view):
+        """Wrap the static view to serve <file>.br / <file>.gz when present and accepted."""
+
+        def static_with_precompressed(filename):
+            accepted = accepted_encodings(request.headers.get('Accept-Encoding'))
+            for encoding, suffix in PRECOMPRESSED_SUFFIXES:
+                if encoding not in accepted:
+                    continue
+                compressed_path = safe_join(app.static_folder, filename + suffix)
+                if compressed_path and os.path.isfile(compressed_path):
+                    response = send_from_directory(app.static_folder, filename + suffix,
+                                                   mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                                                   max_age=app.get_send_file_max_age(filename))
+                    response.headers['Content-Encoding'] = encoding
+                    _add_vary(response)
+                    return response
+            response = original_view(filename=filename)
+            if os.path.splitext(filename)[1] in PRECOMPRESSIBLE_EXTENSIONS:
+                _add_vary(response)
+            return response
+
+        return static_with_precompressed
@@ -0,0 +1,379 @@
+"""
+Course bundles: a zip holding one course, its modules and lessons, and the
+lesson files, for moving courses between environments.
+
+Layout:
+    files/<sha256>.<ext>   one entry per distinct lesson file (stored, not deflated)
+    course.json            manifest, written last so file hashes computed while
+                           streaming can be recorded in it
+
+Export streams the zip as it is built (zipfile writes data descriptors when
+the output isn't seekable), so memory use doesn't depend on the size of the
+course. Import copies each file into the content-addressed upload store,
+skipping content that is already there, then inserts the course, modules and
+lessons with executemany in a single transaction; if that fails, the files
+it added to the store are removed again.
+
+Used by the admin and teacher APIs and by scripts/course_bundle.py.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from utils.security_utils import sanitize_input
+from utils.upload_utils import ALLOWED_EXTENSIONS, MB, HashingFile, upload_storage
+
+BUNDLE_FORMAT = 'vibes-course-bundle'
+BUNDLE_VERSION = 1
+MANIFEST_NAME = 'course.json'
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BundleError(ValueError):
+    """The bundle is malformed or can't be imported."""
+
+
+class _ZipOutput:
+    """Write-only sink for zipfile that hands out what has been written so far."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _extension(file_name):
+    return file_name.rsplit('.', 1)[1].lower() if file_name and '.' in file_name else ''
+
+
+def load_course(conn, course_id):
+    """
+    Read a course, its modules and lessons for export.
+
+    Returns:
+        Tuple of (manifest dict without file entries, list of lesson file rows), or None if not found
+    """
+    course = conn.execute('SELECT id, name, description, course_settings FROM courses WHERE id = ?',
+                          (course_id,)).fetchone()
+    if not course:
+        return None
+    modules = conn.execute('''
+        SELECT id, name, description, order_index FROM modules WHERE course_id = ? ORDER BY order_index, id
+    ''', (course_id,)).fetchall()
+    lessons = conn.execute('''
+        SELECT id, module_id, lesson, description, content_type, order_index, element_properties,
+               file_path, file_name, file_size, file_hash
+        FROM lessons WHERE course_id = ? ORDER BY module_id, order_index, id
+    ''', (course_id,)).fetchall()
+
+    def parse(value):
+        try:
+            return json.loads(value) if value else {}
+        except (TypeError, ValueError):
+            return {}
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': BUNDLE_VERSION,
+        'exported_at': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'course': {'name': course['name'], 'description': course['description'],
+                   'course_settings': parse(course['course_settings'])},
+        'modules': [dict(module) for module in modules],
+        'lessons': [],
+    }
+    for lesson in lessons:
+        lesson_dict = {key: lesson[key] for key in ('id', 'module_id', 'lesson', 'description', 'content_type',
+                                                     'order_index')}
+        lesson_dict['element_properties'] = parse(lesson['element_properties'])
+        lesson_dict['file'] = None
+        manifest['lessons'].append(lesson_dict)
+    return manifest, [dict(lesson) for lesson in lessons]
+
+
+def export_bundle(manifest, lesson_rows):
+    """
+    Generate the zip for a course, chunk by chunk.
+
+    Args:
+        manifest: first element returned by load_course
+        lesson_rows: second element returned by load_course
+
+    Yields:
+        bytes of the zip file
+    """
+    output = _ZipOutput()
+    written = {}  # file_path -> file entry, so shared files are stored once
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED, allowZip64=True) as bundle:
+        for lesson_dict, row in zip(manifest['lessons'], lesson_rows):
+            file_path = row['file_path']
+            if not file_path or not os.path.isfile(file_path):
+                continue
+            if file_path not in written:
+                extension = _extension(row['file_name'] or file_path)
+                digest = hashlib.sha256()
+                # The hash is only known up front for content-addressed files
+                arcname = f"files/{row['file_hash'] or os.urandom(16).hex()}.{extension}"
+                size = 0
+                with open(file_path, 'rb') as source, bundle.open(arcname, 'w', force_zip64=True) as target:
+                    for block in iter(lambda: source.read(COPY_CHUNK_SIZE), b''):
+                        digest.update(block)
+                        size += len(block)
+                        target.write(block)
+                        data = output.drain()
+                        if data:
+                            yield data
+                written[file_path] = {'path': arcname, 'sha256': digest.hexdigest(), 'size': size,
+                                      'name': row['file_name'] or os.path.basename(file_path)}
+            lesson_dict['file'] = written[file_path]
+        bundle.writestr(zipfile.ZipInfo(MANIFEST_NAME, date_time=datetime.utcnow().timetuple()[:6]),
+                        json.dumps(manifest, indent=1), compress_type=zipfile.ZIP_DEFLATED)
+    yield output.drain()
+
+
+def bundle_filename(manifest):
+    safe = ''.join(c if c.isalnum() or c in '-_' else '-' for c in manifest['course']['name']).strip('-')
+    return f"{safe or 'course'}.zip"
+
+
+def read_manifest(bundle):
+    """Parse and check course.json from an open ZipFile."""
+    try:
+        manifest = json.loads(bundle.read(MANIFEST_NAME))
+    except KeyError:
+        raise BundleError(f"Not a course bundle: {MANIFEST_NAME} is missing")
+    except ValueError:
+        raise BundleError(f"{MANIFEST_NAME} is not valid JSON")
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError('Not a course bundle')
+    if manifest.get('version', 0) > BUNDLE_VERSION:
+        raise BundleError(f"Bundle version {manifest.get('version')} is newer than this server supports")
+    if not (manifest.get('course') or {}).get('name'):
+        raise BundleError('Bundle has no course name')
+    return manifest
+
+
+def _optional(value, types):
+    """True if value is None or one of types (bools are never accepted as ints)."""
+    return value is None or (isinstance(value, types) and not isinstance(value, bool))
+
+
+def _check_entries(bundle, manifest, max_file_bytes=None):
+    """
+    Check the manifest's course, modules, lessons and file entries before anything is written.
+
+    Each file entry must name a member of the zip, carry a well-formed sha256
+    and an allowed extension, and declare its exact uncompressed size, so
+    extraction can be capped at that size.
+
+    Returns:
+        Dict of file path -> ZipInfo for the bundled files
+    """
+    course = manifest['course']
+    if not isinstance(course['name'], str) or not _optional(course.get('description'), str) \
+            or not _optional(course.get('course_settings'), dict):
+        raise BundleError('Bundle course name and description must be text and its settings an object')
+    modules, lessons = manifest.get('modules', []), manifest.get('lessons', [])
+    if not isinstance(modules, list) or not isinstance(lessons, list):
+        raise BundleError('Bundle modules and lessons must be lists')
+    module_ids = set()
+    for module in modules:
+        if not isinstance(module, dict) or module.get('id') is None or not _optional(module['id'], (int, str)) \
+                or not isinstance(module.get('name'), str) or not module['name']:
+            raise BundleError('Every bundled module needs an id (number or text) and a name')
+        if not _optional(module.get('description'), str) or not _optional(module.get('order_index'), int):
+            raise BundleError(f"Module {module['name']!r} has a non-text description or non-integer order_index")
+        if module['id'] in module_ids:
+            raise BundleError(f"Module id {module['id']!r} appears more than once")
+        module_ids.add(module['id'])
+
+    infos = {}
+    for lesson in lessons:
+        if not isinstance(lesson, dict):
+            raise BundleError('Every bundled lesson must be an object')
+        title = lesson.get('lesson')
+        if not _optional(title, str) or not _optional(lesson.get('description'), str) \
+                or not _optional(lesson.get('content_type'), str):
+            raise BundleError(f"Lesson {title!r} has a non-text title, description or content_type")
+        if not _optional(lesson.get('order_index'), int) or not _optional(lesson.get('element_properties'), dict):
+            raise BundleError(f"Lesson {title!r} needs an integer order_index and object element_properties")
+        if not _optional(lesson.get('module_id'), (int, str)) or lesson.get('module_id') not in module_ids:
+            raise BundleError(f"Lesson {title!r} refers to a module that isn't in the bundle")
+        entry = lesson.get('file')
+        if not entry:
+            continue
+        path = entry.get('path') if isinstance(entry, dict) else None
+        if not isinstance(path, str) or not path:
+            raise BundleError(f"File entry of lesson {title!r} has no path")
+        file_hash = entry.get('sha256')
+        if not isinstance(file_hash, str) or len(file_hash) != 64 \
+                or any(c not in '0123456789abcdef' for c in file_hash.lower()):
+            raise BundleError(f"Bad hash for {path}")
+        if _extension(path) not in ALLOWED_EXTENSIONS:
+            raise BundleError(f"File type not allowed: {path}")
+        if not _optional(entry.get('name'), str):
+            raise BundleError(f"File name of {path} must be text")
+        try:
+            info = bundle.getinfo(path)
+        except KeyError:
+            raise BundleError(f"Bundle is missing {path}")
+        size = entry.get('size')
+        if type(size) is not int or size != info.file_size:
+            raise BundleError(f"Size of {path} is missing or doesn't match the zip")
+        if max_file_bytes and size > max_file_bytes:
+            raise BundleError(f"{path} exceeds the {max_file_bytes // MB} MB limit")
+        infos[path] = info
+    return infos
+
+
+def _import_file(bundle, entry, info):
+    """
+    Copy one bundled file into the upload store unless its content is already there.
+
+    The entry has been checked by _check_entries.
+
+    Returns:
+        Tuple of (file_path, size, sha256)
+    """
+    file_hash = entry['sha256'].lower()
+    extension = _extension(entry['path'])
+    final_path = upload_storage.stored_path(file_hash, extension)
+    if final_path:
+        return final_path, os.path.getsize(final_path), file_hash  # Deduplicated
+
+    os.makedirs(upload_storage.tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=upload_storage.tmp_dir, suffix='.part')
+    os.close(fd)
+    # Never write more than the zip declares for the member (guards against zip bombs)
+    container = HashingFile(tmp_path, info.file_size or 1)  # 0 would mean no limit
+    try:
+        try:
+            with bundle.open(info) as source:
+                for block in iter(lambda: source.read(COPY_CHUNK_SIZE), b''):
+                    container.write(block)
+        except RequestEntityTooLarge:
+            raise BundleError(f"{entry['path']} is larger than declared")
+        container.file.close()
+        if container.digest.hexdigest() != file_hash:
+            raise BundleError(f"Checksum mismatch for {entry['path']}")
+        final_path = upload_storage._store(tmp_path, file_hash, extension)
+        tmp_path = None
+        return final_path, container.size, file_hash
+    finally:
+        container.file.close()
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _remove_added(conn, paths):
+    """Remove files a failed import added to the store, unless a lesson has started using one since."""
+    if not paths:
+        return
+    placeholders = ','.join('?' * len(paths))
+    referenced = {row[0] for row in conn.execute(f'SELECT file_path FROM lessons WHERE file_path IN ({placeholders})',
+                                                 paths)}
+    for path in paths:
+        if path not in referenced:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def import_bundle(conn, source, name=None, teacher_id=None, max_file_bytes=None):
+    """
+    Create a course from a bundle.
+
+    Args:
+        conn: database connection
+        source: path or seekable binary file object of the zip
+        name: course name to use instead of the bundled one
+        teacher_id: owner of the new course
+        max_file_bytes: largest lesson file accepted (default: no limit beyond the declared sizes)
+
+    Returns:
+        Dict with course_id, name and counts of modules, lessons, files stored and files deduplicated
+    """
+    try:
+        bundle = zipfile.ZipFile(source)
+    except zipfile.BadZipFile:
+        raise BundleError('Not a zip file')
+    with bundle:
+        manifest = read_manifest(bundle)
+        infos = _check_entries(bundle, manifest, max_file_bytes)
+        course = manifest['course']
+        name = name or sanitize_input(course['name'])
+        if conn.execute('SELECT 1 FROM courses WHERE name = ?', (name,)).fetchone():
+            raise BundleError(f"Course with this name already exists: {name}")
+
+        # Files go into the store before the transaction; the ones this import
+        # added are removed again if it fails
+        files, added = {}, []
+        deduplicated = 0
+        try:
+            for lesson in manifest.get('lessons', []):
+                entry = lesson.get('file')
+                if entry and entry['path'] not in files:
+                    existed = upload_storage.stored_path(entry['sha256'].lower(), _extension(entry['path']))
+                    files[entry['path']] = _import_file(bundle, entry, infos[entry['path']]) + (entry.get('name'),)
+                    if existed:
+                        deduplicated += 1
+                    else:
+                        added.append(files[entry['path']][0])
+
+            modules = manifest.get('modules', [])
+            module_ids = [module['id'] for module in modules]
+            conn.execute('BEGIN IMMEDIATE')
+            # Checked again inside the write transaction: a course may have been created while copying
+            if conn.execute('SELECT 1 FROM courses WHERE name = ?', (name,)).fetchone():
+                raise BundleError(f"Course with this name already exists: {name}")
+            cursor = conn.execute('INSERT INTO courses (name, description, course_settings, teacher_id) VALUES (?, ?, ?, ?)',
+                                  (name, sanitize_input(course.get('description')),
+                                   json.dumps(course.get('course_settings') or {}), teacher_id))
+            course_id = cursor.lastrowid
+            conn.executemany('INSERT INTO modules (course_id, name, description, order_index) VALUES (?, ?, ?, ?)',
+                             [(course_id, module['name'], module.get('description'),
+                               index if module.get('order_index') is None else module['order_index'])
+                              for index, module in enumerate(modules, 1)])
+            # AUTOINCREMENT ids only grow, so id order is insertion order
+            new_ids = [row[0] for row in conn.execute('SELECT id FROM modules WHERE course_id = ? ORDER BY id',
+                                                      (course_id,))]
+            module_map = dict(zip(module_ids, new_ids))
+
+            lesson_rows = []
+            for lesson in manifest.get('lessons', []):
+                entry = lesson.get('file')
+                file_path, file_size, file_hash, file_name = files[entry['path']] if entry else (None, None, None, None)
+                lesson_rows.append((course_id, module_map[lesson['module_id']], lesson.get('lesson'),
+                                    lesson.get('description'), file_path,
+                                    json.dumps(lesson.get('element_properties') or {}),
+                                    lesson.get('content_type') or 'file', lesson.get('order_index'),
+                                    file_size, file_hash, file_name))
+            conn.executemany('''
+                INSERT INTO lessons (course_id, module_id, lesson, description, file_path, element_properties,
+                                     content_type, order_index, file_size, file_hash, file_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', lesson_rows)
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            _remove_added(conn, added)
+            raise
+
+    return {'course_id': course_id, 'name': name, 'modules': len(modules), 'lessons': len(lesson_rows),
+            'files_stored': len(added), 'files_deduplicated': deduplicated}
@@ -0,0 +1,96 @@
+"""
+Copy a course, its modules and its lessons into a new course.
+
+Everything happens in one transaction with set-based INSERT ... SELECT
+statements (course, modules, lessons and their pre-rendered markdown); no
+row passes through Python. Lessons keep their uploaded files by
+reference: the store is content-addressed and a file is only deleted once
+no lesson points at it, so the copy and the original can be edited or
+deleted independently. Lessons also keep their progress bit numbers (with
+the course's counter), which start out with no completions in the new
+course.
+
+Used by the admin and teacher APIs.
+"""
+import sqlite3
+
+
+class CloneError(ValueError):
+    """The course can't be cloned (e.g. the new name is taken)."""
+
+
+def _copy_name(conn, name):
+    """'<name> (copy)', or '<name> (copy N)' with the first N that is free."""
+    candidate, number = f"{name} (copy)", 1
+    while conn.execute('SELECT 1 FROM courses WHERE name = ?', (candidate,)).fetchone():
+        number += 1
+        candidate = f"{name} (copy {number})"
+    return candidate
+
+
+def clone_course(conn, course_id, name=None, teacher_id=None):
+    """
+    Clone a course.
+
+    Args:
+        conn: database connection (committed or rolled back here)
+        course_id: course to copy
+        name: name of the copy (default: '<name> (copy)')
+        teacher_id: owner of the copy
+
+    Returns:
+        Dict with the new course_id, its name and the number of modules and
+        lessons copied, or None if the course doesn't exist
+
+    Raises:
+        CloneError: a course with that name already exists
+    """
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        source = conn.execute('SELECT name FROM courses WHERE id = ?', (course_id,)).fetchone()
+        if not source:
+            conn.rollback()
+            return None
+        name = name or _copy_name(conn, source['name'])
+        if conn.execute('SELECT 1 FROM courses WHERE name = ?', (name,)).fetchone():
+            raise CloneError(f"Course with this name already exists: {name}")
+
+        new_id = conn.execute('''
+            INSERT INTO courses (name, description, course_settings, teacher_id, next_progress_bit)
+            SELECT ?, description, course_settings, ?, next_progress_bit FROM courses WHERE id = ?
+        ''', (name, teacher_id, course_id)).lastrowid
+        modules = conn.execute('''
+            INSERT INTO modules (course_id, name, description, order_index)
+            SELECT ?, name, description, order_index FROM modules WHERE course_id = ? ORDER BY id
+        ''', (new_id, course_id)).rowcount
+        # AUTOINCREMENT ids only grow, so the n-th new module (by id) is the copy of the n-th old one
+        lessons = conn.execute('''
+            INSERT INTO lessons (course_id, module_id, lesson, description, file_path, element_properties,
+                                 content_type, order_index, file_size, file_hash, file_name, progress_bit)
+            SELECT ?1, new.id, l.lesson, l.description, l.file_path, l.element_properties,
+                   l.content_type, l.order_index, l.file_size, l.file_hash, l.file_name, l.progress_bit
+            FROM lessons l
+            JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM modules WHERE course_id = ?2) old
+              ON l.module_id = old.id
+            JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM modules WHERE course_id = ?1) new
+              ON new.n = old.n
+            WHERE l.course_id = ?2
+            ORDER BY l.id
+        ''', (new_id, course_id)).rowcount
+        # Pre-rendered markdown follows the lessons, paired the same way
+        conn.execute('''
+            INSERT INTO lesson_rendered_html (lesson_id, markdown_hash, html)
+            SELECT new.id, r.markdown_hash, r.html
+            FROM lesson_rendered_html r
+            JOIN (SELECT l.id, ROW_NUMBER() OVER (ORDER BY l.id) AS n FROM lessons l
+                  JOIN modules m ON m.id = l.module_id AND m.course_id = ?2 WHERE l.course_id = ?2) old
+              ON r.lesson_id = old.id
+            JOIN (SELECT id, ROW_NUMBER() OVER (ORDER BY id) AS n FROM lessons WHERE course_id = ?1) new
+              ON new.n = old.n
+        ''', (new_id, course_id))
+        conn.commit()
+    except (CloneError, sqlite3.Error):
+        conn.rollback()
+        raise
+
+    return {'course_id': new_id, 'name': name, 'modules': modules, 'lessons': lessons}
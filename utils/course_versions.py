@@ -0,0 +1,134 @@
+"""
+Per-course content versions, for ETags and delta sync of the course studio.
+
+courses.content_version goes up by one on every change to the course's
+details, modules or lessons. Triggers do the counting, so every write
+path (APIs, bundle import, CLI scripts) is covered. A changed module or
+lesson row is stamped with the course version its change produced, and a
+deleted one leaves a row in content_tombstones with that version. What
+changed after version V is therefore: rows stamped > V, plus tombstones
+recorded > V.
+"""
+from flask import current_app, request
+
+_LESSON_COLUMNS = ('course_id, module_id, lesson, description, file_path, element_properties, content_type, '
+                   'order_index, file_size, file_hash, file_name')
+_MODULE_COLUMNS = 'course_id, name, description, order_index'
+
+_BUMP_SQL = 'UPDATE courses SET content_version = COALESCE(content_version, 0) + 1 WHERE id = {row}.course_id;'
+_VERSION_OF_SQL = '(SELECT content_version FROM courses WHERE id = {row}.course_id)'
+
+
+def _item_triggers(table, kind, columns):
+    stamp = f'UPDATE {table} SET content_version = {_VERSION_OF_SQL.format(row="NEW")} WHERE id = NEW.id;'
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_insert_content_version AFTER INSERT ON {table}
+        BEGIN
+            {_BUMP_SQL.format(row="NEW")}
+            {stamp}
+        END
+        ''',
+        # Only content columns, so the stamp above (and progress_bit numbering) don't count as edits
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_update_content_version AFTER UPDATE OF {columns} ON {table}
+        BEGIN
+            {_BUMP_SQL.format(row="NEW")}
+            {stamp}
+        END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_delete_content_version AFTER DELETE ON {table}
+        BEGIN
+            {_BUMP_SQL.format(row="OLD")}
+            INSERT INTO content_tombstones (course_id, kind, item_id, content_version)
+            SELECT OLD.course_id, '{kind}', OLD.id, content_version FROM courses WHERE id = OLD.course_id;
+        END
+        ''',
+    ]
+
+
+CONTENT_VERSION_TRIGGERS_SQL = _item_triggers('modules', 'module', _MODULE_COLUMNS) + \
+    _item_triggers('lessons', 'lesson', _LESSON_COLUMNS) + [
+        '''
+        CREATE TRIGGER IF NOT EXISTS courses_update_content_version
+        AFTER UPDATE OF name, description, course_settings ON courses
+        BEGIN
+            UPDATE courses SET content_version = COALESCE(content_version, 0) + 1 WHERE id = NEW.id;
+        END
+        ''',
+    ]
+
+
+def course_etag(course_id, version):
+    return f"course-{course_id}-v{version or 0}"
+
+
+def not_modified(etag):
+    """
+    304 response if the request's If-None-Match already has this ETag, else None.
+
+    Compared weakly: responses are compressed on the way out, which turns
+    their strong ETag into a weak one.
+    """
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    return response
+
+
+def versioned(response, etag):
+    """Tag a course response; browsers revalidate it on every use."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def course_changes(conn, course_id, since, lesson_transform=dict):
+    """
+    What changed in a course after content version `since`.
+
+    Returns:
+        Dict with the current version, the course details, modules and lessons
+        changed (or created) since, and the ids of those deleted since; None if
+        the course doesn't exist
+
+    Raises:
+        ValueError: `since` is newer than the course's current version
+    """
+    course = conn.execute('SELECT id, name, description, course_settings, content_version FROM courses WHERE id = ?',
+                          (course_id,)).fetchone()
+    if not course:
+        return None
+    version = course['content_version'] or 0
+    if since > version:
+        raise ValueError(f'Version {since} is newer than the course (version {version}); refetch the course')
+
+    modules = conn.execute('''
+        SELECT id, name, description, order_index FROM modules
+        WHERE course_id = ? AND content_version > ? ORDER BY order_index
+    ''', (course_id, since)).fetchall()
+    lessons = conn.execute('''
+        SELECT l.id, l.lesson, l.description, l.content_type, l.element_properties,
+               l.file_path, l.file_name, l.file_size, l.order_index, l.module_id, m.name as module_name
+        FROM lessons l
+        JOIN modules m ON l.module_id = m.id
+        WHERE l.course_id = ? AND l.content_version > ?
+        ORDER BY m.order_index, l.order_index
+    ''', (course_id, since)).fetchall()
+    deleted = {'modules': [], 'lessons': []}
+    for row in conn.execute('''
+        SELECT kind, item_id FROM content_tombstones WHERE course_id = ? AND content_version > ? ORDER BY id
+    ''', (course_id, since)):
+        deleted[row['kind'] + 's'].append(row['item_id'])
+
+    return {
+        'course_id': course['id'],
+        'since': since,
+        'version': version,
+        'course': {key: course[key] for key in ('id', 'name', 'description', 'course_settings')},
+        'modules': [dict(row) for row in modules],
+        'lessons': [lesson_transform(row) for row in lessons],
+        'deleted': deleted,
+    }
@@ -1,27 +1,52 @@
 import sqlite3
 import os
+import time
 from contextlib import contextmanager
+from utils import course_versions, enrollment_rollup, progress_bits, progress_matrix
 from utils.security_utils import get_env_variable
 from threading import Lock
 
 # Database configuration
 DATABASE_PATH = get_env_variable('DATABASE_PATH', 'vibes_university.db')
+DATABASE_POOL_SIZE = int(get_env_variable('DATABASE_POOL_SIZE', 10))
 
 class DatabaseManager:
     """Manages database connections and operations for the application with connection pooling."""
     
-    def __init__(self, db_path=None, pool_size=10):
+    def __init__(self, db_path=None, pool_size=None):
         self.db_path = db_path or DATABASE_PATH
-        self.pool_size = pool_size
+        self.pool_size = pool_size or DATABASE_POOL_SIZE
         self.connection_pool = []
+        # Connections inherited across fork(); kept referenced so they are never closed in the child
+        self._abandoned_connections = []
         self.lock = Lock()
-        self._initialize_pool()
+        # Observers notified on every pool checkout (wait_seconds, from_pool)
+        # and every executed SQL statement (sql); used for instrumentation.
+        self.checkout_listeners = []
+        self.statement_listeners = []
+        # The pool is filled on first use, so importing this module (CLI
+        # scripts, the gunicorn master) never opens a connection.
+        self._pool_initialized = False
+        # Connections currently handed out (pooled or overflow)
+        self.checked_out = 0
+        # Checkouts that failed because no connection could be opened
+        self.checkout_failures = 0
+
+    def init_app(self, app):
+        """Apply DATABASE_PATH / DATABASE_POOL_SIZE from the Flask config."""
+        db_path = app.config.get('DATABASE_PATH', self.db_path)
+        if db_path != self.db_path:
+            self.close_all_connections()
+            self.db_path = db_path
+        self.pool_size = app.config.get('DATABASE_POOL_SIZE', self.pool_size)
+        app.extensions['db_manager'] = self
     
     def _initialize_pool(self):
         """Initialize the connection pool with a set number of connections."""
         for _ in range(self.pool_size):
             conn = self._create_connection()
             self.connection_pool.append(conn)
+        self._pool_initialized = True
     
     def _create_connection(self):
         """Create a new database connection with proper configuration."""
@@ -29,20 +54,51 @@ class DatabaseManager:
         conn.row_factory = sqlite3.Row  # Enable column access by name
         conn.execute('PRAGMA journal_mode=WAL')  # Enable WAL mode for better concurrency
         conn.execute('PRAGMA foreign_keys=ON')   # Enable foreign key constraints
+        progress_bits.register_functions(conn)  # Bitmap helpers used by progress upserts
+        conn.set_trace_callback(self._on_statement)
         return conn
+
+    def _on_statement(self, sql):
+        """Dispatch an executed statement to the registered listeners."""
+        for listener in self.statement_listeners:
+            try:
+                listener(sql)
+            except Exception:
+                pass  # Instrumentation must never break a query
     
     def get_connection(self):
         """Get a database connection from the pool."""
+        started = time.perf_counter()
         with self.lock:
-            if self.connection_pool:
-                return self.connection_pool.pop()
-            else:
-                # If pool is empty, create a new connection (emergency fallback)
-                return self._create_connection()
+            if not self._pool_initialized:
+                self._initialize_pool()
+            conn = self.connection_pool.pop() if self.connection_pool else None
+            self.checked_out += 1
+        from_pool = conn is not None
+        if conn is None:
+            # If pool is empty, create a new connection (emergency fallback)
+            try:
+                conn = self._create_connection()
+            except sqlite3.Error:
+                with self.lock:
+                    self.checked_out = max(0, self.checked_out - 1)
+                    self.checkout_failures += 1
+                raise
+        waited = time.perf_counter() - started
+        for listener in self.checkout_listeners:
+            try:
+                listener(waited, from_pool)
+            except Exception:
+                pass
+        return conn
     
     def return_connection(self, conn):
         """Return a connection to the pool."""
         with self.lock:
+            if conn and any(pooled is conn for pooled in self.connection_pool):
+                return  # Already returned (some callers return in both except and finally)
+            if conn:
+                self.checked_out = max(0, self.checked_out - 1)
             if len(self.connection_pool) < self.pool_size and conn:
                 # Reset connection state before returning to pool
                 try:
@@ -89,6 +145,36 @@ class DatabaseManager:
                 except:
                     pass
             self.connection_pool.clear()
+            self._pool_initialized = False
+
+    def pool_stats(self):
+        """Return a snapshot of pool usage: size, idle and in-use connections, and failed checkouts."""
+        with self.lock:
+            return {
+                'size': self.pool_size,
+                'idle': len(self.connection_pool),
+                'in_use': self.checked_out,
+                'checkout_failures': self.checkout_failures,
+            }
+
+    def reset_pool(self, pool_size=None):
+        """
+        Rebuild the pool in a freshly forked worker process.
+
+        SQLite connections must not be used across fork(), and closing an
+        inherited handle can release file locks still held by the parent, so
+        inherited connections are abandoned rather than closed. The lock is
+        replaced as well since it may have been held at the time of the fork.
+        The new pool is filled lazily on first use.
+        """
+        self._abandoned_connections.extend(self.connection_pool)
+        self.connection_pool = []
+        self.lock = Lock()
+        self._pool_initialized = False
+        self.checked_out = 0
+        self.checkout_failures = 0
+        if pool_size:
+            self.pool_size = pool_size
     
     def initialize_database(self):
         """Initialize the database with required tables."""
@@ -149,19 +235,34 @@ class DatabaseManager:
             )
         ''')
         
-        # Course progress table
+        # Enrollment counts and revenue per day, course and payment status, kept current
+        # by triggers on enrollments (see utils/enrollment_rollup.py)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS course_progress (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
+            CREATE TABLE IF NOT EXISTS enrollment_daily_rollup (
+                day TEXT NOT NULL,
+                course_type TEXT NOT NULL,
+                payment_status TEXT NOT NULL,
+                enrollments INTEGER NOT NULL DEFAULT 0,
+                revenue INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, course_type, payment_status)
+            ) WITHOUT ROWID
+        ''')
+        for trigger_sql in enrollment_rollup.TRIGGERS_SQL:
+            cursor.execute(trigger_sql)
+        if not cursor.execute('SELECT 1 FROM enrollment_daily_rollup LIMIT 1').fetchone():
+            enrollment_rollup.rebuild(conn)
+        
+        # Course progress: one bitmap of completed lessons per student and course
+        # (see utils/progress_bits.py); course_progress is a view over it
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS course_progress_bits (
                 user_id INTEGER NOT NULL,
                 course_id INTEGER NOT NULL,
-                lesson_id INTEGER NOT NULL,
-                completed BOOLEAN DEFAULT 0,
-                completed_at TIMESTAMP,
+                bits BLOB NOT NULL DEFAULT x'',
+                updated_at TIMESTAMP,
+                PRIMARY KEY (user_id, course_id),
                 FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
-                FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE,
-                FOREIGN KEY (lesson_id) REFERENCES lessons (id) ON DELETE CASCADE,
-                UNIQUE (user_id, course_id, lesson_id)
+                FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE
             )
         ''')
         
@@ -206,11 +307,37 @@ class DatabaseManager:
                 content_type TEXT DEFAULT 'file',
                 order_index INTEGER DEFAULT 1,
                 uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                file_size INTEGER,
+                file_hash TEXT,
+                file_name TEXT,
                 FOREIGN KEY (course_id) REFERENCES courses (id),
                 FOREIGN KEY (module_id) REFERENCES modules (id)
             )
         ''')
 
+        # Markdown rendered by bulk lesson imports, keyed by a hash of its source so edited lessons render afresh
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS lesson_rendered_html (
+                lesson_id INTEGER NOT NULL,
+                markdown_hash TEXT NOT NULL,
+                html TEXT NOT NULL,
+                PRIMARY KEY (lesson_id, markdown_hash),
+                FOREIGN KEY (lesson_id) REFERENCES lessons (id) ON DELETE CASCADE
+            )
+        ''')
+        # Earlier imports kept it in element_properties, which teachers can edit
+        legacy_rendered = '''element_properties LIKE '%"rendered_hash"%' AND json_valid(element_properties)'''
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO lesson_rendered_html (lesson_id, markdown_hash, html)
+            SELECT id, json_extract(element_properties, '$.rendered_hash'), json_extract(element_properties, '$.rendered_html')
+            FROM lessons
+            WHERE {legacy_rendered} AND json_extract(element_properties, '$.rendered_html') IS NOT NULL
+        ''')
+        cursor.execute(f'''
+            UPDATE lessons SET element_properties = json_remove(element_properties, '$.rendered_html', '$.rendered_hash')
+            WHERE {legacy_rendered}
+        ''')
+
         # Quiz Attempts table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS quiz_attempts (
@@ -222,12 +349,45 @@ class DatabaseManager:
                 submitted_answers TEXT,
                 is_correct BOOLEAN,
                 score INTEGER,
+                attempt_uid TEXT,
                 FOREIGN KEY (user_id) REFERENCES users (id),
                 FOREIGN KEY (lesson_id) REFERENCES lessons (id),
                 FOREIGN KEY (course_id) REFERENCES courses (id)
             )
         ''')
-        
+
+        # Per-lesson quiz aggregates, updated in the same transaction as each batch of attempts
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS quiz_lesson_stats (
+                lesson_id INTEGER PRIMARY KEY,
+                course_id INTEGER NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct_attempts INTEGER NOT NULL DEFAULT 0,
+                total_score INTEGER NOT NULL DEFAULT 0,
+                last_attempt_at TIMESTAMP
+            )
+        ''')
+        if not cursor.execute('SELECT 1 FROM quiz_lesson_stats LIMIT 1').fetchone():
+            cursor.execute('''
+                INSERT INTO quiz_lesson_stats (lesson_id, course_id, attempts, correct_attempts, total_score, last_attempt_at)
+                SELECT lesson_id, MAX(course_id), COUNT(*), SUM(COALESCE(is_correct, 0)), SUM(COALESCE(score, 0)),
+                       MAX(attempt_timestamp)
+                FROM quiz_attempts GROUP BY lesson_id
+            ''')
+
+        # Modules and lessons deleted from a course, so studio delta syncs can drop them
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS content_tombstones (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                course_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                content_version INTEGER NOT NULL,
+                deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (course_id) REFERENCES courses (id) ON DELETE CASCADE
+            )
+        ''')
+
         # Announcements table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS announcements (
@@ -272,6 +432,21 @@ class DatabaseManager:
             )
         ''')
         
+        # Resumable (chunked) uploads in progress
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                file_name TEXT,
+                upload_length INTEGER NOT NULL,
+                upload_offset INTEGER DEFAULT 0,
+                expected_hash TEXT,
+                part_path TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP NOT NULL
+            )
+        ''')
+
         # Add columns if they don't exist (for backward compatibility)
         try:
             cursor.execute('ALTER TABLE courses ADD COLUMN teacher_id INTEGER')
@@ -287,16 +462,61 @@ class DatabaseManager:
             cursor.execute('ALTER TABLE lessons ADD COLUMN order_index INTEGER DEFAULT 1')
         except sqlite3.OperationalError:
             pass
+
+        # Unique id journalled with each quiz attempt, so replaying a journal can't insert it twice
+        try:
+            cursor.execute('ALTER TABLE quiz_attempts ADD COLUMN attempt_uid TEXT')
+        except sqlite3.OperationalError:
+            pass
+
+        # Content-addressed uploads: size, sha256 and original name of the lesson file
+        for column in ('file_size INTEGER', 'file_hash TEXT', 'file_name TEXT'):
+            try:
+                cursor.execute(f'ALTER TABLE lessons ADD COLUMN {column}')
+            except sqlite3.OperationalError:
+                pass
+
+        # Permanent per-course bit numbers for progress bitmaps, and the version teachers' progress matrices are cached by
+        for table, column in (('lessons', 'progress_bit INTEGER'), ('courses', 'next_progress_bit INTEGER DEFAULT 0'),
+                              ('courses', 'progress_version INTEGER DEFAULT 0')):
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+            except sqlite3.OperationalError:
+                pass
+        progress_bits.number_lessons(conn)
+        cursor.execute(progress_bits.NUMBER_LESSONS_TRIGGER_SQL)
+        cursor.execute(progress_bits.RENUMBER_MOVED_LESSONS_TRIGGER_SQL)
+        progress_bits.migrate_rows(conn)
+        cursor.execute(progress_bits.COMPATIBILITY_VIEW_SQL)
+        for trigger_sql in progress_matrix.VERSION_TRIGGERS_SQL:
+            cursor.execute(trigger_sql)
+
+        # Content versions for course ETags and studio delta syncs
+        for table in ('courses', 'modules', 'lessons'):
+            try:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN content_version INTEGER DEFAULT 0')
+            except sqlite3.OperationalError:
+                pass
+        for trigger_sql in course_versions.CONTENT_VERSION_TRIGGERS_SQL:
+            cursor.execute(trigger_sql)
         
         # Add performance indexes for frequently queried foreign keys
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_lessons_course_id ON lessons(course_id)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_lessons_module_id ON lessons(module_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lessons_file_hash ON lessons(file_hash)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_lessons_file_path ON lessons(file_path)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_upload_sessions_expires_at ON upload_sessions(expires_at)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_user_id ON enrollments(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_course_progress_lesson_id ON course_progress(lesson_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_course_progress_bits_course_id ON course_progress_bits(course_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_quiz_attempts_lesson_id ON quiz_attempts(lesson_id)')
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_quiz_attempts_attempt_uid ON quiz_attempts(attempt_uid)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_quiz_lesson_stats_course_id ON quiz_lesson_stats(course_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_content_tombstones_course_id ON content_tombstones(course_id, content_version)')
 
         # ⚡ Bolt Optimization: Add index on payment_status for faster analytics queries
         # (reduces full table scans when calculating revenue and completed enrollments)
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollments_payment_status ON enrollments(payment_status)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_enrollment_daily_rollup_course_type ON enrollment_daily_rollup(course_type, payment_status)')
 
         conn.commit()
         conn.close()
@@ -319,4 +539,52 @@ def get_db_cursor():
 # Function to return connection to pool (for manual connection management)
 def return_db_connection(conn):
     """Return a database connection to the pool."""
-    db_manager.return_connection(conn)
\ No newline at end of file
+    db_manager.return_connection(conn)
+
+
+class RowStream:
+    """
+    Iterate over a query's rows while holding the connection, then return it.
+
+    Used to stream large result sets into a response without fetchall(): the
+    connection goes back to the pool when the rows are exhausted or when
+    close() is called (e.g. via response.call_on_close), whichever is first.
+
+    Args:
+        conn: Pooled connection the cursor belongs to; owned by the stream
+        cursor: Executed cursor to read rows from
+        transform: Optional callable applied to each row
+        batch_size: Rows fetched from SQLite per fetchmany() call
+    """
+
+    def __init__(self, conn, cursor, transform=None, batch_size=500):
+        self.conn = conn
+        self.cursor = cursor
+        self.transform = transform
+        self.batch_size = batch_size
+        self._rows = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._rows:
+            if self.conn is None:
+                raise StopIteration
+            self._rows = self.cursor.fetchmany(self.batch_size)
+            if not self._rows:
+                self.close()
+                raise StopIteration
+            self._rows.reverse()
+        row = self._rows.pop()
+        return self.transform(row) if self.transform else row
+
+    def close(self):
+        """Release the connection back to the pool (idempotent)."""
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                self.cursor.close()
+            except sqlite3.Error:
+                pass
+            return_db_connection(conn)
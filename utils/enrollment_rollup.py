@@ -0,0 +1,86 @@
+"""
+Daily enrollment and revenue totals per course and payment status.
+
+enrollment_daily_rollup holds one row per (day, course_type,
+payment_status) with the number of enrollments and the sum of their
+prices. Triggers on enrollments keep it current: an insert adds to its
+day's row, a delete subtracts, and an update (e.g. a payment completing)
+moves the enrollment from its old row to its new one, all in the writer's
+transaction. Revenue and enrollment reports then read days, not
+enrollments.
+
+rebuild() recomputes the table from enrollments. initialize_database()
+runs it once when the table is created; scripts/rebuild_enrollment_rollup.py
+runs or checks it on demand.
+"""
+
+# Enrollments without an enrolled_at land on day ''
+_DAY = "COALESCE(date({row}.enrolled_at), '')"
+_STATUS = "COALESCE({row}.payment_status, 'pending')"
+
+_ADD_SQL = f'''
+    INSERT INTO enrollment_daily_rollup (day, course_type, payment_status, enrollments, revenue)
+    VALUES ({_DAY.format(row='NEW')}, NEW.course_type, {_STATUS.format(row='NEW')}, 1, COALESCE(NEW.price, 0))
+    ON CONFLICT (day, course_type, payment_status) DO UPDATE SET
+        enrollments = enrollments + 1, revenue = revenue + excluded.revenue;
+'''
+
+_SUBTRACT_SQL = f'''
+    UPDATE enrollment_daily_rollup SET enrollments = enrollments - 1, revenue = revenue - COALESCE(OLD.price, 0)
+    WHERE day = {_DAY.format(row='OLD')} AND course_type = OLD.course_type AND payment_status = {_STATUS.format(row='OLD')};
+    DELETE FROM enrollment_daily_rollup
+    WHERE day = {_DAY.format(row='OLD')} AND course_type = OLD.course_type AND payment_status = {_STATUS.format(row='OLD')}
+      AND enrollments <= 0;
+'''
+
+TRIGGERS_SQL = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS enrollments_insert_rollup AFTER INSERT ON enrollments
+    BEGIN
+        {_ADD_SQL}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS enrollments_update_rollup
+    AFTER UPDATE OF enrolled_at, course_type, payment_status, price ON enrollments
+    BEGIN
+        {_SUBTRACT_SQL}
+        {_ADD_SQL}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS enrollments_delete_rollup AFTER DELETE ON enrollments
+    BEGIN
+        {_SUBTRACT_SQL}
+    END
+    ''',
+]
+
+_AGGREGATE_SQL = f'''
+    SELECT {_DAY.format(row='e')} AS day, e.course_type, {_STATUS.format(row='e')} AS payment_status,
+           COUNT(*) AS enrollments, SUM(COALESCE(e.price, 0)) AS revenue
+    FROM enrollments e GROUP BY 1, 2, 3
+'''
+
+
+def rebuild(conn):
+    """
+    Recompute the rollup from enrollments (in the caller's transaction).
+
+    Returns:
+        Number of rollup rows written
+    """
+    conn.execute('DELETE FROM enrollment_daily_rollup')
+    return conn.execute(f'''
+        INSERT INTO enrollment_daily_rollup (day, course_type, payment_status, enrollments, revenue)
+        {_AGGREGATE_SQL}
+    ''').rowcount
+
+
+def differences(conn):
+    """Rollup rows that don't match enrollments: (day, course_type, payment_status, (enrollments, revenue) expected, found)."""
+    expected = {(row[0], row[1], row[2]): (row[3], row[4]) for row in conn.execute(_AGGREGATE_SQL)}
+    found = {(row[0], row[1], row[2]): (row[3], row[4]) for row in conn.execute(
+        'SELECT day, course_type, payment_status, enrollments, revenue FROM enrollment_daily_rollup')}
+    return [key + (expected.get(key), found.get(key)) for key in sorted(set(expected) | set(found))
+            if expected.get(key) != found.get(key)]
@@ -0,0 +1,192 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from threading import Lock
+
+from utils.db_utils import db_manager
+from utils.logging_utils import app_logger, log_warning
+from utils.security_utils import get_env_variable
+from utils.upload_utils import upload_storage
+
+OK = 'ok'
+DEGRADED = 'degraded'
+FAILING = 'failing'
+_SEVERITY = {OK: 0, DEGRADED: 1, FAILING: 2}
+
+
+def _env_float(name, default):
+    try:
+        return float(get_env_variable(name, default))
+    except (TypeError, ValueError):
+        return float(default)
+
+
+def _grade(value, warn, fail, higher_is_worse=True):
+    """Grade a measurement against its warn/fail thresholds."""
+    if higher_is_worse:
+        return FAILING if value >= fail else DEGRADED if value >= warn else OK
+    return FAILING if value <= fail else DEGRADED if value <= warn else OK
+
+
+class HealthChecker:
+    """
+    Readiness checks for load balancer probes.
+
+    Each check reports a status (ok / degraded / failing), the measured value
+    and its thresholds. The combined result is cached for HEALTH_CACHE_SECONDS
+    and computed by one thread at a time, so frequent probes from several
+    load balancers cost at most one round of checks per interval.
+    """
+
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager
+        self.started_at = time.time()
+        self.lock = Lock()
+        self._cached = None
+        self._cached_at = 0.0
+        self.configure()
+
+    def configure(self):
+        """(Re)read thresholds from the environment."""
+        self.cache_seconds = _env_float('HEALTH_CACHE_SECONDS', 2)
+        self.db_latency_warn_ms = _env_float('HEALTH_DB_LATENCY_WARN_MS', 100)
+        self.db_latency_fail_ms = _env_float('HEALTH_DB_LATENCY_FAIL_MS', 1000)
+        self.pool_warn = _env_float('HEALTH_POOL_SATURATION_WARN', 0.8)
+        self.wal_warn_mb = _env_float('HEALTH_WAL_WARN_MB', 64)
+        self.wal_fail_mb = _env_float('HEALTH_WAL_FAIL_MB', 512)
+        self.disk_warn_mb = _env_float('HEALTH_DISK_FREE_WARN_MB', 1024)
+        self.disk_fail_mb = _env_float('HEALTH_DISK_FREE_FAIL_MB', 200)
+        self.degraded_status_code = int(_env_float('HEALTH_DEGRADED_STATUS', 200))
+        self.reset()
+
+    def reset(self):
+        """Drop the cached result (e.g. in a freshly forked worker)."""
+        self._cached = None
+        self._cached_at = 0.0
+        self.started_at = time.time()
+        self._checkout_failures = 0
+
+    def liveness(self):
+        """The process is up and able to serve a request; touches nothing else."""
+        return {'status': 'alive', 'pid': os.getpid(), 'uptime_seconds': round(time.time() - self.started_at, 1)}
+
+    def readiness(self):
+        """
+        Run (or reuse) the readiness checks.
+
+        Returns:
+            Tuple of (result dict, HTTP status code)
+        """
+        now = time.monotonic()
+        cached = self._cached
+        if cached is not None and now - self._cached_at < self.cache_seconds:
+            return cached
+        with self.lock:
+            # Another thread may have refreshed the result while we waited
+            if self._cached is not None and time.monotonic() - self._cached_at < self.cache_seconds:
+                return self._cached
+            result = self._run_checks()
+            self._cached = result
+            self._cached_at = time.monotonic()
+            return result
+
+    def _run_checks(self):
+        checks = {
+            # Pool usage is sampled before the database check borrows a connection
+            'db_pool': self.check_pool(),
+            'database': self.check_database(),
+            'wal': self.check_wal(),
+            'disk': self.check_disk(),
+            'cache': self.check_cache(),
+        }
+        status = max((check['status'] for check in checks.values()), key=_SEVERITY.get)
+        code = {OK: 200, DEGRADED: self.degraded_status_code, FAILING: 503}[status]
+        if status != OK:
+            log_warning(app_logger, "Readiness check not ok", status=status,
+                        checks={name: check['status'] for name, check in checks.items()})
+        return {'status': status, 'checked_at': time.time(), 'pid': os.getpid(), 'checks': checks}, code
+
+    def check_database(self):
+        """Round trip a read and briefly take the write lock, timing both."""
+        manager = self.db_manager or db_manager
+        conn = None
+        started = time.perf_counter()
+        try:
+            conn = manager.get_connection()
+            conn.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+            # A wedged writer shows up here rather than on reads (WAL readers never block)
+            conn.execute('PRAGMA busy_timeout = %d' % int(self.db_latency_fail_ms))
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('ROLLBACK')
+        except sqlite3.Error as e:
+            return {'status': FAILING, 'error': str(e),
+                    'latency_ms': round((time.perf_counter() - started) * 1000, 2)}
+        finally:
+            if conn:
+                try:
+                    conn.execute('PRAGMA busy_timeout = 5000')  # sqlite3.connect default
+                except sqlite3.Error:
+                    pass
+                manager.return_connection(conn)
+        latency_ms = (time.perf_counter() - started) * 1000
+        return {'status': _grade(latency_ms, self.db_latency_warn_ms, self.db_latency_fail_ms),
+                'latency_ms': round(latency_ms, 2),
+                'warn_ms': self.db_latency_warn_ms, 'fail_ms': self.db_latency_fail_ms}
+
+    def check_pool(self):
+        """
+        In-use connections as a fraction of the pool size (> 1 means overflow connections).
+
+        A full pool is normal under load (overflow connections are opened on
+        demand), so saturation only ever degrades; the check fails when
+        checkouts have failed since the previous check.
+        """
+        stats = (self.db_manager or db_manager).pool_stats()
+        saturation = stats['in_use'] / stats['size'] if stats['size'] else 0.0
+        new_failures = max(0, stats['checkout_failures'] - self._checkout_failures)
+        self._checkout_failures = stats['checkout_failures']
+        status = FAILING if new_failures else DEGRADED if saturation >= self.pool_warn else OK
+        return dict(stats, status=status, saturation=round(saturation, 3), warn=self.pool_warn,
+                    new_checkout_failures=new_failures)
+
+    def check_wal(self):
+        """Size of the SQLite write-ahead log; a growing WAL means checkpoints are starved."""
+        wal_path = (self.db_manager or db_manager).db_path + '-wal'
+        try:
+            size_mb = os.path.getsize(wal_path) / (1024 * 1024)
+        except OSError:
+            size_mb = 0.0
+        return {'status': _grade(size_mb, self.wal_warn_mb, self.wal_fail_mb), 'size_mb': round(size_mb, 2),
+                'warn_mb': self.wal_warn_mb, 'fail_mb': self.wal_fail_mb}
+
+    def check_disk(self):
+        """Free space on the volume that holds uploaded lesson files."""
+        path = upload_storage.root if os.path.isdir(upload_storage.root) else '.'
+        try:
+            free_mb = shutil.disk_usage(path).free / (1024 * 1024)
+        except OSError as e:
+            return {'status': FAILING, 'error': str(e)}
+        writable = os.access(path, os.W_OK)
+        status = _grade(free_mb, self.disk_warn_mb, self.disk_fail_mb, higher_is_worse=False)
+        if not writable:
+            status = FAILING
+        return {'status': status, 'path': path, 'free_mb': round(free_mb, 1), 'writable': writable,
+                'warn_mb': self.disk_warn_mb, 'fail_mb': self.disk_fail_mb}
+
+    def check_cache(self):
+        """On-disk caches (compiled templates, metrics snapshots) must be writable."""
+        directories = {
+            'templates': get_env_variable('JINJA_BYTECODE_CACHE_DIR',
+                                          os.path.join(tempfile.gettempdir(), 'vibes_jinja_cache')),
+            'metrics': get_env_variable('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'vibes_metrics')),
+        }
+        problems = {name: path for name, path in directories.items()
+                    if os.path.isdir(path) and not os.access(path, os.W_OK)}
+        # A cache that can't be written only costs performance
+        return {'status': DEGRADED if problems else OK, 'unwritable': problems}
+
+
+# Global instance for the application
+health_checker = HealthChecker(db_manager)
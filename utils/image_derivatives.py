@@ -0,0 +1,204 @@
+import importlib.util
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from utils.logging_utils import app_logger, log_error, log_info
+from utils.security_utils import get_env_variable
+from utils.upload_utils import upload_storage
+
+# Pillow is optional (without it lessons show the original image) and is only
+# imported by the worker threads, so it costs nothing at app import
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def _parse_list(value, cast=str):
+    return [cast(item.strip()) for item in str(value).split(',') if item.strip()]
+
+
+class ImageDerivatives:
+    """
+    Resized WebP/JPEG variants of uploaded lesson images.
+
+    Variants are generated in a background thread pool whenever an image
+    lands in the upload store, and are keyed by the source's content hash:
+    <UPLOAD_DIR>/derived/<sha256[:2]>/<sha256>-<width>.<format>. A manifest
+    (<sha256>-manifest.json) is written last, so a variant set is only used once it is
+    complete, and identical images shared by several lessons are processed
+    once. Pillow releases the GIL while decoding, resizing and encoding, so
+    a few threads keep up without blocking request threads.
+    """
+
+    def __init__(self, app=None):
+        self.widths = [320, 640, 1024, 1600]
+        self.formats = ['webp', 'jpeg']
+        self.quality = 80
+        self.max_workers = 2
+        self.max_pixels = 50000000
+        self.lock = Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._pending = set()
+        self._manifests = {}
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def enabled(self):
+        return PILLOW_AVAILABLE and bool(self.widths)
+
+    def init_app(self, app):
+        """Read settings and generate variants for every image the upload store saves."""
+        self.widths = sorted(_parse_list(get_env_variable('IMAGE_DERIVATIVE_WIDTHS', '320,640,1024,1600'), int))
+        self.formats = [fmt for fmt in _parse_list(get_env_variable('IMAGE_DERIVATIVE_FORMATS', 'webp,jpeg'))
+                        if fmt in MIME_TYPES]
+        self.quality = int(get_env_variable('IMAGE_DERIVATIVE_QUALITY', 80))
+        self.max_workers = int(get_env_variable('IMAGE_DERIVATIVE_WORKERS', 2))
+        self.max_pixels = int(get_env_variable('IMAGE_MAX_PIXELS', 50000000))
+        if self.schedule not in upload_storage.stored_callbacks:
+            upload_storage.stored_callbacks.append(self.schedule)
+
+        # Store the extension instance in the app
+        app.extensions['image_derivatives'] = self
+
+    def reset(self):
+        """Forget pool and cached manifests (threads don't survive fork)."""
+        with self.lock:
+            self._executor = None
+            self._executor_pid = None
+            self._pending.clear()
+            self._manifests.clear()
+
+    def _pool(self):
+        pid = os.getpid()
+        if self._executor is None or self._executor_pid != pid:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-derivatives')
+            self._executor_pid = pid
+        return self._executor
+
+    def is_image(self, file_path):
+        return bool(file_path) and file_path.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+
+    def manifest_path(self, file_hash):
+        return upload_storage.derived_path(file_hash, 'manifest.json')
+
+    def schedule(self, file_path, file_hash):
+        """Queue variant generation for a stored image (no-op for other files or if already done)."""
+        if not self.enabled or not self.is_image(file_path) or not file_hash:
+            return None
+        if os.path.exists(self.manifest_path(file_hash)):
+            return None
+        with self.lock:
+            if file_hash in self._pending:
+                return None
+            self._pending.add(file_hash)
+            return self._pool().submit(self._run, file_path, file_hash)
+
+    def _run(self, file_path, file_hash):
+        try:
+            return self.generate(file_path, file_hash)
+        except Exception as e:
+            log_error(app_logger, "Image derivative generation failed", file_hash=file_hash, error=str(e))
+        finally:
+            with self.lock:
+                self._pending.discard(file_hash)
+
+    def generate(self, file_path, file_hash):
+        """
+        Write every variant of an image, then its manifest.
+
+        Returns:
+            The manifest dict
+        """
+        from PIL import Image, ImageOps
+
+        # Refuse decompression bombs instead of only warning
+        Image.MAX_IMAGE_PIXELS = self.max_pixels
+        with Image.open(file_path) as source:
+            if getattr(source, 'is_animated', False):
+                # Re-encoding would keep only the first frame; animated GIFs are served as uploaded
+                manifest = {'width': source.width, 'height': source.height, 'variants': []}
+                self._write_manifest(file_hash, manifest)
+                return manifest
+            # Let the JPEG decoder downscale by 1/2..1/8 while decoding when the largest variant allows
+            source.draft('RGB', (max(self.widths), max(self.widths) * source.height // max(source.width, 1)))
+            image = ImageOps.exif_transpose(source)
+            image.load()
+        width, height = image.size
+
+        variants = []
+        for target_width in self.widths:
+            if target_width >= width:
+                break
+            resized = image.resize((target_width, max(1, round(height * target_width / width))), Image.LANCZOS)
+            for fmt in self.formats:
+                variants.append(self._save_variant(resized, file_hash, target_width, fmt))
+        manifest = {'width': width, 'height': height, 'variants': variants}
+        self._write_manifest(file_hash, manifest)
+        log_info(app_logger, "Image derivatives generated", file_hash=file_hash, variants=len(variants))
+        return manifest
+
+    def variant_path(self, file_hash, width, fmt):
+        return upload_storage.derived_path(file_hash, f"{width}.{'jpg' if fmt == 'jpeg' else fmt}")
+
+    def _save_variant(self, image, file_hash, width, fmt):
+        from PIL import Image
+
+        path = self.variant_path(file_hash, width, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            # JPEG has no alpha channel: flatten onto white
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.split()[-1])
+            image = background
+        elif fmt == 'webp' and image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+        tmp_path = f"{path}.tmp"
+        options = {'quality': self.quality, 'method': 4} if fmt == 'webp' else \
+            {'quality': self.quality, 'optimize': True, 'progressive': True}
+        image.save(tmp_path, format=fmt.upper(), **options)
+        os.replace(tmp_path, path)
+        return {'width': width, 'format': fmt, 'size': os.path.getsize(path)}
+
+    def _write_manifest(self, file_hash, manifest):
+        path = self.manifest_path(file_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self._manifests[file_hash] = manifest
+
+    def manifest(self, file_hash):
+        """Completed variant set for an image, or None while it is pending (or never generated)."""
+        if not file_hash:
+            return None
+        manifest = self._manifests.get(file_hash)
+        if manifest is not None:
+            return manifest
+        try:
+            with open(self.manifest_path(file_hash)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        with self.lock:
+            self._manifests[file_hash] = manifest
+        return manifest
+
+    def variant(self, file_hash, width, fmt):
+        """Path of one variant, or None."""
+        manifest = self.manifest(file_hash) or {}
+        for variant in manifest.get('variants', []):
+            if variant['width'] == width and variant['format'] == fmt:
+                return self.variant_path(file_hash, width, fmt)
+        return None
+
+
+# Global instance for the application
+image_derivatives = ImageDerivatives()
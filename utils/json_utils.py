@@ -0,0 +1,193 @@
+import json
+import re
+import secrets
+from collections.abc import Iterator
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+from utils.security_utils import get_env_variable
+
+# orjson is optional; the stdlib encoder is used when it isn't installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Streamed responses are written in chunks of at least this many characters
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_BATCH_SIZE = 500
+
+
+class RawJSON:
+    """
+    Text that is already valid JSON and is emitted as-is.
+
+    Lets JSON stored in TEXT columns (e.g. lessons.element_properties) be
+    embedded in a response without a json.loads/json.dumps round trip. Not a
+    str subclass, so both encoders hand it to the provider's default hook.
+    """
+    __slots__ = ('text',)
+
+    def __init__(self, text):
+        self.text = text
+
+
+def _reject_constant(name):
+    raise ValueError(f"{name} is not valid JSON")
+
+
+def _is_json(text):
+    """Parse-only validity check (orjson when available; NaN/Infinity are rejected either way)."""
+    if orjson is not None:
+        try:
+            orjson.loads(text)
+            return True
+        except orjson.JSONDecodeError:
+            return False
+    try:
+        json.loads(text, parse_constant=_reject_constant)
+        return True
+    except ValueError:
+        return False
+
+
+def raw_json_column(value, empty='{}'):
+    """
+    Wrap a JSON TEXT column value for pass-through serialization.
+
+    The app writes these columns with json.dumps, but rows edited by hand or
+    holding NaN (which json.dumps emits) aren't valid JSON, so the value is
+    parsed to check it; only the re-encoding is saved. Empty or invalid
+    values fall back to `empty`.
+    """
+    if not value:
+        return RawJSON(empty)
+    stripped = value.strip()
+    if (stripped[:1], stripped[-1:]) in (('{', '}'), ('[', ']')) and _is_json(stripped):
+        return RawJSON(stripped)
+    return RawJSON(empty)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider with an optional orjson fast path and RawJSON pass-through.
+
+    Falls back to the stdlib encoder when orjson is not installed, when
+    JSON_ENCODER=stdlib, or for arguments / values orjson can't handle
+    (custom encoder classes, integers wider than 64 bits).
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        encoder = app.config.get('JSON_ENCODER') or get_env_variable('JSON_ENCODER', 'orjson')
+        self.use_orjson = orjson is not None and encoder == 'orjson'
+
+    def dumps(self, obj, **kwargs):
+        fragments = []
+        token = secrets.token_hex(4)
+
+        def default(value):
+            if isinstance(value, RawJSON):
+                fragments.append(value.text)
+                return f"__raw_{token}_{len(fragments) - 1}__"
+            return self.default(value)
+
+        output = None
+        if self.use_orjson and set(kwargs) <= {'separators', 'indent', 'sort_keys'}:
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if kwargs.get('indent'):
+                option |= orjson.OPT_INDENT_2
+            if kwargs.get('sort_keys', self.sort_keys):
+                option |= orjson.OPT_SORT_KEYS
+            try:
+                output = orjson.dumps(obj, default=default, option=option).decode('utf-8')
+            except (orjson.JSONEncodeError, TypeError):
+                fragments.clear()
+        if output is None:
+            kwargs.setdefault('default', default)
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            kwargs.setdefault('sort_keys', self.sort_keys)
+            output = json.dumps(obj, **kwargs)
+
+        if fragments:
+            output = re.sub(f'"__raw_{token}_(\\d+)__"', lambda m: fragments[int(m.group(1))], output)
+        return output
+
+    def loads(self, s, **kwargs):
+        if self.use_orjson and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass  # Let the stdlib raise its usual error (and accept NaN etc.)
+        return super().loads(s, **kwargs)
+
+
+def _iter_json(value, dumps, batch_size):
+    """Yield JSON text for value, streaming any iterator found in it as an array."""
+    if isinstance(value, dict):
+        yield '{'
+        for index, (key, item) in enumerate(value.items()):
+            yield (',' if index else '') + dumps(str(key)) + ':'
+            yield from _iter_json(item, dumps, batch_size)
+        yield '}'
+    elif isinstance(value, Iterator):
+        yield '['
+        first = True
+        batch = []
+        for item in value:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                yield ('' if first else ',') + dumps(batch)[1:-1]
+                first = False
+                batch = []
+        if batch:
+            yield ('' if first else ',') + dumps(batch)[1:-1]
+        yield ']'
+    else:
+        yield dumps(value)
+
+
+def _chunked(parts, chunk_size):
+    buffer = []
+    size = 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    buffer.append('\n')
+    yield ''.join(buffer)
+
+
+def json_stream_response(obj, status=200, batch_size=STREAM_BATCH_SIZE):
+    """
+    Build a streamed JSON response.
+
+    Iterators anywhere in obj (generators, RowStream) are written as JSON
+    arrays in batches of batch_size items, so a large result set is never
+    held in memory as one list or one string. Values with a close() method
+    are closed when the response is closed, even if it is never iterated.
+
+    Args:
+        obj: dict, list or iterator to serialize
+        status: HTTP status code
+        batch_size: Items encoded per dumps() call
+
+    Returns:
+        Flask Response with mimetype application/json
+    """
+    provider = current_app.json
+
+    def dumps(value):
+        return provider.dumps(value, separators=(',', ':'))
+
+    response = current_app.response_class(
+        _chunked(_iter_json(obj, dumps, batch_size), STREAM_CHUNK_SIZE),
+        status=status, mimetype=provider.mimetype)
+    values = obj.values() if isinstance(obj, dict) else [obj]
+    for value in values:
+        if isinstance(value, Iterator) and hasattr(value, 'close'):
+            response.call_on_close(value.close)
+    return response
@@ -0,0 +1,414 @@
+"""
+Bulk lesson import from a structured spec.
+
+A spec is a JSON or YAML document:
+
+    modules:
+      - name: Getting started        # existing module of that name, or a new one
+        description: ...
+        lessons:
+          - title: Welcome
+            content_type: text       # text, markdown, video or quiz
+            markdown: "# Hello"      # text/markdown lessons
+            element_properties: {}   # e.g. url for video, options for quiz
+            description: ...
+            order: 3                 # optional; default: after the module's last lesson
+
+or a folder of markdown files, one lesson each, with optional front-matter
+(title, module, order, description, content_type) between '---' lines. The
+module defaults to the file's folder, the title to the first '# ' heading.
+
+The whole spec is validated before anything is written, markdown is
+rendered in a pool of worker processes (CPU-bound, so threads wouldn't
+help), and modules and lessons are inserted with executemany in a single
+transaction. Rendered HTML goes in lesson_rendered_html, keyed by lesson and
+a hash of its source, so lesson pages skip rendering until the markdown is
+edited. It is kept out of element_properties, which teachers can edit.
+
+Used by the teacher API and by scripts/lesson_import.py.
+"""
+import hashlib
+import importlib.util
+import json
+import multiprocessing
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+# YAML specs need PyYAML; JSON specs and markdown folders don't
+YAML_AVAILABLE = importlib.util.find_spec('yaml') is not None
+
+CONTENT_TYPES = ('text', 'markdown', 'video', 'quiz')
+MARKDOWN_TYPES = ('text', 'markdown')
+MARKDOWN_EXTENSIONS = ['fenced_code', 'tables']  # Same renderer settings as lesson pages
+DEFAULT_MODULE = 'Imported lessons'
+MAX_LESSONS = 5000
+MAX_ERRORS = 50
+MAX_ORDER = 2 ** 31 - 1
+# Below this many documents, starting worker processes costs more than it saves
+PARALLEL_RENDER_MIN = 200
+
+_FRONT_MATTER = re.compile(r'\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)', re.S)
+_HEADING = re.compile(r'^#[ \t]+(.+?)[ \t#]*$', re.M)
+
+
+class LessonImportError(ValueError):
+    """The spec is invalid; errors lists every problem found (up to MAX_ERRORS)."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)[:MAX_ERRORS]
+        super().__init__(self.errors[0] if len(self.errors) == 1 else f"{len(self.errors)} problems in the spec")
+
+
+# --- Parsing ---
+
+def _load_yaml(text):
+    if not YAML_AVAILABLE:
+        raise LessonImportError(['YAML specs need PyYAML installed; use JSON instead'])
+    import yaml
+
+    try:
+        return yaml.safe_load(text)
+    except yaml.YAMLError as e:
+        raise LessonImportError([f'Invalid YAML: {e}'])
+
+
+def parse_spec(text, filename=''):
+    """Spec dict from JSON or YAML text (YAML if the file name says so, or if it isn't JSON)."""
+    if filename.lower().endswith(('.yaml', '.yml')):
+        return _load_yaml(text)
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        if filename.lower().endswith('.json') or not YAML_AVAILABLE:
+            raise LessonImportError([f'Invalid JSON: {e}'])
+    return _load_yaml(text)
+
+
+def _front_matter(text):
+    """(metadata, body) of a markdown document."""
+    match = _FRONT_MATTER.match(text)
+    if not match:
+        return {}, text
+    block, body = match.group(1), text[match.end():]
+    if YAML_AVAILABLE:
+        metadata = _load_yaml(block)
+    else:
+        # Flat 'key: value' lines are all lessons need
+        metadata = {}
+        for line in block.splitlines():
+            key, sep, value = line.partition(':')
+            if sep and key.strip():
+                metadata[key.strip()] = value.strip().strip('"\'')
+    if not isinstance(metadata, dict):
+        raise LessonImportError(['front-matter must be key: value pairs'])
+    return metadata, body
+
+
+def parse_markdown_files(files):
+    """
+    Spec from markdown documents.
+
+    Args:
+        files: (relative path, text) pairs; imported in path order
+
+    Returns:
+        Spec dict with one module per front-matter module (or folder)
+    """
+    modules = {}
+    errors = []
+    for path, text in sorted(files):
+        path = path.replace('\\', '/')
+        try:
+            metadata, body = _front_matter(text)
+        except LessonImportError as e:
+            errors.extend(f'{path}: {error}' for error in e.errors)
+            continue
+        folder = os.path.basename(os.path.dirname(path))
+        heading = _HEADING.search(body)
+        lesson = {
+            'title': metadata.get('title') or (heading.group(1) if heading else
+                                               os.path.splitext(os.path.basename(path))[0]),
+            'content_type': metadata.get('content_type', 'text'),
+            'description': metadata.get('description', ''),
+            'markdown': body.strip(),
+            'source': path,
+        }
+        if 'order' in metadata:
+            lesson['order'] = metadata['order']
+        module_name = str(metadata.get('module') or folder or DEFAULT_MODULE)
+        modules.setdefault(module_name, {'name': module_name, 'lessons': []})['lessons'].append(lesson)
+    if errors:
+        raise LessonImportError(errors)
+    return {'modules': list(modules.values())}
+
+
+def read_markdown_folder(folder):
+    """(relative path, text) of every .md file under folder, for parse_markdown_files()."""
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith(('.md', '.markdown')):
+                path = os.path.join(root, name)
+                with open(path, encoding='utf-8') as f:
+                    files.append((os.path.relpath(path, folder), f.read()))
+    return files
+
+
+# --- Validation ---
+
+def _integer(value):
+    if isinstance(value, bool):
+        raise ValueError
+    return int(value)
+
+
+def _text(value):
+    """A spec string field; numbers are accepted as text, other values (objects, lists, booleans) are not."""
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError
+    return str(value)
+
+
+def validate_spec(spec):
+    """
+    Check a whole spec and normalize it.
+
+    Returns:
+        List of modules, each {'name', 'description', 'lessons'}, with lessons
+        {'title', 'description', 'content_type', 'order', 'element_properties', 'markdown'};
+        modules of the same name are merged
+
+    Raises:
+        LessonImportError: listing every problem found
+    """
+    errors = []
+    modules = spec.get('modules') if isinstance(spec, dict) else None
+    if not isinstance(modules, list) or not modules:
+        raise LessonImportError(['The spec needs a non-empty "modules" list'])
+
+    merged = {}
+    total = 0
+    for i, module in enumerate(modules):
+        where = f'modules[{i}]'
+        try:
+            name = _text(module.get('name')).strip() if isinstance(module, dict) else ''
+        except ValueError:
+            name = ''
+        if not name:
+            errors.append(f'{where}: name is required (text)')
+            continue
+        lessons = module.get('lessons') or []
+        if not isinstance(lessons, list):
+            errors.append(f'{where}: lessons must be a list')
+            continue
+        try:
+            description = _text(module.get('description'))
+        except ValueError:
+            errors.append(f'{where}: description must be text')
+            description = ''
+        target = merged.setdefault(name, {'name': name, 'description': description, 'lessons': []})
+
+        for j, lesson in enumerate(lessons):
+            where = f"{name} / lessons[{j}]"
+            if isinstance(lesson, dict) and lesson.get('source'):
+                where = lesson['source']
+            if not isinstance(lesson, dict):
+                errors.append(f'{where}: must be an object')
+                continue
+            try:
+                title = _text(lesson.get('title')).strip()
+            except ValueError:
+                errors.append(f'{where}: title must be text')
+                title = None
+            try:
+                description = _text(lesson.get('description'))
+            except ValueError:
+                errors.append(f'{where}: description must be text')
+                description = ''
+            content_type = lesson.get('content_type') or 'text'
+            properties = lesson.get('element_properties') or {}
+            markdown_text = lesson.get('markdown')
+            if title == '':
+                errors.append(f'{where}: title is required')
+            if content_type not in CONTENT_TYPES:
+                errors.append(f'{where}: content_type must be one of {", ".join(CONTENT_TYPES)} '
+                              f'(file lessons need an upload)')
+            if not isinstance(properties, dict):
+                errors.append(f'{where}: element_properties must be an object')
+                properties = {}
+            else:
+                try:
+                    json.dumps(properties)
+                except (TypeError, ValueError):
+                    # e.g. YAML dates
+                    errors.append(f'{where}: element_properties may only hold JSON values')
+                    properties = {}
+            if markdown_text is not None and not isinstance(markdown_text, str):
+                errors.append(f'{where}: markdown must be text')
+                markdown_text = None
+            if content_type in MARKDOWN_TYPES:
+                markdown_text = markdown_text if markdown_text is not None else str(properties.get('markdown_content') or '')
+            elif content_type == 'video' and not str(properties.get('url') or '').strip():
+                errors.append(f'{where}: video lessons need element_properties.url')
+            elif content_type == 'quiz':
+                options = properties.get('options')
+                try:
+                    correct = _integer(properties.get('correct_answer_index', 0))
+                except (TypeError, ValueError):
+                    correct = -1
+                if not isinstance(options, list) or len(options) < 2 or not 0 <= correct < len(options):
+                    errors.append(f'{where}: quiz lessons need element_properties.options (2 or more) '
+                                  f'and a correct_answer_index among them')
+            order = lesson.get('order')
+            if order is not None:
+                try:
+                    order = _integer(order)
+                    if not 0 <= order <= MAX_ORDER:
+                        raise ValueError
+                except (TypeError, ValueError, OverflowError):
+                    errors.append(f'{where}: order must be an integer from 0 to {MAX_ORDER}')
+            target['lessons'].append({'title': title, 'description': description,
+                                      'content_type': content_type, 'order': order,
+                                      'element_properties': properties,
+                                      'markdown': markdown_text if content_type in MARKDOWN_TYPES else None})
+            total += 1
+        if len(errors) >= MAX_ERRORS:
+            break
+
+    if total > MAX_LESSONS:
+        errors.append(f'At most {MAX_LESSONS} lessons per import ({total} given)')
+    elif not total and not errors:
+        errors.append('The spec has no lessons')
+    if errors:
+        raise LessonImportError(errors)
+    return list(merged.values())
+
+
+# --- Markdown ---
+
+def markdown_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def prerendered_html(conn, lesson_id, markdown_text):
+    """HTML stored for this markdown by an import, or None if missing or stale (the lesson was edited)."""
+    row = conn.execute('SELECT html FROM lesson_rendered_html WHERE lesson_id = ? AND markdown_hash = ?',
+                       (lesson_id, markdown_hash(markdown_text))).fetchone()
+    return row[0] if row else None
+
+
+def _render_chunk(texts):
+    import markdown
+
+    renderer = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return [renderer.reset().convert(text) for text in texts]
+
+
+def default_workers():
+    from utils.security_utils import get_env_variable
+
+    workers = get_env_variable('LESSON_IMPORT_WORKERS', '')
+    return int(workers) if workers else min(4, os.cpu_count() or 1)
+
+
+def render_markdown(texts, workers=None):
+    """
+    Render markdown documents to HTML, in worker processes when there are many.
+
+    Workers are spawned rather than forked: the calling process has
+    threads (request handlers, the progress flusher), which fork doesn't copy.
+    """
+    workers = default_workers() if workers is None else workers
+    if workers <= 1 or len(texts) < PARALLEL_RENDER_MIN:
+        return _render_chunk(texts)
+    size = -(-len(texts) // workers)
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    with ProcessPoolExecutor(max_workers=len(chunks), mp_context=multiprocessing.get_context('spawn')) as pool:
+        return [html for rendered in pool.map(_render_chunk, chunks) for html in rendered]
+
+
+# --- Import ---
+
+def import_lessons(conn, course_id, spec, workers=None):
+    """
+    Validate a spec and add its modules and lessons to a course in one transaction.
+
+    Args:
+        conn: database connection (committed or rolled back here)
+        course_id: course to add to
+        spec: spec dict (see parse_spec() and parse_markdown_files())
+        workers: markdown rendering processes (default: LESSON_IMPORT_WORKERS)
+
+    Returns:
+        Dict with the numbers of modules created and lessons imported, or None
+        if the course doesn't exist
+
+    Raises:
+        LessonImportError: the spec is invalid (nothing was written)
+    """
+    modules = validate_spec(spec)
+
+    # Rendered before the write lock is taken
+    markdown_lessons = [lesson for module in modules for lesson in module['lessons'] if lesson['markdown'] is not None]
+    rendered = render_markdown([lesson['markdown'] for lesson in markdown_lessons], workers)
+    for lesson, html in zip(markdown_lessons, rendered):
+        lesson['element_properties'] = dict(lesson['element_properties'], markdown_content=lesson['markdown'])
+        lesson['html'] = html
+
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        if not conn.execute('SELECT 1 FROM courses WHERE id = ?', (course_id,)).fetchone():
+            conn.rollback()
+            return None
+        existing = {}
+        for row in conn.execute('SELECT id, name FROM modules WHERE course_id = ? ORDER BY id', (course_id,)):
+            existing.setdefault(row['name'], row['id'])
+        next_module_order = conn.execute('SELECT COALESCE(MAX(order_index), 0) + 1 FROM modules WHERE course_id = ?',
+                                         (course_id,)).fetchone()[0]
+
+        new_modules = [module for module in modules if module['name'] not in existing]
+        conn.executemany('INSERT INTO modules (course_id, name, description, order_index) VALUES (?, ?, ?, ?)',
+                         [(course_id, module['name'], module['description'], next_module_order + i)
+                          for i, module in enumerate(new_modules)])
+        # AUTOINCREMENT ids only grow, so the newest ids are the modules just inserted, in order
+        if new_modules:
+            new_ids = [row[0] for row in conn.execute(
+                'SELECT id FROM modules WHERE course_id = ? ORDER BY id DESC LIMIT ?', (course_id, len(new_modules)))]
+            existing.update(zip((module['name'] for module in new_modules), reversed(new_ids)))
+
+        next_order = {row[0]: row[1] for row in conn.execute(
+            'SELECT module_id, MAX(order_index) + 1 FROM lessons WHERE course_id = ? GROUP BY module_id', (course_id,))}
+        lesson_rows, rendered_lessons = [], []
+        for module in modules:
+            module_id = existing[module['name']]
+            for lesson in module['lessons']:
+                order = lesson['order']
+                if order is None:
+                    order = next_order.get(module_id, 1)
+                next_order[module_id] = max(next_order.get(module_id, 1), order + 1)
+                if lesson['markdown'] is not None:
+                    rendered_lessons.append((len(lesson_rows), lesson))
+                lesson_rows.append((course_id, module_id, lesson['title'], lesson['description'],
+                                    json.dumps(lesson['element_properties']), lesson['content_type'], order))
+        conn.executemany('''
+            INSERT INTO lessons (course_id, module_id, lesson, description, element_properties, content_type, order_index)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', lesson_rows)
+        if rendered_lessons:
+            new_ids = [row[0] for row in conn.execute(
+                'SELECT id FROM lessons WHERE course_id = ? ORDER BY id DESC LIMIT ?', (course_id, len(lesson_rows)))]
+            new_ids.reverse()
+            conn.executemany('INSERT INTO lesson_rendered_html (lesson_id, markdown_hash, html) VALUES (?, ?, ?)',
+                             [(new_ids[index], markdown_hash(lesson['markdown']), lesson['html'])
+                              for index, lesson in rendered_lessons])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    return {'course_id': course_id, 'modules_created': len(new_modules), 'lessons': len(lesson_rows),
+            'markdown_rendered': len(rendered)}
@@ -1,53 +1,183 @@
+import atexit
+import json
 import logging
 import os
+import queue
+import random
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Background listener that owns the real (blocking) handlers
+_listener = None
+_configured = False
+
+
+class StructuredQueueHandler(QueueHandler):
+    """Queue handler that defers all formatting to the listener thread."""
+
+    def prepare(self, record):
+        # The stdlib implementation merges msg/args and renders exc_info here,
+        # on the calling thread. The queue is in-process, so the record can be
+        # handed over untouched and formatted only when it is actually emitted.
+        return record
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Render a record and its structured fields as a single JSON line."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            payload['data'] = fields
+        if record.exc_info:
+            payload['exc'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human readable formatter that appends structured fields to the message."""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line = f"{line} | Data: {fields}"
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of low-severity records for selected loggers.
+
+    Warnings and errors always pass; sampling only thins out high-volume
+    INFO/DEBUG traffic such as per-request logs.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name)
+        if rate is None or rate >= 1:
+            return True
+        return random.random() < rate
+
+
+def parse_sample_rates(value):
+    """Parse a 'logger:rate,logger:rate' string into a dict."""
+    rates = {}
+    for item in (value or '').split(','):
+        name, _, rate = item.strip().partition(':')
+        if not name or not rate:
+            continue
+        try:
+            rates[name] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
 
 # Configure logging
-def setup_logging(log_level=logging.INFO, log_file=None):
+def setup_logging(log_level=logging.INFO, log_file=None, max_bytes=10 * 1024 * 1024,
+                  backup_count=5, sample_rates=None, log_format='json'):
     """
-    Set up structured logging for the application.
-    
+    Set up structured, non-blocking logging for the application.
+
+    Records are put on an in-memory queue by the request thread; a background
+    QueueListener formats them and performs the console/file I/O.
+
     Args:
         log_level: The logging level (default: INFO)
         log_file: Path to log file (optional, defaults to console only)
+        max_bytes: Rotate the log file once it reaches this size
+        backup_count: Number of rotated log files to keep
+        sample_rates: Mapping of logger name to the fraction of INFO/DEBUG records kept
+        log_format: 'json' for JSON lines, 'text' for human readable console output
     """
-    # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    
-    # Configure root logger
-    root_logger = logging.getLogger()
-    root_logger.setLevel(log_level)
-    
-    # Clear existing handlers
-    root_logger.handlers.clear()
-    
+    global _listener, _configured
+
+    stop_logging()
+    _configured = True
+
+    json_formatter = JsonLineFormatter()
+    console_formatter = json_formatter
+    if log_format == 'text':
+        console_formatter = TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
     # Console handler
     console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
-    
+    console_handler.setFormatter(console_formatter)
+    handlers = [console_handler]
+
     # File handler (if specified)
     if log_file:
         # Ensure log directory exists
         log_dir = os.path.dirname(log_file)
         if log_dir and not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-            
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setFormatter(formatter)
-        root_logger.addHandler(file_handler)
-    
+            os.makedirs(log_dir, exist_ok=True)
+
+        file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+        file_handler.setFormatter(json_formatter)
+        handlers.append(file_handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sample_rates))
+
+    # Configure root logger
+    root_logger = logging.getLogger()
+    root_logger.setLevel(log_level)
+
+    # Clear existing handlers
+    root_logger.handlers.clear()
+    root_logger.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
     return root_logger
 
+
+def stop_logging():
+    """Flush queued records and stop the background listener."""
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except Exception:
+            pass  # Listener thread may already be gone (e.g. after a fork)
+        _listener = None
+
+
+def restart_logging():
+    """Restart the background listener, e.g. in a freshly forked worker."""
+    global _listener
+    if _listener is not None:
+        # Threads do not survive fork(); start a new one on the same queue/handlers
+        _listener = QueueListener(_listener.queue, *_listener.handlers,
+                                  respect_handler_level=_listener.respect_handler_level)
+        _listener.start()
+
+
+atexit.register(stop_logging)
+
+
 def get_logger(name):
     """
     Get a logger instance with the specified name.
-    
+
     Args:
         name: Name of the logger (typically __name__)
-        
+
     Returns:
         Logger instance
     """
@@ -60,33 +190,29 @@ security_logger = get_logger('security')
 payment_logger = get_logger('payment')
 
 # Convenience functions for different log levels
+def _log(logger, level, message, fields):
+    if not _configured:
+        configure_logging()
+    # Skip record creation entirely when the level is disabled; structured
+    # fields stay a dict until a handler renders them.
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={'fields': fields} if fields else None)
+
 def log_info(logger, message, **kwargs):
     """Log an info message with optional structured data."""
-    if kwargs:
-        message = f"{message} | Data: {kwargs}"
-    logger.info(message)
+    _log(logger, logging.INFO, message, kwargs)
 
 def log_warning(logger, message, **kwargs):
     """Log a warning message with optional structured data."""
-    if kwargs:
-        message = f"{message} | Data: {kwargs}"
-    logger.warning(message)
+    _log(logger, logging.WARNING, message, kwargs)
 
 def log_error(logger, message, **kwargs):
     """Log an error message with optional structured data."""
-    if kwargs:
-        message = f"{message} | Data: {kwargs}"
-    logger.error(message)
+    _log(logger, logging.ERROR, message, kwargs)
 
 def log_debug(logger, message, **kwargs):
     """Log a debug message with optional structured data."""
-    if kwargs:
-        message = f"{message} | Data: {kwargs}"
-    logger.debug(message)
-
-# Initialize logging on module import
-LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
-LOG_FILE = os.environ.get('LOG_FILE', None)
+    _log(logger, logging.DEBUG, message, kwargs)
 
 # Map string log levels to constants
 log_level_map = {
@@ -97,4 +223,20 @@ log_level_map = {
     'CRITICAL': logging.CRITICAL
 }
 
-setup_logging(log_level=log_level_map.get(LOG_LEVEL, logging.INFO), log_file=LOG_FILE)
\ No newline at end of file
+def configure_logging():
+    """
+    Set up logging from the LOG_* environment variables.
+
+    Called by create_app(); the log_* helpers also call it on first use, so
+    importing this module stays cheap and starts no threads.
+    """
+    log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    return setup_logging(
+        log_level=log_level_map.get(log_level, logging.INFO),
+        log_file=os.environ.get('LOG_FILE') or None,
+        max_bytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(os.environ.get('LOG_BACKUP_COUNT', 5)),
+        # e.g. LOG_SAMPLE_RATES="app:0.1,database:0.5"
+        sample_rates=parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', '')),
+        log_format=os.environ.get('LOG_FORMAT', 'json').lower(),
+    )
@@ -0,0 +1,339 @@
+import atexit
+import fcntl
+import glob
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from flask import Response, g, jsonify, request, session, template_rendered, before_render_template
+
+from utils.security_utils import get_env_variable
+
+# Histogram buckets (seconds)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+RETIRED_SNAPSHOT = 'retired.json'
+
+METRIC_HELP = {
+    'http_requests_total': ('counter', 'Total HTTP requests by endpoint, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.'),
+    'template_render_duration_seconds': ('histogram', 'Jinja template render time by template.'),
+    'db_pool_wait_seconds': ('histogram', 'Time spent acquiring a connection from the pool.'),
+    'db_pool_overflow_total': ('counter', 'Connections created because the pool was empty.'),
+    'db_queries_total': ('counter', 'Executed SQL statements by verb.'),
+}
+
+
+class MetricsRegistry:
+    """
+    Per-process counters and histograms.
+
+    Each worker periodically writes a snapshot of its own metrics to
+    METRICS_DIR/<pid>-<random>.json; the /metrics endpoint sums the
+    snapshots of all workers, so values are correct no matter which worker
+    is scraped. When a worker exits (or is found dead by a scrape) its
+    snapshot is folded into METRICS_DIR/retired.json and deleted, so
+    recycled workers neither pile up files nor make counters go backwards.
+    """
+
+    def __init__(self, metrics_dir=None, flush_interval=5.0):
+        self.metrics_dir = metrics_dir or get_env_variable(
+            'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'vibes_metrics'))
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._flusher_pid = None
+        # Serializes snapshot writes with retire()
+        self.flush_lock = threading.Lock()
+        self._worker = None
+        self._retired = False
+
+    # --- Recording ---
+    def inc(self, name, labels=(), amount=1):
+        key = (name, tuple(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=(), buckets=LATENCY_BUCKETS):
+        key = (name, tuple(labels))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(hist['buckets']):
+                if value <= bound:
+                    hist['counts'][i] += 1
+                    break
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def reset(self):
+        """Drop in-memory values (used in freshly forked workers)."""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+        self._flusher_pid = None
+        self._worker = None
+        self._retired = False
+
+    # --- Cross-process snapshots ---
+    def _snapshot_path(self):
+        # The random part keeps a worker that reuses a dead worker's pid from overwriting its snapshot
+        pid = os.getpid()
+        if self._worker is None or self._worker[0] != pid:
+            self._worker = (pid, f"{pid}-{uuid.uuid4().hex[:12]}")
+        return os.path.join(self.metrics_dir, f"{self._worker[1]}.json")
+
+    @staticmethod
+    def _write_snapshot(path, counters, histograms):
+        snapshot = {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), hist] for (name, labels), hist in histograms.items()],
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _merge_snapshot(path, counters, histograms):
+        """Add a snapshot file's values to counters/histograms; False if it can't be read."""
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+        for name, labels, value in snapshot.get('counters', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, hist in snapshot.get('histograms', []):
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = {'buckets': hist['buckets'], 'counts': list(hist['counts']), 'sum': hist['sum'], 'count': hist['count']}
+            else:
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], hist['counts'])]
+                merged['sum'] += hist['sum']
+                merged['count'] += hist['count']
+        return True
+
+    def flush(self):
+        """Write this process's metrics to its snapshot file."""
+        with self.flush_lock:
+            if self._retired:
+                return
+            with self.lock:
+                counters = dict(self.counters)
+                histograms = {key: dict(hist, counts=list(hist['counts'])) for key, hist in self.histograms.items()}
+            if not counters and not histograms:
+                return
+            os.makedirs(self.metrics_dir, exist_ok=True)
+            self._write_snapshot(self._snapshot_path(), counters, histograms)
+
+    def retire(self):
+        """Fold this worker's final metrics into the retired totals; later flushes do nothing (gunicorn worker_exit)."""
+        self.flush()
+        with self.flush_lock:
+            self._retired = True
+            path = self._snapshot_path()
+        self._fold([path])
+
+    def _fold(self, paths):
+        """Add worker snapshots to retired.json and delete them, under an flock so each is counted once."""
+        os.makedirs(self.metrics_dir, exist_ok=True)
+        retired_path = os.path.join(self.metrics_dir, RETIRED_SNAPSHOT)
+        with open(os.path.join(self.metrics_dir, 'retired.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            counters, histograms = {}, {}
+            self._merge_snapshot(retired_path, counters, histograms)
+            folded = [path for path in paths if self._merge_snapshot(path, counters, histograms)]
+            if not folded:
+                return
+            self._write_snapshot(retired_path, counters, histograms)
+            for path in folded:
+                os.remove(path)
+
+    def _fold_dead_workers(self):
+        dead = []
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            try:
+                pid = int(os.path.basename(path).split('.')[0].split('-')[0])
+            except ValueError:
+                continue  # retired.json
+            if pid != os.getpid() and not _pid_alive(pid):
+                dead.append(path)
+        if dead:
+            self._fold(dead)
+
+    def ensure_flusher(self):
+        """Start the background flush thread once per process (threads don't survive fork)."""
+        pid = os.getpid()
+        if self._flusher_pid == pid:
+            return
+        self._flusher_pid = pid
+
+        def run():
+            while True:
+                time.sleep(self.flush_interval)
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+        threading.Thread(target=run, name='metrics-flusher', daemon=True).start()
+
+    def collect(self):
+        """Sum the snapshots of every worker (and the retired totals) into (counters, histograms)."""
+        self.flush()
+        try:
+            self._fold_dead_workers()
+        except OSError:
+            pass
+        counters, histograms = {}, {}
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            self._merge_snapshot(path, counters, histograms)
+        return counters, histograms
+
+    def clear_snapshots(self):
+        """Remove snapshot files, e.g. when the gunicorn master starts."""
+        for path in glob.glob(os.path.join(self.metrics_dir, '*.json')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # --- Exposition ---
+    def render_prometheus(self):
+        """Render the aggregated metrics in Prometheus text format."""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (metric_type, help_text) in METRIC_HELP.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if metric_type == 'counter':
+                for (key_name, labels), value in sorted(counters.items()):
+                    if key_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            else:
+                for (key_name, labels), hist in sorted(histograms.items()):
+                    if key_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(hist['buckets'], hist['counts']):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_float(bound)),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {hist['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by someone else
+    return True
+
+
+def _format_float(value):
+    return repr(float(value))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _statement_verb(sql):
+    verb = sql.lstrip().split(None, 1)[0].upper() if sql and sql.strip() else ''
+    return verb if verb in ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE') else 'OTHER'
+
+
+# Global registry for the application
+metrics_registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    """Flask extension recording request, template and DB metrics and serving /metrics."""
+
+    def __init__(self, app=None, db_manager=None, registry=None):
+        self.registry = registry or metrics_registry
+        self.db_manager = db_manager
+        if app is not None:
+            self.init_app(app, db_manager)
+
+    def init_app(self, app, db_manager=None):
+        """Register request hooks, template signals, DB listeners and the /metrics route."""
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+
+        db_manager = db_manager or self.db_manager
+        if db_manager is not None:
+            db_manager.checkout_listeners.append(self._pool_checkout)
+            db_manager.statement_listeners.append(self._statement)
+
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view, methods=['GET'])
+        atexit.register(self._flush_quietly)
+
+        # Store the extension instance in the app
+        app.extensions['request_metrics'] = self
+
+    def before_request(self):
+        """Start the request timer."""
+        self.registry.ensure_flusher()
+        g._metrics_started = time.perf_counter()
+
+    def after_request(self, response):
+        """Record request count and latency."""
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            endpoint = request.endpoint or 'unmatched'
+            self.registry.inc('http_requests_total', (('endpoint', endpoint), ('method', request.method), ('status', str(response.status_code))))
+            self.registry.observe('http_request_duration_seconds', time.perf_counter() - started, (('endpoint', endpoint),))
+        return response
+
+    def _template_started(self, sender, template, context, **extra):
+        g._metrics_template_started = time.perf_counter()
+
+    def _template_finished(self, sender, template, context, **extra):
+        started = g.pop('_metrics_template_started', None)
+        if started is not None:
+            self.registry.observe('template_render_duration_seconds', time.perf_counter() - started,
+                                  (('template', template.name or '<string>'),))
+
+    def _pool_checkout(self, waited, from_pool):
+        self.registry.observe('db_pool_wait_seconds', waited, buckets=POOL_WAIT_BUCKETS)
+        if not from_pool:
+            self.registry.inc('db_pool_overflow_total')
+
+    def _statement(self, sql):
+        self.registry.inc('db_queries_total', (('verb', _statement_verb(sql)),))
+
+    def _flush_quietly(self):
+        try:
+            self.registry.flush()
+        except OSError:
+            pass
+
+    def metrics_view(self):
+        """Prometheus scrape endpoint, protected by METRICS_TOKEN or an admin session."""
+        token = get_env_variable('METRICS_TOKEN')
+        auth_header = request.headers.get('Authorization', '')
+        token_ok = bool(token) and auth_header.startswith('Bearer ') and hmac.compare_digest(auth_header[7:], token)
+        if not token_ok and not session.get('admin_logged_in'):
+            return jsonify({'error': 'Not authorized'}), 401
+        return Response(self.registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
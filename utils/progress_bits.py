@@ -0,0 +1,238 @@
+"""
+Lesson completion stored as one bitmap per (student, course).
+
+Every lesson gets a permanent bit number within its course when it is
+inserted (lessons.progress_bit, allocated from courses.next_progress_bit by
+a trigger), so reordering or deleting lessons never shifts anyone's
+progress. A lesson moved to another course gets a fresh number there (its
+old bit could belong to another lesson of that course), so completions
+don't follow it. course_progress_bits holds one BLOB per (user_id, course_id);
+bit n is bit n % 8 of byte n // 8. Bits of deleted lessons are simply
+never looked at again.
+
+The former one-row-per-completion course_progress table is migrated into
+bitmaps by initialize_database() and replaced by a read-only view of the
+same name, so reporting queries keep working.
+
+Standard library only, except that completion_counts() uses NumPy when it
+is installed.
+"""
+import importlib.util
+from itertools import groupby
+
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+
+# Upsert one completion: ?1 user_id, ?2 course_id, ?3 lesson_id, ?4 completed_at. A lesson
+# deleted in the meantime, or one from another course, matches no row, so nothing is written for it
+SET_COMPLETED_SQL = '''
+    INSERT INTO course_progress_bits (user_id, course_id, bits, updated_at)
+    SELECT ?1, ?2, progress_set_bit(NULL, progress_bit), ?4 FROM lessons
+    WHERE id = ?3 AND course_id = ?2 AND progress_bit IS NOT NULL
+    ON CONFLICT (user_id, course_id) DO UPDATE SET
+        bits = progress_or(bits, excluded.bits),
+        updated_at = MAX(COALESCE(updated_at, ''), excluded.updated_at)
+'''
+
+# Numbers each new lesson from its course's counter, whichever code path inserts it
+NUMBER_LESSONS_TRIGGER_SQL = '''
+    CREATE TRIGGER IF NOT EXISTS lessons_progress_bit AFTER INSERT ON lessons
+    WHEN NEW.progress_bit IS NULL
+    BEGIN
+        UPDATE lessons SET progress_bit = (SELECT COALESCE(next_progress_bit, 0) FROM courses WHERE id = NEW.course_id)
+        WHERE id = NEW.id;
+        UPDATE courses SET next_progress_bit = COALESCE(next_progress_bit, 0) + 1 WHERE id = NEW.course_id;
+    END
+'''
+
+# Renumbers a lesson moved to another course from that course's counter
+RENUMBER_MOVED_LESSONS_TRIGGER_SQL = '''
+    CREATE TRIGGER IF NOT EXISTS lessons_progress_bit_moved AFTER UPDATE OF course_id ON lessons
+    WHEN NEW.course_id IS NOT OLD.course_id
+    BEGIN
+        UPDATE lessons SET progress_bit = (SELECT COALESCE(next_progress_bit, 0) FROM courses WHERE id = NEW.course_id)
+        WHERE id = NEW.id;
+        UPDATE courses SET next_progress_bit = COALESCE(next_progress_bit, 0) + 1 WHERE id = NEW.course_id;
+    END
+'''
+
+# One row per completed lesson, like the old table. Pure SQL (hex() + instr()
+# read the byte) so it also works outside the app, e.g. in the sqlite3 shell.
+COMPATIBILITY_VIEW_SQL = '''
+    CREATE VIEW IF NOT EXISTS course_progress AS
+    -- completed_at is the bitmap's updated_at: when the student last completed any lesson
+    -- of the course, not when this lesson was completed (bitmaps keep no per-lesson times)
+    SELECT NULL AS id, b.user_id, b.course_id, l.id AS lesson_id, 1 AS completed, b.updated_at AS completed_at
+    FROM course_progress_bits b
+    JOIN lessons l ON l.course_id = b.course_id
+    WHERE l.progress_bit IS NOT NULL
+      AND length(b.bits) > l.progress_bit / 8
+      AND ((instr('123456789ABCDEF', substr(hex(b.bits), 2 * (l.progress_bit / 8) + 1, 1)) * 16 +
+            instr('123456789ABCDEF', substr(hex(b.bits), 2 * (l.progress_bit / 8) + 2, 1)))
+           >> (l.progress_bit % 8)) & 1 = 1
+'''
+
+
+def test_bit(bits, index):
+    """Whether bit `index` is set."""
+    if not bits or index is None:
+        return False
+    byte = index >> 3
+    return byte < len(bits) and bool(bits[byte] >> (index & 7) & 1)
+
+
+def set_bit(bits, index):
+    """Copy of `bits` with bit `index` set (grown as needed)."""
+    data = bytearray(bits or b'')
+    byte = index >> 3
+    if byte >= len(data):
+        data.extend(b'\x00' * (byte + 1 - len(data)))
+    data[byte] |= 1 << (index & 7)
+    return bytes(data)
+
+
+def merge(a, b):
+    """Bitwise OR of two bitmaps."""
+    if not a:
+        return bytes(b or b'')
+    if not b:
+        return bytes(a)
+    length = max(len(a), len(b))
+    return (int.from_bytes(a, 'little') | int.from_bytes(b, 'little')).to_bytes(length, 'little')
+
+
+def mask_for(indexes):
+    """Bitmap with the given bits set, e.g. the bits of a course's current lessons."""
+    value = 0
+    for index in indexes:
+        if index is not None:
+            value |= 1 << index
+    return value.to_bytes((value.bit_length() + 7) // 8, 'little')
+
+
+def popcount(bits, mask=None):
+    """Number of set bits, optionally only those also set in `mask`."""
+    value = int.from_bytes(bits or b'', 'little')
+    if mask is not None:
+        value &= int.from_bytes(mask, 'little')
+    return bin(value).count('1')
+
+
+def register_functions(conn):
+    """SQL functions used by SET_COMPLETED_SQL; call on every new connection."""
+    def progress_set_bit(bits, index):
+        return None if index is None else set_bit(bits, index)
+
+    conn.create_function('progress_set_bit', 2, progress_set_bit, deterministic=True)
+    conn.create_function('progress_or', 2, merge, deterministic=True)
+
+
+def load_bits(conn, user_id, course_id):
+    row = conn.execute('SELECT bits FROM course_progress_bits WHERE user_id = ? AND course_id = ?',
+                       (user_id, course_id)).fetchone()
+    return bytes(row['bits']) if row and row['bits'] else b''
+
+
+def completion_counts(bitmaps, size):
+    """
+    Count, for every bit, how many bitmaps have it set.
+
+    Args:
+        bitmaps: iterable of bitmap bytes (one per student)
+        size: number of bits to count (courses.next_progress_bit)
+
+    Returns:
+        List of `size` counts, indexed by progress_bit
+    """
+    width = (size + 7) // 8
+    if NUMPY_AVAILABLE:
+        import numpy as np
+
+        buffer = b''.join(bytes(bits or b'')[:width].ljust(width, b'\x00') for bits in bitmaps)
+        if not buffer or not width:
+            return [0] * size
+        matrix = np.unpackbits(np.frombuffer(buffer, dtype=np.uint8).reshape(-1, width), axis=1, bitorder='little')
+        return matrix[:, :size].sum(axis=0).tolist()
+
+    counts = [0] * size
+    for bits in bitmaps:
+        value = int.from_bytes(bytes(bits or b'')[:width], 'little')
+        while value:
+            low = value & -value
+            counts[low.bit_length() - 1] += 1
+            value ^= low
+    return counts
+
+
+def lesson_completion_counts(conn, course_id=None):
+    """
+    Number of students who completed each lesson, one completion_counts() pass per course.
+
+    Returns:
+        Dict of lesson_id -> count (every lesson is present, 0 if nobody completed it)
+    """
+    course_filter, params = (' AND course_id = ?', (course_id,)) if course_id is not None else ('', ())
+    lessons = conn.execute('SELECT id, course_id, progress_bit FROM lessons WHERE progress_bit IS NOT NULL'
+                           + course_filter, params).fetchall()
+    sizes = {}
+    for _, lesson_course_id, index in lessons:
+        sizes[lesson_course_id] = max(sizes.get(lesson_course_id, 0), index + 1)
+
+    counts = {}
+    bitmaps = conn.execute('SELECT course_id, bits FROM course_progress_bits WHERE 1 = 1' + course_filter
+                           + ' ORDER BY course_id', params)
+    for bitmap_course_id, group in groupby(bitmaps, key=lambda row: row[0]):
+        if bitmap_course_id in sizes:
+            counts[bitmap_course_id] = completion_counts((row[1] for row in group), sizes[bitmap_course_id])
+    return {lesson_id: counts[lesson_course_id][index] if lesson_course_id in counts else 0
+            for lesson_id, lesson_course_id, index in lessons}
+
+
+def number_lessons(conn):
+    """Give lessons created before progress bitmaps existed their bit numbers."""
+    unnumbered = conn.execute('SELECT id, course_id FROM lessons WHERE progress_bit IS NULL ORDER BY course_id, id').fetchall()
+    if not unnumbered:
+        return 0
+    next_bits = {row[0]: row[1] or 0 for row in conn.execute('SELECT id, next_progress_bit FROM courses')}
+    numbered = []
+    for lesson_id, course_id in unnumbered:
+        numbered.append((next_bits.get(course_id, 0), lesson_id))
+        next_bits[course_id] = next_bits.get(course_id, 0) + 1
+    conn.executemany('UPDATE lessons SET progress_bit = ? WHERE id = ?', numbered)
+    conn.executemany('UPDATE courses SET next_progress_bit = ? WHERE id = ?',
+                     [(next_bit, course_id) for course_id, next_bit in next_bits.items()])
+    return len(numbered)
+
+
+def migrate_rows(conn):
+    """
+    Fold the old course_progress table into bitmaps and replace it with the view.
+
+    No-op once course_progress is a view. Runs inside the caller's transaction.
+
+    Returns:
+        Number of (student, course) bitmaps written
+    """
+    kind = conn.execute("SELECT type FROM sqlite_master WHERE name = 'course_progress'").fetchone()
+    if kind is None or kind[0] != 'table':
+        return 0
+    rows = conn.execute('''
+        SELECT cp.user_id, cp.course_id, l.progress_bit, cp.completed_at
+        FROM course_progress cp JOIN lessons l ON l.id = cp.lesson_id AND l.course_id = cp.course_id
+        WHERE cp.completed = 1 AND l.progress_bit IS NOT NULL
+        ORDER BY cp.user_id, cp.course_id
+    ''')
+    bitmaps = []
+    for (user_id, course_id), group in groupby(rows, key=lambda row: (row[0], row[1])):
+        value, updated_at = 0, None
+        for _, _, index, completed_at in group:
+            value |= 1 << index
+            updated_at = max(updated_at or '', completed_at or '') or None
+        bitmaps.append((user_id, course_id, value.to_bytes((value.bit_length() + 7) // 8, 'little'), updated_at))
+    conn.executemany('''
+        INSERT INTO course_progress_bits (user_id, course_id, bits, updated_at) VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id, course_id) DO UPDATE SET bits = progress_or(bits, excluded.bits)
+    ''', bitmaps)
+    # Kept (renamed) rather than dropped, in case the migration has to be redone
+    conn.execute('ALTER TABLE course_progress RENAME TO course_progress_rows')
+    conn.execute(COMPATIBILITY_VIEW_SQL)
+    return len(bitmaps)
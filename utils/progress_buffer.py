@@ -0,0 +1,332 @@
+import atexit
+import fcntl
+import glob
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from utils.db_utils import db_manager
+from utils.logging_utils import app_logger, log_error, log_info, log_warning
+from utils.progress_bits import SET_COMPLETED_SQL
+from utils.security_utils import get_env_variable
+
+# An attempt already written (same attempt_uid, e.g. from a replayed journal) is skipped
+ATTEMPT_SQL = ("INSERT OR IGNORE INTO quiz_attempts (user_id, course_id, lesson_id, attempt_timestamp, "
+               "submitted_answers, is_correct, score, attempt_uid) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+# Per-lesson aggregates are bumped in the same transaction as the attempts they count
+STATS_SQL = (
+    "INSERT INTO quiz_lesson_stats (lesson_id, course_id, attempts, correct_attempts, total_score, last_attempt_at) "
+    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (lesson_id) DO UPDATE SET "
+    "attempts = attempts + excluded.attempts, correct_attempts = correct_attempts + excluded.correct_attempts, "
+    "total_score = total_score + excluded.total_score, "
+    "last_attempt_at = MAX(COALESCE(last_attempt_at, ''), excluded.last_attempt_at)")
+
+
+class ProgressWriteBuffer:
+    """
+    Coalesces lesson completions and quiz attempts into batched transactions.
+
+    record() and record_attempt() append to a journal file and return; a
+    background thread writes everything recorded since the last flush with
+    executemany and one commit every PROGRESS_FLUSH_INTERVAL_MS, or sooner
+    once PROGRESS_FLUSH_BATCH writes are waiting. Repeated completions of
+    the same lesson by the same student are dropped before they reach the
+    database; every quiz attempt is kept, and quiz_lesson_stats is updated
+    in the same transaction from the attempts actually inserted. Attempts
+    carry a unique id, so writing one twice (a journal replayed after its
+    batch was committed) is a no-op.
+
+    Each process appends to its own journal segment in PROGRESS_JOURNAL_DIR
+    (default: next to the database) and holds an flock on it while it is
+    open. A flush seals the segment (new records go to a fresh one) and
+    deletes it, still locked, once the batch is committed, so a segment on
+    disk holds acknowledged writes that may not be in the database yet.
+    Segments nobody holds a lock on (their process died) are replayed when
+    a process starts its flusher.
+    """
+
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager
+        self.lock = threading.Lock()
+        # Only one flush (or replay) writes at a time
+        self.flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._attempts = []
+        self._recent = set()
+        self._segment = None
+        self._segment_path = None
+        self._sealed = []
+        self._sequence = 0
+        self._thread_pid = None
+        self.configure()
+
+    def configure(self):
+        """(Re)read settings from the environment."""
+        # 0 writes each completion straight through, as before
+        self.interval = float(get_env_variable('PROGRESS_FLUSH_INTERVAL_MS', 250)) / 1000
+        self.batch_size = int(get_env_variable('PROGRESS_FLUSH_BATCH', 500))
+        # fsync each journal append: survives power loss, not just a crashed worker
+        self.fsync = str(get_env_variable('PROGRESS_JOURNAL_FSYNC', 'false')).lower() in ('1', 'true', 'yes')
+        self._journal_dir = get_env_variable('PROGRESS_JOURNAL_DIR', '')
+        self.recent_limit = 100000
+
+    def init_app(self, app):
+        self.configure()
+        self.db_manager = app.extensions.get('db_manager', self.db_manager)
+
+        # Store the extension instance in the app
+        app.extensions['progress_buffer'] = self
+
+    @property
+    def journal_dir(self):
+        return self._journal_dir or f"{(self.db_manager or db_manager).db_path}.progress-journal"
+
+    def reset(self):
+        """Forget state inherited from the parent (threads and journal locks don't survive fork)."""
+        with self.lock:
+            self._pending.clear()
+            self._attempts = []
+            self._recent.clear()
+            self._segment = None
+            self._segment_path = None
+            self._sealed = []
+            self._thread_pid = None
+
+    # --- Recording ---
+
+    def record(self, user_id, course_id, lesson_id):
+        """
+        Record a lesson completion.
+
+        Returns:
+            False if the completion was already waiting to be written (or was just written), else True
+        """
+        key = (int(user_id), int(course_id), int(lesson_id))
+        completed_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')  # Same format as CURRENT_TIMESTAMP
+        if self.interval <= 0:
+            self._write([key + (completed_at,)], [])
+            return True
+
+        self.start()
+        with self.lock:
+            if key in self._pending or key in self._recent:
+                return False
+            self._journal(key + (completed_at,))
+            self._pending[key] = completed_at
+            full = len(self._pending) + len(self._attempts) >= self.batch_size
+        if full:
+            self._wakeup.set()
+        return True
+
+    def record_attempt(self, user_id, course_id, lesson_id, submitted_answers, is_correct, score):
+        """Record a graded quiz attempt."""
+        attempted_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        attempt = (int(user_id), int(course_id), int(lesson_id), attempted_at, json.dumps(submitted_answers),
+                   bool(is_correct), int(score), uuid.uuid4().hex)
+        if self.interval <= 0:
+            self._write([], [attempt])
+            return
+
+        self.start()
+        with self.lock:
+            self._journal(('quiz',) + attempt)
+            self._attempts.append(attempt)
+            full = len(self._pending) + len(self._attempts) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def pending_for(self, user_id):
+        """(course_id, lesson_id) pairs this process has acknowledged but not yet written."""
+        with self.lock:
+            return [(course_id, lesson_id) for (uid, course_id, lesson_id) in self._pending if uid == user_id]
+
+    def _journal(self, record):
+        # Called with self.lock held
+        segment = self._open_segment()
+        segment.write(json.dumps(record) + '\n')
+        segment.flush()
+        if self.fsync:
+            os.fsync(segment.fileno())
+
+    def _open_segment(self):
+        # Called with self.lock held
+        if self._segment is None:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            self._sequence += 1
+            self._segment_path = os.path.join(self.journal_dir, f"{os.getpid()}-{self._sequence}.journal")
+            self._segment = open(self._segment_path, 'a')
+            fcntl.flock(self._segment.fileno(), fcntl.LOCK_EX)
+        return self._segment
+
+    def _seal(self):
+        # Called with self.lock held. The sealed segment stays open (and locked)
+        # until its records are committed, so no other process replays it
+        if self._segment is not None:
+            self._sealed.append((self._segment_path, self._segment))
+            self._segment = None
+            self._segment_path = None
+        return list(self._sealed)
+
+    # --- Flushing ---
+
+    def _write(self, rows, attempts):
+        """
+        Set completion bits and insert attempts in one transaction.
+
+        Rows a foreign key rejects (lesson or user deleted meanwhile) are
+        dropped without failing the rest of the batch.
+        """
+        manager = self.db_manager or db_manager
+        conn = manager.get_connection()
+        try:
+            try:
+                conn.executemany(SET_COMPLETED_SQL, rows)
+                inserted = [attempt for attempt in attempts if conn.execute(ATTEMPT_SQL, attempt).rowcount]
+                conn.executemany(STATS_SQL, self._aggregate(inserted))
+                conn.commit()
+                return len(rows) + len(inserted)
+            except sqlite3.IntegrityError:
+                conn.rollback()
+            written, kept = 0, []
+            for sql, batch in ((SET_COMPLETED_SQL, rows), (ATTEMPT_SQL, attempts)):
+                for row in batch:
+                    try:
+                        changed = conn.execute(sql, row).rowcount
+                        if sql is not ATTEMPT_SQL:
+                            written += 1
+                        elif changed:
+                            kept.append(row)
+                    except sqlite3.IntegrityError:
+                        log_warning(app_logger, "Dropped progress for a deleted lesson or user", user_id=row[0],
+                                    course_id=row[1], lesson_id=row[2])
+            conn.executemany(STATS_SQL, self._aggregate(kept))
+            conn.commit()
+            return written + len(kept)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            manager.return_connection(conn)
+
+    @staticmethod
+    def _aggregate(attempts):
+        stats = {}
+        for user_id, course_id, lesson_id, attempted_at, _, is_correct, score, _ in attempts:
+            entry = stats.setdefault(lesson_id, [lesson_id, course_id, 0, 0, 0, attempted_at])
+            entry[2] += 1
+            entry[3] += int(is_correct)
+            entry[4] += score
+            entry[5] = max(entry[5], attempted_at)
+        return list(stats.values())
+
+    def flush(self):
+        """
+        Write all pending completions.
+
+        Returns:
+            Number of rows written
+        """
+        with self.flush_lock:
+            with self.lock:
+                if not self._pending and not self._attempts:
+                    return 0
+                batch, self._pending = self._pending, {}
+                attempts, self._attempts = self._attempts, []
+                sealed = self._seal()
+            try:
+                written = self._write([key + (completed_at,) for key, completed_at in batch.items()], attempts)
+            except Exception:
+                # Keep the batch (and its journal segments) for the next attempt
+                with self.lock:
+                    for key, completed_at in batch.items():
+                        self._pending.setdefault(key, completed_at)
+                    self._attempts[:0] = attempts
+                raise
+            with self.lock:
+                self._sealed = [segment for segment in self._sealed if segment not in sealed]
+                if len(self._recent) + len(batch) > self.recent_limit:
+                    self._recent.clear()
+                self._recent.update(batch)
+        for path, segment in sealed:
+            os.remove(path)
+            segment.close()
+        return written
+
+    def flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            log_error(app_logger, "Progress flush failed", error=str(e))
+
+    def replay_journals(self):
+        """
+        Write completions and attempts from journal segments left behind by dead processes.
+
+        Returns:
+            Number of records replayed
+        """
+        replayed = 0
+        for path in sorted(glob.glob(os.path.join(self.journal_dir, '*.journal'))):
+            with self.lock:
+                if path == self._segment_path or path in [sealed_path for sealed_path, _ in self._sealed]:
+                    continue
+            try:
+                f = open(path, 'r')
+            except FileNotFoundError:
+                continue
+            with f:
+                try:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    continue  # Its process is alive and still appending
+                rows, attempts = {}, []
+                for number, line in enumerate(f):
+                    try:
+                        record = json.loads(line)
+                        if record[0] == 'quiz':
+                            # Journals written before attempts had ids: derive a stable one from the position
+                            attempt_uid = record[8] if len(record) > 8 else f"{os.path.basename(path)}:{number}"
+                            attempts.append(tuple(record[1:8]) + (attempt_uid,))
+                        else:
+                            user_id, course_id, lesson_id, completed_at = record
+                            rows.setdefault((user_id, course_id, lesson_id), completed_at)
+                    except (ValueError, IndexError):
+                        continue  # Torn final line from a crash mid-append
+                if rows or attempts:
+                    with self.flush_lock:
+                        self._write([key + (completed_at,) for key, completed_at in rows.items()], attempts)
+                os.remove(path)
+            replayed += len(rows) + len(attempts)
+        if replayed:
+            log_info(app_logger, "Replayed progress journal", records=replayed)
+        return replayed
+
+    def start(self):
+        """Replay orphaned journals and start the flusher in this process (threads don't survive fork)."""
+        if self.interval <= 0 or self._thread_pid == os.getpid():
+            return
+        with self.lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+        try:
+            self.replay_journals()
+        except Exception as e:
+            log_error(app_logger, "Progress journal replay failed", error=str(e))
+
+        def run():
+            while True:
+                self._wakeup.wait(self.interval)
+                self._wakeup.clear()
+                self.flush_quietly()
+
+        threading.Thread(target=run, name='progress-flusher', daemon=True).start()
+        atexit.register(self.flush_quietly)
+
+
+# Global instance for the application
+progress_buffer = ProgressWriteBuffer()
@@ -0,0 +1,200 @@
+"""
+Students x lessons completion matrix of a course, for teachers.
+
+The whole course is aggregated at once: every enrolled student's progress
+bitmap is unpacked into one boolean matrix (NumPy when it is installed),
+from which per-lesson completion rates, per-student percentages and
+drop-off points (the first lesson a student who started has not
+completed) are column/row reductions. The result is cached per process
+and per course version: courses.progress_version, which triggers bump on
+any change to the course's progress, lessons, modules or enrollments.
+Requests then only paginate the cached students.
+"""
+import threading
+
+from utils import progress_bits
+
+# Tables whose changes alter a course's matrix, and how a row finds its course
+_VERSIONED_TABLES = (
+    ('course_progress_bits', 'id = {row}.course_id'),
+    ('lessons', 'id = {row}.course_id'),
+    ('modules', 'id = {row}.course_id'),
+    ('enrollments', 'name = {row}.course_type'),
+)
+
+VERSION_TRIGGERS_SQL = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS {table}_{event.lower()}_progress_version AFTER {event} ON {table}
+    BEGIN
+        UPDATE courses SET progress_version = COALESCE(progress_version, 0) + 1 WHERE {where.format(row=row)};
+    END
+    '''
+    for table, where in _VERSIONED_TABLES
+    for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD'))
+]
+
+
+def _aggregate(bitmaps, columns):
+    """
+    Reduce the students x lessons matrix.
+
+    Args:
+        bitmaps: one progress bitmap per student
+        columns: progress_bit of each lesson, in course order
+
+    Returns:
+        (completed lessons per student, index of each student's first incomplete
+        lesson or -1, completions per lesson, drop-offs per lesson)
+    """
+    if progress_bits.NUMPY_AVAILABLE:
+        import numpy as np
+
+        width = max(columns) // 8 + 1
+        buffer = b''.join(bytes(bits or b'')[:width].ljust(width, b'\x00') for bits in bitmaps)
+        packed = np.frombuffer(buffer, dtype=np.uint8).reshape(len(bitmaps), width)
+        matrix = np.unpackbits(packed, axis=1, bitorder='little')[:, columns].astype(bool)
+        completed = matrix.sum(axis=1)
+        finished = completed == len(columns)
+        # argmin of a boolean row is its first False
+        first_missing = np.where(finished, -1, np.argmin(matrix, axis=1))
+        drop_offs = np.bincount(first_missing[(completed > 0) & ~finished], minlength=len(columns))
+        return completed.tolist(), first_missing.tolist(), matrix.sum(axis=0).tolist(), drop_offs.tolist()
+
+    completed, first_missing = [], []
+    lesson_counts, drop_offs = [0] * len(columns), [0] * len(columns)
+    for bits in bitmaps:
+        row = [progress_bits.test_bit(bits, index) for index in columns]
+        done = sum(row)
+        missing = row.index(False) if done < len(row) else -1
+        for position, is_set in enumerate(row):
+            lesson_counts[position] += is_set
+        if done and missing >= 0:
+            drop_offs[missing] += 1
+        completed.append(done)
+        first_missing.append(missing)
+    return completed, first_missing, lesson_counts, drop_offs
+
+
+def build_matrix(conn, course_id, version=None):
+    """
+    Aggregate a course's progress matrix.
+
+    Returns:
+        Dict with the course's lessons (with completion rates and drop-offs),
+        its enrolled students (with their bitmaps and percentages) and a
+        summary, or None if the course doesn't exist
+    """
+    course = conn.execute('SELECT id, name, progress_version FROM courses WHERE id = ?', (course_id,)).fetchone()
+    if not course:
+        return None
+    lessons = [dict(row) for row in conn.execute('''
+        SELECT l.id AS lesson_id, l.lesson, m.name AS module_name, l.progress_bit
+        FROM lessons l JOIN modules m ON l.module_id = m.id
+        WHERE l.course_id = ? AND l.progress_bit IS NOT NULL
+        ORDER BY m.order_index, l.order_index, l.lesson
+    ''', (course_id,))]
+    students = [dict(row) for row in conn.execute('''
+        SELECT u.id AS user_id, u.full_name, u.email, MIN(e.enrolled_at) AS enrolled_at
+        FROM enrollments e JOIN users u ON e.user_id = u.id
+        WHERE e.course_type = ? AND e.payment_status = 'completed'
+        GROUP BY u.id ORDER BY u.full_name, u.id
+    ''', (course['name'],))]
+    bits_by_user = {row['user_id']: bytes(row['bits'] or b'') for row in conn.execute(
+        'SELECT user_id, bits FROM course_progress_bits WHERE course_id = ?', (course_id,))}
+
+    columns = [lesson['progress_bit'] for lesson in lessons]
+    bitmaps = [bits_by_user.get(student['user_id'], b'') for student in students]
+    if students and columns:
+        completed, first_missing, lesson_counts, drop_offs = _aggregate(bitmaps, columns)
+    else:
+        completed, first_missing = [0] * len(students), [0 if columns else -1] * len(students)
+        lesson_counts, drop_offs = [0] * len(columns), [0] * len(columns)
+
+    for lesson, count, dropped in zip(lessons, lesson_counts, drop_offs):
+        lesson['completed'] = count
+        lesson['completion_rate'] = round(count / len(students), 3) if students else None
+        lesson['drop_offs'] = dropped
+    for student, bits, done, missing in zip(students, bitmaps, completed, first_missing):
+        student['bits'] = bits
+        student['completed'] = done
+        student['percent'] = round(100 * done / len(columns), 1) if columns else 0
+        student['next_lesson_id'] = lessons[missing]['lesson_id'] if missing >= 0 else None
+
+    return {
+        'course_id': course['id'],
+        'version': course['progress_version'] if version is None else version,
+        'lessons': lessons,
+        'students': students,
+        'summary': {
+            'students': len(students),
+            'lessons': len(lessons),
+            'not_started': sum(1 for done in completed if not done),
+            'finished': sum(1 for done in completed if columns and done == len(columns)),
+            'average_percent': round(sum(s['percent'] for s in students) / len(students), 1) if students else None,
+        },
+    }
+
+
+def matrix_page(matrix, page, per_page):
+    """JSON-ready page of a matrix: all lessons, and one row of 0/1 cells per student on the page."""
+    total = len(matrix['students'])
+    columns = [lesson['progress_bit'] for lesson in matrix['lessons']]
+    rows = []
+    for student in matrix['students'][(page - 1) * per_page:page * per_page]:
+        row = {key: value for key, value in student.items() if key != 'bits'}
+        row['cells'] = [int(progress_bits.test_bit(student['bits'], index)) for index in columns]
+        rows.append(row)
+    return {
+        'course_id': matrix['course_id'],
+        'version': matrix['version'],
+        'lessons': [{key: value for key, value in lesson.items() if key != 'progress_bit'}
+                    for lesson in matrix['lessons']],
+        'summary': matrix['summary'],
+        'students': rows,
+        'page': page,
+        'per_page': per_page,
+        'total_pages': (total + per_page - 1) // per_page,
+    }
+
+
+class ProgressMatrixCache:
+    """
+    Per-process cache of built matrices, keyed by course and progress_version.
+
+    A lookup costs one primary-key read of the course's version; the matrix
+    is rebuilt only after something in the course changed.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._matrices = {}
+
+    def get(self, conn, course_id):
+        row = conn.execute('SELECT progress_version FROM courses WHERE id = ?', (course_id,)).fetchone()
+        if not row:
+            return None
+        with self.lock:
+            cached = self._matrices.get(course_id)
+        if cached and cached['version'] == row['progress_version']:
+            return cached
+        # Read the version and the data in one snapshot so a concurrent write can't be cached under the old version
+        conn.execute('BEGIN')
+        try:
+            matrix = build_matrix(conn, course_id)
+        finally:
+            conn.rollback()
+        if matrix:
+            with self.lock:
+                if len(self._matrices) >= self.max_entries:
+                    self._matrices.clear()
+                self._matrices[course_id] = matrix
+        return matrix
+
+    def clear(self):
+        with self.lock:
+            self._matrices.clear()
+
+
+# Global instance for the application
+progress_matrices = ProgressMatrixCache()
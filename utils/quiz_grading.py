@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+
+from werkzeug.exceptions import BadRequest, Forbidden, NotFound
+
+from utils.db_utils import db_manager
+from utils.progress_buffer import progress_buffer
+
+# Element properties that must never reach the student's browser
+ANSWER_KEY_PROPERTIES = ('correct_answer_index',)
+SCORE_CORRECT = 100
+_NOT_A_QUIZ = object()
+
+
+class QuizAnswerKeys:
+    """
+    Per-process cache of quiz answer keys, built from lesson element_properties.
+
+    A key holds what grading needs (the lesson's course, number of options
+    and correct index), so a submission is graded without a database read.
+    Workers share a generation file next to the database: invalidate()
+    touches it, and every lookup compares its mtime (one stat call) and
+    drops the whole cache when it changed, so an edited quiz is graded
+    with its new key in every worker.
+    """
+
+    def __init__(self, db_manager=None, max_entries=10000):
+        self.db_manager = db_manager
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self._keys = {}
+        self._generation = None
+
+    @property
+    def generation_path(self):
+        return f"{(self.db_manager or db_manager).db_path}.quiz-keys"
+
+    def _current_generation(self):
+        try:
+            return os.stat(self.generation_path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def invalidate(self, lesson_id=None):
+        """Drop cached keys after a lesson or course changed (in every worker)."""
+        with self.lock:
+            if lesson_id is None:
+                self._keys.clear()
+            else:
+                self._keys.pop(lesson_id, None)
+        with open(self.generation_path, 'a'):
+            os.utime(self.generation_path, None)
+
+    def get(self, lesson_id):
+        """Answer key for a quiz lesson, or None if the lesson doesn't exist or isn't a quiz."""
+        generation = self._current_generation()
+        with self.lock:
+            if generation != self._generation:
+                self._keys.clear()
+                self._generation = generation
+            key = self._keys.get(lesson_id)
+        if key is None:
+            key = self._load(lesson_id)
+            if key is None:
+                return None  # Not cached: the lesson may be created later
+            with self.lock:
+                if len(self._keys) >= self.max_entries:
+                    self._keys.clear()
+                self._keys[lesson_id] = key
+        return None if key is _NOT_A_QUIZ else key
+
+    def _load(self, lesson_id):
+        manager = self.db_manager or db_manager
+        conn = manager.get_connection()
+        try:
+            row = conn.execute('''
+                SELECT l.course_id, l.content_type, l.element_properties, c.name AS course_name
+                FROM lessons l JOIN courses c ON l.course_id = c.id WHERE l.id = ?
+            ''', (lesson_id,)).fetchone()
+        finally:
+            manager.return_connection(conn)
+        if not row:
+            return None
+        if row['content_type'] != 'quiz':
+            return _NOT_A_QUIZ
+        try:
+            props = json.loads(row['element_properties']) if row['element_properties'] else {}
+            options = props.get('options') or []
+            correct = int(props.get('correct_answer_index', 0))
+        except (TypeError, ValueError, AttributeError):
+            return _NOT_A_QUIZ
+        if not isinstance(options, list) or not 0 <= correct < len(options):
+            return _NOT_A_QUIZ
+        return {'course_id': row['course_id'], 'course_name': row['course_name'], 'options': len(options),
+                'correct': correct}
+
+
+def public_element_properties(element_properties):
+    """element_properties without the answer key, for rendering to students."""
+    return {key: value for key, value in element_properties.items() if key not in ANSWER_KEY_PROPERTIES}
+
+
+def grade_submission(lesson_id, enrollment, data):
+    """
+    Grade a student's quiz answer and record the attempt.
+
+    Args:
+        lesson_id: the quiz lesson
+        enrollment: the student's session enrollment (user_id, course_type)
+        data: submitted JSON, {'answer_index': int}
+
+    Returns:
+        Dict with is_correct and score (the correct answer is not revealed)
+
+    Raises:
+        NotFound, Forbidden or BadRequest
+    """
+    key = quiz_answer_keys.get(lesson_id)
+    if key is None:
+        raise NotFound('Quiz not found')
+    if key['course_name'] != enrollment.get('course_type'):
+        raise Forbidden('Access denied to this lesson.')
+    answer = data.get('answer_index') if isinstance(data, dict) else None
+    if isinstance(answer, bool) or not isinstance(answer, int) or not 0 <= answer < key['options']:
+        raise BadRequest('answer_index must be the index of one of the options')
+
+    is_correct = answer == key['correct']
+    score = SCORE_CORRECT if is_correct else 0
+    # Inserted with the next batch of progress writes, which also updates quiz_lesson_stats
+    progress_buffer.record_attempt(enrollment['user_id'], key['course_id'], lesson_id, {'answer_index': answer},
+                                   is_correct, score)
+    return {'is_correct': is_correct, 'score': score}
+
+
+# Global instance for the application
+quiz_answer_keys = QuizAnswerKeys()
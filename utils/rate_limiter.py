@@ -15,6 +15,10 @@ class RateLimiter:
             'max_requests': max_requests,
             'window_seconds': window_seconds
         }
+
+    def reset(self):
+        """Forget all recorded requests (e.g. state inherited by a forked worker)."""
+        self.requests = {}
     
     def is_allowed(self, key):
         """Check if a request is allowed based on rate limiting."""
@@ -0,0 +1,120 @@
+"""
+Expiring signed URLs for lesson files.
+
+The app signs a path under UPLOAD_DIR and an expiry time; whatever serves the
+file (media_verifier.py, or nginx's secure_link module) checks the signature
+without calling back into the app. This module only uses the standard library
+so the verifier can import it without Flask or the database.
+
+Two formats are supported:
+  hmac        ?expires=<ts>&kid=<period>&sig=<HMAC-SHA256>, checked by media_verifier.py.
+              Keys are derived from SECRET_KEY per key period, so a leaked
+              derived key stops working after at most two periods, and changing
+              SECRET_KEY rotates every key at once.
+  secure_link ?expires=<ts>&md5=<MD5>, checked by nginx `secure_link_md5
+              "$secure_link_expires$uri <secret>"`. nginx cannot derive keys,
+              so <secret> is a single key derived from SECRET_KEY; print it
+              with `python -m utils.signed_urls nginx-secret`.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import sys
+import time
+from urllib.parse import quote, urlencode
+
+DEFAULT_TTL = 900
+DEFAULT_KEY_PERIOD = 86400
+
+
+def _b64(digest):
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def derive_key(secret_key, label):
+    """Derive a purpose-specific key from SECRET_KEY so it is never used directly."""
+    if isinstance(secret_key, str):
+        secret_key = secret_key.encode('utf-8')
+    return hmac.new(secret_key, b'vibes-media-url\x00' + str(label).encode('ascii'), hashlib.sha256).digest()
+
+
+def nginx_secret(secret_key):
+    """Secret to paste into nginx's secure_link_md5 expression."""
+    return _b64(derive_key(secret_key, 'nginx-secure-link'))
+
+
+def _hmac_signature(key, path, expires):
+    return _b64(hmac.new(key, f"{expires}\n{path}".encode('utf-8'), hashlib.sha256).digest())
+
+
+def _md5_signature(secret, path, expires):
+    # Same string nginx builds from "$secure_link_expires$uri <secret>"
+    return _b64(hashlib.md5(f"{expires}{path} {secret}".encode('utf-8')).digest())
+
+
+def sign_path(path, secret_key, ttl=DEFAULT_TTL, key_period=DEFAULT_KEY_PERIOD, fmt='hmac', now=None):
+    """
+    Sign a URL path.
+
+    Args:
+        path: URL path the file will be requested at, e.g. /protected-media/ab/ab12....mp4
+        secret_key: the app's SECRET_KEY
+        ttl: seconds until the URL expires
+        key_period: seconds each derived hmac key is used for signing
+        fmt: 'hmac' or 'secure_link'
+        now: current unix time (for tests)
+
+    Returns:
+        The path with the signature query string appended
+    """
+    now = int(time.time() if now is None else now)
+    expires = now + int(ttl)
+    path = quote(path)
+    if fmt == 'secure_link':
+        params = {'expires': expires, 'md5': _md5_signature(nginx_secret(secret_key), path, expires)}
+    else:
+        kid = now // int(key_period)
+        params = {'expires': expires, 'kid': kid,
+                  'sig': _hmac_signature(derive_key(secret_key, kid), path, expires)}
+    return f"{path}?{urlencode(params)}"
+
+
+def verify_path(path, params, secret_keys, key_period=DEFAULT_KEY_PERIOD, now=None):
+    """
+    Check an hmac-signed path.
+
+    Args:
+        path: the requested (still percent-encoded) URL path
+        params: dict of query parameters (expires, kid, sig)
+        secret_keys: SECRET_KEY followed by any previous keys still accepted
+        key_period: must match the value used for signing
+        now: current unix time (for tests)
+
+    Returns:
+        Tuple of (ok, reason); reason is None when ok
+    """
+    try:
+        expires = int(params.get('expires', ''))
+        kid = int(params.get('kid', ''))
+        signature = params.get('sig') or ''
+    except (TypeError, ValueError):
+        return False, 'malformed'
+    now = int(time.time() if now is None else now)
+    if expires < now:
+        return False, 'expired'
+    # Only keys from the current and previous period are honoured
+    if kid not in (now // int(key_period), now // int(key_period) - 1):
+        return False, 'stale key'
+    for secret_key in secret_keys:
+        if secret_key and hmac.compare_digest(_hmac_signature(derive_key(secret_key, kid), path, expires), signature):
+            return True, None
+    return False, 'bad signature'
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['nginx-secret']:
+        print(nginx_secret(os.environ.get('SECRET_KEY', 'vibes-university-secret-key')))
+    else:
+        print("Usage: python -m utils.signed_urls nginx-secret")
+        sys.exit(1)
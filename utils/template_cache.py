@@ -0,0 +1,29 @@
+import os
+import tempfile
+from jinja2 import FileSystemBytecodeCache
+
+from utils.security_utils import get_env_variable
+
+
+def init_template_cache(app):
+    """
+    Give the app's Jinja environment an on-disk bytecode cache.
+
+    Named templates are already compiled once per process and kept in the
+    environment's in-memory cache; the bytecode cache additionally lets a new
+    worker load the compiled code instead of parsing the template source.
+    Must run before app.jinja_env is first accessed.
+    """
+    cache_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR') or get_env_variable(
+        'JINJA_BYTECODE_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'vibes_jinja_cache'))
+    os.makedirs(cache_dir, exist_ok=True)
+    app.jinja_options = dict(app.jinja_options, bytecode_cache=FileSystemBytecodeCache(cache_dir))
+
+
+def warm_template_cache(app):
+    """Compile every HTML template now, e.g. in the gunicorn master before forking."""
+    compiled = 0
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+        compiled += 1
+    return compiled
@@ -0,0 +1,377 @@
+import calendar
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+from utils.db_utils import db_manager
+from utils.logging_utils import app_logger, log_error, log_info
+from utils.security_utils import get_env_variable
+from utils.upload_utils import upload_storage
+
+QUARANTINE_DIR = '.quarantine'
+# Directories inside UPLOAD_DIR that don't hold lesson files
+SKIPPED_DIRS = {'.tmp', '.resumable', 'derived', QUARANTINE_DIR}
+
+
+class UploadGarbageCollector:
+    """
+    Reconciles the upload store with the lessons table.
+
+    The store is walked with os.scandir and each batch of paths is checked
+    against lessons.file_path (indexed), so only orphan paths are held in
+    memory, never the full listing or the set of referenced paths. A file no lesson points at is
+    first moved to <UPLOAD_DIR>/.quarantine/<date>/ and only deleted once it
+    has stayed unreferenced there for UPLOAD_GC_QUARANTINE_DAYS; if a lesson
+    points at it again in the meantime it is moved back. Files younger than
+    UPLOAD_GC_MIN_AGE_MINUTES are never touched, since their lesson row may
+    not be committed yet.
+
+    Only one process runs a pass at a time (flock on <UPLOAD_DIR>/.gc.lock),
+    so every gunicorn worker can run the background thread.
+    """
+
+    def __init__(self, db_manager=None):
+        self.db_manager = db_manager
+        self.batch_size = 500
+        self.configure()
+        self.last_report = None
+        self._thread_pid = None
+
+    def configure(self):
+        """(Re)read settings from the environment."""
+        self.interval_hours = float(get_env_variable('UPLOAD_GC_INTERVAL_HOURS', 6))
+        self.min_age_seconds = float(get_env_variable('UPLOAD_GC_MIN_AGE_MINUTES', 60)) * 60
+        self.quarantine_days = float(get_env_variable('UPLOAD_GC_QUARANTINE_DAYS', 7))
+        # Refuse to quarantine more than this share of the store in one pass
+        # (a changed UPLOAD_DIR path would otherwise make every file look orphaned)
+        self.max_orphan_ratio = float(get_env_variable('UPLOAD_GC_MAX_ORPHAN_RATIO', 0.5))
+
+    @property
+    def quarantine_root(self):
+        return os.path.join(upload_storage.root, QUARANTINE_DIR)
+
+    @property
+    def report_path(self):
+        return os.path.join(upload_storage.root, '.gc-report.json')
+
+    # --- Scanning ---
+
+    def _iter_files(self, directory, skip_top_level=True):
+        """Yield DirEntry objects for every regular file below directory, depth first."""
+        try:
+            entries = os.scandir(directory)
+        except OSError:
+            return
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if skip_top_level and entry.name in SKIPPED_DIRS:
+                        continue
+                    yield from self._iter_files(entry.path, skip_top_level=False)
+                elif entry.is_file(follow_symlinks=False):
+                    if skip_top_level and entry.name.startswith('.'):
+                        continue  # GC lock and report files
+                    yield entry
+
+    def _batches(self, iterable):
+        batch = []
+        for item in iterable:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _referenced(self, conn, column, values):
+        """Subset of values present in lessons.<column> (one indexed IN query per batch)."""
+        placeholders = ','.join('?' * len(values))
+        rows = conn.execute(f'SELECT DISTINCT {column} FROM lessons WHERE {column} IN ({placeholders})', values)
+        return {row[0] for row in rows}
+
+    # --- Reconciliation ---
+
+    def reconcile(self, dry_run=False):
+        """
+        Run one pass: quarantine orphans, expire the quarantine, drop stale temp files.
+
+        Args:
+            dry_run: only report what would be moved or deleted
+
+        Returns:
+            Dict summarising the pass
+        """
+        started = time.time()
+        report = {'started_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), 'started_ts': started,
+                  'dry_run': dry_run, 'aborted': None, 'files': 0, 'bytes': 0, 'quarantined': 0, 'quarantined_bytes': 0,
+                  'restored': 0, 'deleted': 0, 'deleted_bytes': 0, 'derived_deleted': 0, 'temp_deleted': 0}
+        manager = self.db_manager or db_manager
+        conn = manager.get_connection()
+        try:
+            if not dry_run:
+                report['merged'] = self._merge_duplicates(conn)
+            self._scan_store(conn, report, dry_run, started)
+            if report['aborted']:
+                dry_run = True  # Still report, but don't delete anything either
+            self._scan_derived(conn, report, dry_run, started)
+            self._expire_quarantine(conn, report, dry_run, started)
+            self._clean_temp(report, dry_run, started)
+            if not dry_run:
+                upload_storage.purge_expired_resumable(conn)
+                self._backfill_sizes(conn)
+        finally:
+            manager.return_connection(conn)
+        report['duration_seconds'] = round(time.time() - started, 2)
+        report['storage'] = self.storage_usage()
+        self.last_report = report
+        if not dry_run:
+            self._write_report(report)
+        log_info(app_logger, "Upload reconciliation finished", **{key: value for key, value in report.items()
+                                                                   if key != 'storage'})
+        return report
+
+    def _scan_store(self, conn, report, dry_run, now):
+        orphans = []
+        for batch in self._batches(self._iter_files(upload_storage.root)):
+            referenced = self._referenced(conn, 'file_path', [entry.path for entry in batch])
+            for entry in batch:
+                stat = entry.stat(follow_symlinks=False)
+                report['files'] += 1
+                report['bytes'] += stat.st_size
+                if entry.path in referenced or now - stat.st_mtime < self.min_age_seconds:
+                    continue
+                orphans.append(entry.path)
+                report['quarantined'] += 1
+                report['quarantined_bytes'] += stat.st_size
+        if report['files'] >= 20 and len(orphans) > report['files'] * self.max_orphan_ratio:
+            report['aborted'] = (f"{len(orphans)} of {report['files']} files look orphaned; "
+                                 f"check UPLOAD_DIR matches lessons.file_path")
+            log_error(app_logger, "Upload reconciliation aborted", reason=report['aborted'])
+            return
+        if not dry_run:
+            for path in orphans:
+                try:
+                    # An upload of the same content may have reused the file since it was scanned
+                    if time.time() - os.stat(path).st_mtime < self.min_age_seconds:
+                        continue
+                    self._quarantine(path)
+                except OSError:
+                    continue
+
+    def _merge_duplicates(self, conn):
+        """
+        Point lessons sharing content at one stored copy.
+
+        The store used to keep a copy per extension, so identical bytes
+        uploaded as .png and .jpeg were stored twice. Once no lesson points
+        at a copy, the store scan quarantines it like any other orphan.
+        """
+        rows = conn.execute('''
+            SELECT file_hash, MIN(file_path) FROM lessons
+            WHERE file_hash IS NOT NULL AND file_path IS NOT NULL
+            GROUP BY file_hash HAVING COUNT(DISTINCT file_path) > 1
+        ''').fetchall()
+        merged = 0
+        for file_hash, file_path in rows:
+            kept = file_path if os.path.exists(file_path) else upload_storage.stored_path(file_hash)
+            if kept:
+                merged += conn.execute('UPDATE lessons SET file_path = ? WHERE file_hash = ? AND file_path != ?',
+                                       (kept, file_hash, kept)).rowcount
+        conn.commit()
+        return merged
+
+    def _quarantine(self, path):
+        rel_path = os.path.relpath(path, upload_storage.root)
+        target = os.path.join(self.quarantine_root, datetime.utcnow().strftime('%Y%m%d'), rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def _scan_derived(self, conn, report, dry_run, now):
+        """Derived files (image variants) are regenerable, so orphans are deleted outright."""
+        def entries():
+            for entry in self._iter_files(upload_storage.derived_dir, skip_top_level=False):
+                if now - entry.stat(follow_symlinks=False).st_mtime >= self.min_age_seconds:
+                    yield entry.name.split('-', 1)[0], entry.path
+
+        for batch in self._batches(entries()):
+            referenced = self._referenced(conn, 'file_hash', sorted({file_hash for file_hash, _ in batch}))
+            for file_hash, path in batch:
+                if file_hash in referenced:
+                    continue
+                report['derived_deleted'] += 1
+                if not dry_run:
+                    self._remove(path)
+
+    def _expire_quarantine(self, conn, report, dry_run, now):
+        quarantine_root = self.quarantine_root
+        cutoff = now - self.quarantine_days * 86400
+        for day in sorted(os.listdir(quarantine_root)) if os.path.isdir(quarantine_root) else []:
+            day_dir = os.path.join(quarantine_root, day)
+            try:
+                expired = calendar.timegm(time.strptime(day, '%Y%m%d')) < cutoff
+            except ValueError:
+                continue
+            for batch in self._batches(self._iter_files(day_dir, skip_top_level=False)):
+                originals = {entry.path: os.path.join(upload_storage.root, os.path.relpath(entry.path, day_dir))
+                             for entry in batch}
+                referenced = self._referenced(conn, 'file_path', list(originals.values()))
+                for entry in batch:
+                    original = originals[entry.path]
+                    if original in referenced:
+                        # Referenced again (e.g. a restored lesson): put it back
+                        report['restored'] += 1
+                        if dry_run:
+                            continue
+                        try:
+                            stored_size = os.path.getsize(original)
+                        except OSError:
+                            os.makedirs(os.path.dirname(original), exist_ok=True)
+                            os.replace(entry.path, original)
+                            continue
+                        # Already back in the store (the same content was uploaded again): drop the copy
+                        if stored_size == entry.stat(follow_symlinks=False).st_size:
+                            self._remove(entry.path)
+                    elif expired:
+                        report['deleted'] += 1
+                        report['deleted_bytes'] += entry.stat(follow_symlinks=False).st_size
+                        if not dry_run:
+                            self._remove(entry.path)
+            if expired and not dry_run:
+                shutil.rmtree(day_dir, ignore_errors=True)
+
+    def _clean_temp(self, report, dry_run, now):
+        """Partial multipart uploads left behind by a crashed worker."""
+        for entry in self._iter_files(upload_storage.tmp_dir, skip_top_level=False):
+            if now - entry.stat(follow_symlinks=False).st_mtime > 86400:
+                report['temp_deleted'] += 1
+                if not dry_run:
+                    self._remove(entry.path)
+
+    def _backfill_sizes(self, conn):
+        """Record file_size for lessons stored before sizes were tracked, so accounting covers them."""
+        rows = conn.execute(
+            'SELECT id, file_path FROM lessons WHERE file_path IS NOT NULL AND file_size IS NULL').fetchall()
+        sizes = []
+        for row in rows:
+            try:
+                sizes.append((os.path.getsize(row['file_path']), row['id']))
+            except OSError:
+                continue
+        if sizes:
+            conn.executemany('UPDATE lessons SET file_size = ? WHERE id = ?', sizes)
+            conn.commit()
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _write_report(self, report):
+        tmp_path = f"{self.report_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(report, f)
+            os.replace(tmp_path, self.report_path)
+        except OSError:
+            pass
+
+    def read_report(self):
+        """Most recent pass by any process, or None."""
+        try:
+            with open(self.report_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self.last_report
+
+    # --- Accounting ---
+
+    def storage_usage(self):
+        """
+        Bytes of lesson files per course and per teacher.
+
+        'bytes' counts every lesson's file; 'unique_bytes' counts shared
+        content once, which is what the course actually occupies on disk.
+
+        Returns:
+            Dict with 'courses', 'teachers' and 'total' entries
+        """
+        manager = self.db_manager or db_manager
+        conn = manager.get_connection()
+        try:
+            courses = conn.execute('''
+                SELECT c.id AS course_id, c.name, c.teacher_id,
+                       COUNT(l.file_path) AS files,
+                       COALESCE(SUM(l.file_size), 0) AS bytes,
+                       (SELECT COALESCE(SUM(u.file_size), 0) FROM
+                           (SELECT file_hash, MAX(file_size) AS file_size FROM lessons
+                            WHERE course_id = c.id AND file_hash IS NOT NULL GROUP BY file_hash) u) AS unique_bytes
+                FROM courses c
+                LEFT JOIN lessons l ON l.course_id = c.id AND l.file_path IS NOT NULL
+                GROUP BY c.id
+                ORDER BY bytes DESC
+            ''').fetchall()
+            teachers = conn.execute('''
+                SELECT c.teacher_id, u.full_name AS name, u.email, COUNT(DISTINCT c.id) AS courses,
+                       COUNT(l.file_path) AS files, COALESCE(SUM(l.file_size), 0) AS bytes
+                FROM courses c
+                LEFT JOIN teachers t ON t.id = c.teacher_id
+                LEFT JOIN users u ON u.id = t.user_id
+                LEFT JOIN lessons l ON l.course_id = c.id AND l.file_path IS NOT NULL
+                GROUP BY c.teacher_id
+                ORDER BY bytes DESC
+            ''').fetchall()
+            total = conn.execute('''
+                SELECT COUNT(file_path) AS files, COALESCE(SUM(file_size), 0) AS bytes,
+                       (SELECT COALESCE(SUM(file_size), 0) FROM
+                           (SELECT MAX(file_size) AS file_size FROM lessons
+                            WHERE file_hash IS NOT NULL GROUP BY file_hash)) AS unique_bytes
+                FROM lessons WHERE file_path IS NOT NULL
+            ''').fetchone()
+        finally:
+            manager.return_connection(conn)
+        return {'courses': [dict(row) for row in courses], 'teachers': [dict(row) for row in teachers],
+                'total': dict(total)}
+
+    # --- Scheduling ---
+
+    def run_locked(self, dry_run=False):
+        """Run a pass unless another process holds the GC lock. Returns the report or None."""
+        os.makedirs(upload_storage.root, exist_ok=True)
+        with open(os.path.join(upload_storage.root, '.gc.lock'), 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return None
+            try:
+                return self.reconcile(dry_run=dry_run)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def start(self):
+        """Start the periodic background pass in this process (threads don't survive fork)."""
+        if self.interval_hours <= 0 or self._thread_pid == os.getpid():
+            return
+        self._thread_pid = os.getpid()
+
+        def run():
+            while True:
+                time.sleep(self.interval_hours * 3600)
+                # Skip the pass if another worker ran one recently
+                report = self.read_report()
+                if report and time.time() - report.get('started_ts', 0) < self.interval_hours * 1800:
+                    continue
+                try:
+                    self.run_locked()
+                except Exception as e:
+                    log_error(app_logger, "Upload reconciliation failed", error=str(e))
+
+        threading.Thread(target=run, name='upload-gc', daemon=True).start()
+
+
+# Global instance for the application
+upload_gc = UploadGarbageCollector(db_manager)
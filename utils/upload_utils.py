@@ -0,0 +1,478 @@
+import base64
+import errno
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from flask import Request, g, jsonify, session
+from werkzeug.exceptions import BadRequest, Conflict, RequestEntityTooLarge, TooManyRequests
+from werkzeug.utils import secure_filename
+
+from utils.security_utils import get_env_variable
+
+ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'wmv', 'flv', 'webm', 'mkv', 'pdf', 'doc', 'docx', 'ppt', 'pptx', 'xls', 'xlsx', 'txt', 'jpg', 'jpeg', 'png', 'gif', 'svg', 'zip', 'rar', '7z', 'mp3', 'wav', 'aac', 'ogg'}
+MB = 1024 * 1024
+CHUNK_READ_SIZE = MB
+
+
+def allowed_file(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def resumable_response(upload, status_code=200, location=None):
+    """JSON status of a resumable upload, with the tus Upload-Offset/Upload-Length headers."""
+    response = jsonify({
+        'upload_id': upload['id'],
+        'offset': upload['upload_offset'],
+        'length': upload['upload_length'],
+        'file_name': upload['file_name'],
+        'expires_at': upload['expires_at'],
+        'chunk_size': upload_storage.chunk_size,
+    })
+    response.status_code = status_code
+    response.headers['Upload-Offset'] = str(upload['upload_offset'])
+    response.headers['Upload-Length'] = str(upload['upload_length'])
+    if location:
+        response.headers['Location'] = location
+    response.cache_control.no_store = True
+    return response
+
+
+class HashingFile:
+    """
+    Writable upload container that hashes and counts bytes as they arrive.
+
+    Werkzeug's multipart parser writes each uploaded file into the object
+    returned by Request._get_file_stream; this one is a temp file inside the
+    upload store, so a finished upload is moved into place with a rename
+    instead of being copied.
+    """
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.file = open(path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f"Upload exceeds the {self.max_bytes // MB} MB limit")
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def __getattr__(self, name):
+        # read/seek/tell/close/... go to the underlying file
+        if name == 'file':
+            raise AttributeError(name)
+        return getattr(self.file, name)
+
+
+class StreamingUploadRequest(Request):
+    """Request class that streams multipart file parts straight into the upload store."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        storage = upload_storage
+        max_bytes = storage.limit_for_current_user()
+        if max_bytes and total_content_length and total_content_length > max_bytes + MB:
+            raise RequestEntityTooLarge(f"Upload exceeds the {max_bytes // MB} MB limit")
+        os.makedirs(storage.tmp_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=storage.tmp_dir, suffix='.part')
+        os.close(fd)
+        container = HashingFile(path, max_bytes)
+        g.setdefault('_upload_parts', []).append(container)
+        return container
+
+
+class UploadStorage:
+    """
+    Content-addressed storage for lesson files.
+
+    Files live at <UPLOAD_DIR>/<sha256[:2]>/<sha256>.<ext>, so identical
+    content uploaded for several lessons is stored once; content already
+    stored under another extension is reused as is (the lesson keeps its
+    original file name, which is what responses are typed by). Uploads are written
+    to <UPLOAD_DIR>/.tmp while the request body is parsed, then renamed into
+    place; temp files that were not saved are removed at teardown.
+
+    Resumable uploads (tus-style create / PATCH at offset / finalize) are
+    preallocated at their full size in <UPLOAD_DIR>/.resumable and each chunk
+    is written in place with os.pwrite, so chunks can arrive over many
+    requests without ever being reassembled. Their state is kept in the
+    upload_sessions table so any worker can take the next chunk.
+    """
+
+    def __init__(self, app=None):
+        self.root = get_env_variable('UPLOAD_DIR', 'uploads')
+        self.limits = {}
+        self.resumable_ttl = timedelta(hours=24)
+        self.chunk_size = 8 * MB
+        self.resumable_max_sessions = 5
+        self.resumable_max_reserved = 8192 * MB
+        # Called with (file_path, file_hash) whenever a file is stored, e.g. to build image variants
+        self.stored_callbacks = []
+        if app is not None:
+            self.init_app(app)
+
+    @property
+    def tmp_dir(self):
+        return os.path.join(self.root, '.tmp')
+
+    @property
+    def resumable_dir(self):
+        return os.path.join(self.root, '.resumable')
+
+    @property
+    def derived_dir(self):
+        return os.path.join(self.root, 'derived')
+
+    def init_app(self, app):
+        """Install the streaming request class, size limits and temp-file cleanup."""
+        self.root = app.config.get('UPLOAD_DIR') or self.root
+        self.limits = {
+            'admin': int(get_env_variable('UPLOAD_MAX_MB_ADMIN', 4096)) * MB,
+            'teacher': int(get_env_variable('UPLOAD_MAX_MB_TEACHER', 2048)) * MB,
+            'default': int(get_env_variable('UPLOAD_MAX_MB_DEFAULT', 10)) * MB,
+        }
+        self.resumable_ttl = timedelta(hours=float(get_env_variable('UPLOAD_RESUMABLE_TTL_HOURS', 24)))
+        self.chunk_size = int(get_env_variable('UPLOAD_CHUNK_MB', 8)) * MB
+        # Each open session preallocates its full length, so cap them per owner (0 = no limit)
+        self.resumable_max_sessions = int(get_env_variable('UPLOAD_RESUMABLE_MAX_SESSIONS', 5))
+        self.resumable_max_reserved = int(get_env_variable('UPLOAD_RESUMABLE_MAX_RESERVED_MB', 8192)) * MB
+        # Hard cap for any request body; per-role limits are enforced while streaming
+        app.config.setdefault('MAX_CONTENT_LENGTH', max(self.limits.values()) + MB)
+        app.request_class = StreamingUploadRequest
+        app.teardown_request(self._discard_parts)
+
+        # Store the extension instance in the app
+        app.extensions['upload_storage'] = self
+
+    def limit_for_current_user(self):
+        """Byte limit for an upload by the logged-in user's role."""
+        if session.get('admin_logged_in'):
+            return self.limits.get('admin')
+        if session.get('teacher_logged_in'):
+            return self.limits.get('teacher')
+        return self.limits.get('default')
+
+    def path_for(self, file_hash, extension):
+        return os.path.join(self.root, file_hash[:2], f"{file_hash}.{extension}" if extension else file_hash)
+
+    def stored_path(self, file_hash, extension=''):
+        """Where this content is already stored, under any extension (preferring `extension`), or None."""
+        preferred = self.path_for(file_hash, extension)
+        if os.path.exists(preferred):
+            return preferred
+        directory = os.path.join(self.root, file_hash[:2])
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name == file_hash or entry.name.startswith(file_hash + '.'):
+                        return entry.path
+        except OSError:
+            pass
+        return None
+
+    def derived_path(self, file_hash, suffix):
+        """Path of a file generated from stored content (e.g. a resized image), removed along with it."""
+        return os.path.join(self.derived_dir, file_hash[:2], f"{file_hash}-{suffix}")
+
+    def save(self, file):
+        """
+        Store an uploaded file under its content hash.
+
+        Args:
+            file: werkzeug FileStorage from request.files
+
+        Returns:
+            Tuple of (file_path, size in bytes, sha256 hex digest, original filename)
+        """
+        original_name = secure_filename(file.filename or '')
+        extension = original_name.rsplit('.', 1)[1].lower() if '.' in original_name else ''
+        container = file.stream
+        if not isinstance(container, HashingFile):
+            # Not parsed by StreamingUploadRequest (e.g. a test request); hash while copying
+            os.makedirs(self.tmp_dir, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=self.tmp_dir, suffix='.part')
+            os.close(fd)
+            copy = HashingFile(path, None)
+            g.setdefault('_upload_parts', []).append(copy)
+            shutil.copyfileobj(container, copy, 1024 * 1024)
+            container = copy
+
+        container.flush()
+        file_hash = container.digest.hexdigest()
+        container.file.close()
+        final_path = self._store(container.path, file_hash, extension)
+        container.path = None
+        return final_path, container.size, file_hash, original_name
+
+    def _store(self, path, file_hash, extension):
+        """Move a fully written file to its content address (or drop it if that content is already stored)."""
+        final_path = self.stored_path(file_hash, extension)
+        if final_path:
+            os.remove(path)  # Same content already stored
+            # Restart the reconciler's grace period: the lesson about to reference it isn't committed yet
+            os.utime(final_path)
+        else:
+            final_path = self.path_for(file_hash, extension)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(path, final_path)
+            os.chmod(final_path, 0o644)  # mkstemp creates 0600 files
+        for callback in self.stored_callbacks:
+            try:
+                callback(final_path, file_hash)
+            except Exception:
+                pass  # Derived files are an optimization; never fail the upload over them
+        return final_path
+
+    # --- Resumable uploads ---
+
+    def owner_for_current_user(self):
+        """Who a resumable upload belongs to; only that session may continue it."""
+        if session.get('admin_logged_in'):
+            return 'admin'
+        return f"teacher:{session.get('teacher_id') or ''}"
+
+    def create_resumable(self, conn, file_name, length, expected_hash=None):
+        """
+        Start a resumable upload and preallocate its file.
+
+        Args:
+            conn: database connection
+            file_name: original file name (must have an allowed extension)
+            length: total size in bytes
+            expected_hash: optional sha256 hex digest the finished file must match
+
+        Returns:
+            Dict with the upload_sessions row
+
+        Raises:
+            TooManyRequests: the owner already has the maximum number of open uploads
+            RequestEntityTooLarge: the file, or the owner's open uploads with it, exceed the limits
+        """
+        file_name = secure_filename(file_name or '')
+        if not file_name or not allowed_file(file_name):
+            raise BadRequest('File type not allowed')
+        if length < 0:
+            raise BadRequest('Upload length must not be negative')
+        max_bytes = self.limit_for_current_user()
+        if max_bytes and length > max_bytes:
+            raise RequestEntityTooLarge(f"Upload exceeds the {max_bytes // MB} MB limit")
+        if expected_hash is not None:
+            expected_hash = expected_hash.lower()
+            if len(expected_hash) != 64 or any(c not in '0123456789abcdef' for c in expected_hash):
+                raise BadRequest('sha256 must be a hex digest')
+
+        self.purge_expired_resumable(conn)
+        owner = self.owner_for_current_user()
+        upload_id = uuid.uuid4().hex
+        part_path = os.path.join(self.resumable_dir, f"{upload_id}.part")
+        expires_at = datetime.utcnow() + self.resumable_ttl
+        # Check the owner's quota and record the session in one write transaction,
+        # so concurrent creates can't both slip under it
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            sessions, reserved = conn.execute("""
+                SELECT COUNT(*), COALESCE(SUM(upload_length), 0) FROM upload_sessions
+                WHERE owner = ? AND expires_at > datetime('now')
+            """, (owner,)).fetchone()
+            if self.resumable_max_sessions and sessions >= self.resumable_max_sessions:
+                raise TooManyRequests(f"Too many open uploads (limit {self.resumable_max_sessions}); "
+                                      "finish or cancel one first")
+            if self.resumable_max_reserved and reserved + length > self.resumable_max_reserved:
+                raise RequestEntityTooLarge(f"Open uploads would exceed the {self.resumable_max_reserved // MB} MB "
+                                            "allowed per user; finish or cancel one first")
+            conn.execute("""
+                INSERT INTO upload_sessions (id, owner, file_name, upload_length, upload_offset, expected_hash, part_path, expires_at)
+                VALUES (?, ?, ?, ?, 0, ?, ?, ?)
+            """, (upload_id, owner, file_name, length, expected_hash, part_path,
+                  expires_at.strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        try:
+            os.makedirs(self.resumable_dir, exist_ok=True)
+            fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            try:
+                # Reserve the space up front so a full disk fails now, not halfway through
+                try:
+                    if length:
+                        os.posix_fallocate(fd, 0, length)
+                except (AttributeError, OSError) as e:
+                    if getattr(e, 'errno', None) == errno.ENOSPC:
+                        raise
+                    os.ftruncate(fd, length)
+            except Exception:
+                os.close(fd)
+                os.remove(part_path)
+                raise
+            os.close(fd)
+        except Exception:
+            conn.execute('DELETE FROM upload_sessions WHERE id = ?', (upload_id,))
+            conn.commit()
+            raise
+        return self.get_resumable(conn, upload_id)
+
+    def get_resumable(self, conn, upload_id):
+        """The current user's unexpired upload session, or None."""
+        row = conn.execute("""
+            SELECT id, owner, file_name, upload_length, upload_offset, expected_hash, part_path, expires_at
+            FROM upload_sessions WHERE id = ? AND owner = ? AND expires_at > datetime('now')
+        """, (upload_id, self.owner_for_current_user())).fetchone()
+        return dict(row) if row else None
+
+    def write_chunk(self, conn, upload, offset, stream, length, checksum=None):
+        """
+        Write one chunk of a resumable upload at its offset.
+
+        Without a checksum, bytes received before a dropped connection are
+        kept, so the client resumes from wherever the server got to rather
+        than from the start of the chunk.
+
+        Args:
+            conn: database connection
+            upload: dict from get_resumable
+            offset: Upload-Offset sent by the client; must equal the stored offset
+            stream: request body stream
+            length: Content-Length of the chunk
+            checksum: optional tus Upload-Checksum value ("sha256 <base64 digest>")
+
+        Returns:
+            The new offset
+        """
+        if offset != upload['upload_offset']:
+            raise Conflict(f"Upload-Offset {offset} does not match the current offset {upload['upload_offset']}")
+        if length is None:
+            raise BadRequest('Content-Length is required')
+        if offset + length > upload['upload_length']:
+            raise RequestEntityTooLarge('Chunk extends past the declared upload length')
+        expected_digest = None
+        if checksum:
+            algorithm, _, encoded = checksum.partition(' ')
+            if algorithm.lower() != 'sha256':
+                raise BadRequest('Only sha256 chunk checksums are supported')
+            try:
+                expected_digest = base64.b64decode(encoded)
+            except ValueError:
+                raise BadRequest('Malformed Upload-Checksum')
+
+        digest = hashlib.sha256()
+        written = 0
+        fd = os.open(upload['part_path'], os.O_WRONLY)
+        try:
+            while written < length:
+                data = stream.read(min(CHUNK_READ_SIZE, length - written))
+                if not data:
+                    break
+                digest.update(data)
+                view = memoryview(data)
+                while view:
+                    count = os.pwrite(fd, view, offset + written)
+                    written += count
+                    view = view[count:]
+        finally:
+            os.close(fd)
+            if expected_digest is None:
+                self._advance(conn, upload, offset, written)
+
+        if expected_digest is not None:
+            # A checksummed chunk only counts once all of it has arrived intact
+            if written < length or digest.digest() != expected_digest:
+                raise BadRequest('Chunk checksum mismatch')
+            self._advance(conn, upload, offset, written)
+        elif written < length:
+            raise BadRequest('Chunk ended before Content-Length bytes were received')
+        return offset + written
+
+    def _advance(self, conn, upload, offset, written):
+        if not written:
+            return
+        expires_at = datetime.utcnow() + self.resumable_ttl
+        cursor = conn.execute("""
+            UPDATE upload_sessions SET upload_offset = ?, expires_at = ?
+            WHERE id = ? AND upload_offset = ?
+        """, (offset + written, expires_at.strftime('%Y-%m-%d %H:%M:%S'), upload['id'], offset))
+        conn.commit()
+        if cursor.rowcount == 0:
+            # Another request for the same offset finished first
+            raise Conflict('Upload offset changed while this chunk was being written')
+        upload['upload_offset'] = offset + written
+
+    def finalize_resumable(self, conn, upload, expected_hash=None):
+        """
+        Verify a completed resumable upload and move it into the content store.
+
+        Args:
+            conn: database connection
+            upload: dict from get_resumable
+            expected_hash: sha256 hex digest (overrides the one given at creation)
+
+        Returns:
+            Tuple of (file_path, size in bytes, sha256 hex digest, original filename)
+        """
+        if upload['upload_offset'] != upload['upload_length']:
+            raise Conflict(f"Upload incomplete: {upload['upload_offset']} of {upload['upload_length']} bytes received")
+        expected_hash = (expected_hash or upload['expected_hash'] or '').lower() or None
+
+        digest = hashlib.sha256()
+        with open(upload['part_path'], 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK_READ_SIZE), b''):
+                digest.update(block)
+        file_hash = digest.hexdigest()
+        if expected_hash and file_hash != expected_hash:
+            # Keep the session: the client can re-send the bad range and finalize again
+            raise BadRequest('Content hash mismatch')
+
+        # Claim the session first so a concurrent finalize can't store it twice
+        cursor = conn.execute('DELETE FROM upload_sessions WHERE id = ?', (upload['id'],))
+        conn.commit()
+        if cursor.rowcount == 0:
+            raise Conflict('Upload was already finalized')
+        file_name = upload['file_name']
+        extension = file_name.rsplit('.', 1)[1].lower() if '.' in file_name else ''
+        final_path = self._store(upload['part_path'], file_hash, extension)
+        return final_path, upload['upload_length'], file_hash, file_name
+
+    def abort_resumable(self, conn, upload):
+        conn.execute('DELETE FROM upload_sessions WHERE id = ?', (upload['id'],))
+        conn.commit()
+        try:
+            os.remove(upload['part_path'])
+        except OSError:
+            pass
+
+    def purge_expired_resumable(self, conn):
+        """Drop abandoned resumable uploads and their preallocated files."""
+        expired = conn.execute(
+            "SELECT id, part_path FROM upload_sessions WHERE expires_at <= datetime('now')").fetchall()
+        for row in expired:
+            try:
+                os.remove(row['part_path'])
+            except OSError:
+                pass
+        if expired:
+            conn.executemany('DELETE FROM upload_sessions WHERE id = ?', [(row['id'],) for row in expired])
+            conn.commit()
+        return len(expired)
+
+    def _discard_parts(self, exc=None):
+        for container in g.pop('_upload_parts', []):
+            try:
+                container.file.close()
+            except Exception:
+                pass
+            if container.path:
+                try:
+                    os.remove(container.path)
+                except OSError:
+                    pass
+
+
+# Global instance for the application
+upload_storage = UploadStorage()